@@ -0,0 +1,80 @@
+"""
+Compares the default representation of resources with the compact one
+(see soundcloud.RESTBase.compact) on a dataset of 100k tracks.
+
+Reports the memory held per resource by the resource objects and their
+containers - the field values are the same for both representations and
+are not counted - and the time to create the resources and to read
+some of their fields.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_compact.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soundcloud
+
+COUNT = 100000
+
+
+def make_items(count):
+    items = []
+    for i in xrange(count):
+        item = dict((name, None) for name in soundcloud.Track.FIELDS)
+        item.update({
+            "id" : i, "title" : "track %i" % i, "duration" : 1000 + i, "genre" : "Electronic",
+            "user" : {"id" : i % 100, "username" : "user %i" % (i % 100)},
+            })
+        items.append(item)
+    return items
+
+
+def container_size(resource):
+    """
+    The size of the resource and of the containers held in its slots, like
+    the data dict or the values tuple of a compact resource.
+    """
+    size = sys.getsizeof(resource)
+    for cls in type(resource).__mro__:
+        for name in cls.__dict__.get("__slots__", ()):
+            value = getattr(resource, name, None)
+            if isinstance(value, (dict, tuple, list)):
+                size += sys.getsizeof(value)
+    return size
+
+
+def run(name, cls, items, scope):
+    start = time.time()
+    resources = [cls(item, scope) for item in items]
+    created = time.time() - start
+
+    start = time.time()
+    for resource in resources:
+        resource.id
+        resource.title
+        resource.duration
+        resource.genre
+    accessed = time.time() - start
+
+    size = sum(container_size(resource) for resource in resources)
+    print "%-8s create %6.1fms  4 field reads %6.1fms  %5i bytes/resource" % (
+        name, created * 1000, accessed * 1000, size / len(resources))
+
+
+def main():
+    authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/", "token")
+    scope = soundcloud.Scope(soundcloud.ApiConnector(authenticator))
+    print "%i tracks with %i fields" % (COUNT, len(soundcloud.Track.FIELDS) + 1)
+    # both take their own copies, the compact resources don't keep the dicts
+    run("default", soundcloud.Track, make_items(COUNT), scope)
+    run("compact", soundcloud.Track.compact(), make_items(COUNT), scope)
+
+
+if __name__ == "__main__":
+    main()
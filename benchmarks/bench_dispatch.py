@@ -0,0 +1,82 @@
+"""
+Measures the overhead of the client per API-call, with the network stubbed
+out: the requests are answered by a urllib2-handler right away, so what
+remains is dispatching the call, building the URL and the request, the
+opener, decoding the response and mapping it to resources.
+
+Reports the time per call for a resource of the root scope, a collection
+of a sub-resource, and the time to only look up the API-method.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_dispatch.py
+"""
+
+import mimetools
+import os
+import sys
+import time
+import urllib
+import urllib2
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soundcloud
+
+CALLS = 20000
+
+TRACK = '{"id" : 1, "kind" : "track", "title" : "stub"}'
+
+HEADERS = "Content-Type: application/json; charset=utf-8\r\n\r\n"
+
+
+class StubHTTPHandler(urllib2.BaseHandler):
+    """
+    Answers every request with TRACK, or a list of it, before urllib2's own
+    handlers get to connect.
+    """
+
+    handler_order = 100
+
+    def http_open(self, req):
+        body = TRACK
+        if req.get_selector().split("?")[0].endswith("/tracks/"):
+            body = "[%s]" % TRACK
+        response = urllib.addinfourl(StringIO(body), mimetools.Message(StringIO(HEADERS)), req.get_full_url(), 200)
+        response.msg = "OK"
+        return response
+
+    https_open = http_open
+
+
+class StubConnector(soundcloud.ApiConnector):
+
+    def build_opener(self, *handlers):
+        return urllib2.build_opener(StubHTTPHandler(), *handlers)
+
+
+def run(name, func):
+    start = time.time()
+    for _ in xrange(CALLS):
+        func()
+    elapsed = time.time() - start
+    print "%-24s %8.2fus/call" % (name, elapsed * 1e6 / CALLS)
+
+
+def main():
+    authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/", "token")
+    sca = soundcloud.Scope(StubConnector(authenticator))
+    track = sca.Track.get(1)
+    assert track.title == "stub"
+    user = soundcloud.User({"id" : 3, "kind" : "user"}, sca)
+    assert user.tracks().page()[0].id == 1
+
+    print "%i calls each" % CALLS
+    run("method lookup", lambda: sca.tracks)
+    run("Track.get(1)", lambda: sca.Track.get(1))
+    run("user.tracks().page()", lambda: user.tracks().page())
+
+
+if __name__ == "__main__":
+    main()
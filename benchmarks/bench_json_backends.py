@@ -0,0 +1,91 @@
+"""
+Compares the JSON-backends (see soundcloud/jsonbackend.py) that are
+installed on the responses the client decodes most: a track, a user and a
+page of a collection, with and without linked partitioning - built from
+the fixtures in benchmarks/fixtures.
+
+Reports the time per document of each backend, and which one is chosen
+when the connector isn't given one.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_json_backends.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simplejson
+
+from soundcloud import jsonbackend
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LIMIT = 50
+
+# the time each backend gets per payload
+SECONDS = 1.0
+
+
+def fixture(name):
+    f = open(os.path.join(FIXTURES, name))
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def payloads():
+    track = simplejson.loads(fixture("track.json"))
+    page = []
+    for id in xrange(LIMIT):
+        item = dict(track)
+        item["id"] = id
+        page.append(item)
+    linked = dict(collection=page, next_partition_href="https://api.soundcloud.com/tracks?linked_partitioning=1&cursor=50")
+    return [
+        ("track", fixture("track.json")),
+        ("user", fixture("user.json")),
+        ("collection", simplejson.dumps(page)),
+        ("linked collection", simplejson.dumps(linked)),
+        ]
+
+
+def measure(loads, document):
+    # calibrate the number of calls to roughly SECONDS
+    count = 1
+    while True:
+        start = time.time()
+        for _ in xrange(count):
+            loads(document)
+        elapsed = time.time() - start
+        if elapsed >= SECONDS / 10:
+            break
+        count *= 2
+    count = max(1, int(count * SECONDS / elapsed))
+    start = time.time()
+    for _ in xrange(count):
+        loads(document)
+    return (time.time() - start) / count
+
+
+def main():
+    backends = jsonbackend.available()
+    selected = jsonbackend.get()
+    print "backends: %s, selected: %s" % (", ".join(repr(backend) for backend in backends), selected.name)
+    print
+    print "%-18s %8s" % ("payload", "bytes") + "".join("%14s" % backend.name for backend in backends)
+    for name, document in payloads():
+        expected = simplejson.loads(document)
+        timings = []
+        for backend in backends:
+            assert backend.loads(document) == expected, backend
+            timings.append(measure(backend.loads, document))
+        print "%-18s %8i" % (name, len(document)) + "".join("%12.1fus" % (t * 1e6) for t in timings)
+
+
+if __name__ == "__main__":
+    main()
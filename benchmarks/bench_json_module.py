@@ -0,0 +1,134 @@
+"""
+Compares soundcloud/json.py with an earlier version of it - by default the
+one before the rewrite with a regex-tokenizer - on a track, a user and a
+page of 50 tracks, built from the fixtures in benchmarks/fixtures. The
+earlier version is taken from git, so this needs a git working copy.
+
+Reports the time to read and to write each document, and the time to load
+and dump a collection of 10000 tracks from and to a file.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_json_module.py
+  $ python benchmarks/bench_json_module.py --legacy <revision>
+"""
+
+import imp
+import optparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simplejson
+
+from soundcloud import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+
+LIMIT = 50
+
+LARGE = 10000
+
+# the time each implementation gets per document
+SECONDS = 0.5
+
+
+def fixture(name):
+    f = open(os.path.join(FIXTURES, name))
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def documents():
+    track = simplejson.loads(fixture("track.json"))
+    page = []
+    for id in xrange(LIMIT):
+        item = dict(track)
+        item["id"] = id
+        page.append(item)
+    return [
+        ("track", fixture("track.json")),
+        ("user", fixture("user.json")),
+        ("collection", simplejson.dumps(page)),
+        ]
+
+
+def legacy_module(revision):
+    """
+    @return: soundcloud/json.py as of revision
+    """
+    if revision is None:
+        # the parent of the last commit that changed the module
+        last = subprocess.check_output(["git", "log", "-n", "1", "--format=%H", "--", "soundcloud/json.py"],
+                                       cwd=ROOT).strip()
+        revision = last + "^"
+    source = subprocess.check_output(["git", "show", "%s:soundcloud/json.py" % revision], cwd=ROOT)
+    module = imp.new_module("legacy_json")
+    exec compile(source, "legacy_json.py", "exec") in module.__dict__
+    return module
+
+
+def measure(func, *args):
+    # calibrate the number of calls to roughly SECONDS
+    count = 1
+    while True:
+        start = time.time()
+        for _ in xrange(count):
+            func(*args)
+        elapsed = time.time() - start
+        if elapsed >= SECONDS / 10:
+            break
+        count *= 2
+    count = max(1, int(count * SECONDS / elapsed))
+    start = time.time()
+    for _ in xrange(count):
+        func(*args)
+    return (time.time() - start) / count
+
+
+def compare(name, legacy_time, current_time):
+    print "%-28s %12.1fus %12.1fus %8.1fx" % (name, legacy_time * 1e6, current_time * 1e6, legacy_time / current_time)
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("--legacy", metavar="REVISION",
+                      help="the revision to compare with [default: the one before the module last changed]")
+    options, _ = parser.parse_args()
+    legacy = legacy_module(options.legacy)
+
+    print "%-28s %14s %14s %9s" % ("", "legacy", "current", "speedup")
+    for name, document in documents():
+        value = simplejson.loads(document)
+        assert json.read(document) == value
+        compare("read %s" % name, measure(legacy.read, document), measure(json.read, document))
+        assert simplejson.loads(json.write(value)) == value
+        compare("write %s" % name, measure(legacy.write, value), measure(json.write, value))
+
+    track = simplejson.loads(fixture("track.json"))
+    collection = [dict(track, id=id) for id in xrange(LARGE)]
+    f = tempfile.TemporaryFile()
+    try:
+        start = time.time()
+        json.dump(collection, f)
+        dumped = time.time() - start
+        f.seek(0)
+        start = time.time()
+        assert len(json.load(f)) == LARGE
+        loaded = time.time() - start
+        print
+        print "%i tracks, %iKB: dump to a file %.2fs, load from it %.2fs" % (LARGE, f.tell() / 1024, dumped, loaded)
+    finally:
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
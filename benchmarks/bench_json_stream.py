@@ -0,0 +1,69 @@
+"""
+Compares decoding a large collection-response at once with decoding it
+incrementally through soundcloud.jsonstream.CollectionStream.
+
+Reports the time until the first item is available, and the time for the
+whole collection.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_json_stream.py
+"""
+
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simplejson
+from soundcloud.jsonstream import CollectionStream
+
+ITEMS = 5000
+
+
+def make_body(count):
+    track = {
+        "kind" : "track", "title" : "some title", "description" : "x" * 500,
+        "user" : {"id" : 1, "username" : "someone", "permalink" : "someone"},
+        "duration" : 123456, "tag_list" : "foo bar baz", "downloadable" : True,
+        }
+    items = []
+    for i in xrange(count):
+        item = dict(track)
+        item["id"] = i
+        items.append(item)
+    return simplejson.dumps({"collection" : items, "next_partition_href" : None})
+
+
+def at_once(body):
+    start = time.time()
+    items = simplejson.loads(StringIO(body).read().strip())["collection"]
+    first = time.time() - start
+    for item in items:
+        pass
+    return first, time.time() - start
+
+
+def streamed(body):
+    start = time.time()
+    stream = CollectionStream(StringIO(body))
+    stream.start()
+    first = None
+    for item in stream.items():
+        if first is None:
+            first = time.time() - start
+    return first, time.time() - start
+
+
+def main():
+    body = make_body(ITEMS)
+    print "%i items, %.1f MB" % (ITEMS, len(body) / 1024.0 / 1024)
+    for name, func in [("at once", at_once), ("streamed", streamed)]:
+        first, total = func(body)
+        print "%-10s first item after %7.2fms, all items after %7.2fms" % (name, first * 1000, total * 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures how iterating over a paginated collection scales with its size.
+
+No network is involved: the pages are produced by calling Scope._map directly,
+the same way Scope._call does after decoding a response. The time per item
+should stay flat for growing collections.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_pagination.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soundcloud
+
+SIZES = (1000, 5000, 20000, 100000)
+
+
+def make_collection(scope, total):
+    """
+    Return a collection of C{total} tracks, served in pages of LIST_LIMIT items.
+    """
+    limit = soundcloud.ApiConnector.LIST_LIMIT
+
+    def fetch(offset):
+        items = [{"id" : i, "title" : "track %i" % i} for i in xrange(offset, min(offset + limit, total))]
+        return scope._map(items, "tracks", lambda: fetch(offset + limit))
+
+    return fetch(0)
+
+
+def main():
+    authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/", "token")
+    scope = soundcloud.Scope(soundcloud.ApiConnector(authenticator))
+
+    per_item = []
+    for total in SIZES:
+        collection = make_collection(scope, total)
+        start = time.time()
+        count = 0
+        for track in collection:
+            count += 1
+        elapsed = time.time() - start
+        assert count == total, count
+        per_item.append(elapsed / total)
+        print "%7i items: %7.3fs  %6.2fus/item" % (total, elapsed, per_item[-1] * 1e6)
+
+    print "per-item cost, largest vs. smallest collection: %.2fx" % (per_item[-1] / per_item[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures the cost of finding the next page of a collection with linked
+partitioning.
+
+Compares scanning the raw response body for next_partition_href with
+regular expressions, as done before, to reading it from the decoded
+document into a PartitionCursor. JSON decoding itself is the same for
+both, so it isn't part of the measurement.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/bench_partition_cursor.py
+"""
+
+import os
+import re
+import sys
+import timeit
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simplejson
+import soundcloud
+
+ROUNDS = 200
+
+
+def make_page(count):
+    items = [{"id" : i, "title" : "track %i" % i, "description" : "x" * 500} for i in xrange(count)]
+    href = "https://api.soundcloud.com/tracks?linked_partitioning=1&cursor=abcdef&limit=%i" % count
+    # the API sends the href after the collection
+    page = OrderedDict([("collection", items), ("next_partition_href", href)])
+    return simplejson.dumps(page, separators=(",", ":"))
+
+
+def regex_scan(content):
+    pattern = re.compile('(next_partition_href":")(.*?)(")')
+    partition_url = None
+    if pattern.search(content):
+        partition_url = pattern.search(content).group(2)
+    method = re.search('(^[a-z]+)', "tracks").group(0)
+    params = re.search('\?.+', partition_url).group(0)
+    return method, params.replace('u0026', '&')
+
+
+def cursor(document, connector):
+    return soundcloud.PartitionCursor.parse(document["next_partition_href"], connector)
+
+
+def main():
+    authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/", "token")
+    connector = soundcloud.ApiConnector(authenticator)
+    for count in (50, 200):
+        content = make_page(count)
+        document = simplejson.loads(content)
+        old = timeit.timeit(lambda: regex_scan(content), number=ROUNDS) / ROUNDS
+        new = timeit.timeit(lambda: cursor(document, connector), number=ROUNDS) / ROUNDS
+        print "%3i items, %4iKB page: regex scan %8.1fus, cursor %6.1fus" % (
+            count, len(content) / 1024, old * 1e6, new * 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+The offline benchmark suite: runs the library against a local stub of the
+SoundCloud API (soundcloud/tests/stub_server.py), which serves the fixture
+responses in benchmarks/fixtures - single resources, offset- and
+linked-partitioned pages of tracks, and creates answered with a 303
+See Other, which the client follows.
+
+Every scenario runs in a process of its own, so that its peak memory can
+be measured: C{peak_rss_kb} is the peak resident size of the scenario's
+process, less that of an idle process, which has done the same imports
+and setup without running a scenario. The results are written as JSON, and
+can be compared with those of an earlier run, e.g. before and after a
+change.
+
+Run it from the root of your working copy::
+
+  $ python benchmarks/suite.py --output before.json
+  $ python benchmarks/suite.py --output after.json --compare before.json
+
+Metrics ending in C{_per_s} are better when higher, all others when lower.
+With C{--compare}, the exit status is 1 if any metric got worse by more
+than C{--threshold} percent.
+"""
+
+import optparse
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simplejson
+
+import soundcloud
+from soundcloud.tests.stub_server import StubServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LIMIT = soundcloud.ApiConnector.LIST_LIMIT
+
+CALLS = 300
+
+MAP_PAGES = 2000
+
+PAGINATION_SIZES = (500, 2500, 10000)
+
+CREATES = 100
+
+UPLOAD_SIZE = 8 * 1024 * 1024
+
+
+def fixture(name):
+    f = open(os.path.join(FIXTURES, name))
+    try:
+        return simplejson.load(f)
+    finally:
+        f.close()
+
+
+def tracks(offset, count):
+    track = fixture("track.json")
+    page = []
+    for id in xrange(offset, offset + count):
+        item = dict(track)
+        item["id"] = id
+        page.append(item)
+    return page
+
+
+# the stub server
+
+def install_routes(server):
+    track = fixture("track.json")
+    server.route("GET", "/me", body=fixture("user.json"))
+    server.route("GET", "/tracks/1", body=dict(track, id=1))
+    location = {"Location" : "http://%s/tracks/1" % server.host}
+    server.route("POST", "/tracks", status=303, headers=location)
+
+    # the pages are rendered up front, so that the scenarios don't measure
+    # the server
+    pages = {}
+    for total in PAGINATION_SIZES:
+        for offset in xrange(0, total + LIMIT, LIMIT):
+            count = max(0, min(LIMIT, total - offset))
+            if (offset, count) not in pages:
+                pages[(offset, count)] = simplejson.dumps(tracks(offset, count))
+
+    def list_tracks(request):
+        query = dict((key, values[0]) for key, values in request.query.iteritems())
+        total = int(query.get("bench_total", 0))
+        offset = int(query.get("cursor", query.get("offset", 0)))
+        count = max(0, min(LIMIT, total - offset))
+        headers = {"Content-Type" : "application/json; charset=utf-8"}
+        if "linked_partitioning" not in query:
+            return 200, headers, pages[(offset, count)]
+        body = '{"collection":%s' % pages[(offset, count)]
+        if offset + count < total:
+            body += ',"next_partition_href":"http://%s/tracks?linked_partitioning=1&bench_total=%i&cursor=%i"' % (
+                server.host, total, offset + count)
+        return 200, headers, body + "}"
+
+    server.route("GET", "/tracks", body=list_tracks)
+
+
+# the scenarios, each run in a process of its own
+
+def scenario_call_throughput(sca):
+    start = time.time()
+    for _ in xrange(CALLS):
+        sca.Track.get(1)
+    elapsed = time.time() - start
+    return dict(calls_per_s=CALLS / elapsed, ms_per_call=elapsed * 1000 / CALLS)
+
+
+def scenario_map_per_item(sca):
+    page = tracks(0, LIMIT)
+    start = time.time()
+    for _ in xrange(MAP_PAGES):
+        sca._map(page, "tracks", None).page()
+    elapsed = time.time() - start
+    return dict(us_per_item=elapsed * 1e6 / (MAP_PAGES * LIMIT))
+
+
+def scenario_nested_access(sca):
+    page = tracks(0, LIMIT)
+    start = time.time()
+    for _ in xrange(MAP_PAGES / 10):
+        for track in sca._map(page, "tracks", None).page():
+            for _ in xrange(10):
+                track.user.username
+                track.user.id
+    elapsed = time.time() - start
+    return dict(us_per_access=elapsed * 1e6 / (MAP_PAGES * LIMIT * 2))
+
+
+def paginate(sca, total, linked):
+    params = {"bench_total" : str(total)}
+    if linked:
+        params["linked_partitioning"] = "1"
+    start = time.time()
+    count = 0
+    for track in sca.tracks(params=params):
+        count += 1
+    elapsed = time.time() - start
+    assert count == total, (count, total)
+    return elapsed * 1e6 / total
+
+
+def scenario_pagination_offset(sca):
+    return dict(("us_per_item_%i" % total, paginate(sca, total, False)) for total in PAGINATION_SIZES)
+
+
+def scenario_pagination_linked(sca):
+    return dict(("us_per_item_%i" % total, paginate(sca, total, True)) for total in PAGINATION_SIZES)
+
+
+def scenario_create(sca):
+    start = time.time()
+    for i in xrange(CREATES):
+        sca.Track.new(title="bench %i" % i)
+    elapsed = time.time() - start
+    return dict(creates_per_s=CREATES / elapsed)
+
+
+def scenario_upload(sca):
+    asset = tempfile.TemporaryFile()
+    try:
+        block = "\0" * (1024 * 1024)
+        for _ in xrange(UPLOAD_SIZE / len(block)):
+            asset.write(block)
+        asset.seek(0)
+        start = time.time()
+        sca.Track.new(title="bench upload", asset_data=asset)
+        elapsed = time.time() - start
+    finally:
+        asset.close()
+    return dict(mb_per_s=UPLOAD_SIZE / elapsed / (1024 * 1024))
+
+
+SCENARIOS = [
+    ("call_throughput", scenario_call_throughput),
+    ("map_per_item", scenario_map_per_item),
+    ("nested_access", scenario_nested_access),
+    ("pagination_offset", scenario_pagination_offset),
+    ("pagination_linked", scenario_pagination_linked),
+    ("create", scenario_create),
+    ("upload", scenario_upload),
+    ]
+
+
+def max_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # bytes instead of kilobytes
+        usage /= 1024
+    return usage
+
+
+"""
+The pseudo-scenario of the process the memory of the others is measured against.
+"""
+IDLE = "idle"
+
+
+def run_scenario(name, host):
+    """
+    @return: the metrics of the scenario, with the absolute peak memory of
+            this process
+    """
+    authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/",
+                                                   StubServer.ACCESS_TOKEN)
+    sca = soundcloud.Scope(soundcloud.ApiConnector(authenticator, host=host, scheme="http"))
+    if name == IDLE:
+        result = {}
+    else:
+        result = dict(SCENARIOS)[name](sca)
+    # ru_maxrss is the high-water mark of the whole process, so it can only
+    # be compared between processes
+    result["peak_rss_kb"] = max_rss_kb()
+    return result
+
+
+# running and comparing
+
+def better_when_higher(metric):
+    return metric.endswith("_per_s")
+
+
+def compare(baseline, results, threshold):
+    """
+    Print the change of every metric against the baseline.
+
+    @return: the number of metrics that got worse by more than threshold percent
+    """
+    regressions = 0
+    print
+    print "%-20s %-18s %12s %12s %8s" % ("scenario", "metric", "baseline", "current", "change")
+    for name, metrics in sorted(results.iteritems()):
+        old_metrics = baseline.get("results", {}).get(name, {})
+        for metric, value in sorted(metrics.iteritems()):
+            old = old_metrics.get(metric)
+            if not old:
+                print "%-20s %-18s %12s %12.2f" % (name, metric, "-", value)
+                continue
+            change = (value - old) * 100.0 / old
+            worse = -change if better_when_higher(metric) else change
+            flag = ""
+            # the peak memory varies by a megabyte or so between runs
+            if worse > threshold and not (metric == "peak_rss_kb" and abs(value - old) <= 1024):
+                flag = "  <- worse"
+                regressions += 1
+            print "%-20s %-18s %12.2f %12.2f %+7.1f%%%s" % (name, metric, old, value, change, flag)
+    return regressions
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("--output", help="write the results as JSON to this file")
+    parser.add_option("--compare", metavar="BASELINE", help="compare the results to those in this file")
+    parser.add_option("--threshold", type="float", default=10.0,
+                      help="the change in percent a metric may get worse by [default: %default]")
+    parser.add_option("--scenario", action="append", dest="scenarios",
+                      help="run only this scenario, may be given several times")
+    parser.add_option("--run", help=optparse.SUPPRESS_HELP)
+    parser.add_option("--host", help=optparse.SUPPRESS_HELP)
+    options = parser.parse_args()[0]
+
+    if options.run:
+        # we are a scenario-process
+        print simplejson.dumps(run_scenario(options.run, options.host))
+        return 0
+
+    names = options.scenarios or [name for name, _ in SCENARIOS]
+    results = {}
+    with StubServer() as server:
+        install_routes(server)
+
+        def run(name):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                              "--run", name, "--host", server.host])
+            del server.requests[:]
+            return simplejson.loads(output.strip().splitlines()[-1])
+
+        idle_rss_kb = run(IDLE)["peak_rss_kb"]
+        print "%-20s peak_rss_kb=%i" % (IDLE, idle_rss_kb)
+        for name in names:
+            results[name] = run(name)
+            results[name]["peak_rss_kb"] = max(0, results[name]["peak_rss_kb"] - idle_rss_kb)
+            print "%-20s %s" % (name, ", ".join("%s=%.2f" % item for item in sorted(results[name].iteritems())))
+
+    report = dict(
+        created_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results,
+        )
+    if options.output:
+        f = open(options.output, "w")
+        try:
+            simplejson.dump(report, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    if options.compare:
+        f = open(options.compare)
+        try:
+            baseline = simplejson.load(f)
+        finally:
+            f.close()
+        if compare(baseline, results, options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -41,7 +41,7 @@ Further Example:
 import urllib
 import urllib2
 import mimetools, mimetypes
-import os, stat
+import os, stat, sys
 
 class Callable:
     def __init__(self, anycallable):
@@ -51,17 +51,111 @@ class Callable:
 #  assigning a sequence.
 doseq = 1
 
+class MultipartBody(object):
+    """
+    A multipart/form-data request body that is produced while it is sent.
+
+    The sizes of the files are determined up front, so the Content-Length
+    is known without reading them. The files are then read in chunks of at
+    most CHUNK_SIZE bytes as httplib asks for data, so the memory needed
+    doesn't depend on the size of the files.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, vars, files, boundary=None):
+        if boundary is None:
+            boundary = mimetools.choose_boundary()
+        self.boundary = boundary
+        # a part is either a string, or a (file, size)-tuple
+        parts = []
+        for(key, value) in vars:
+            if isinstance(value, basestring):
+                value = [value]
+            for sub_value in value:
+                part = ('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                        % (boundary, key, sub_value))
+                if isinstance(part, unicode):
+                    part = part.encode('utf-8')
+                parts.append(part)
+        for(key, fd) in files:
+            filename = getattr(fd, 'name', key).split('/')[-1]
+            contenttype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            parts.append('--%s\r\n' % boundary +
+                         'Content-Disposition: form-data; name="%s"; filename="%s"\r\n' % (key, filename) +
+                         'Content-Type: %s\r\n\r\n' % contenttype)
+            parts.append((fd, file_size(fd)))
+            parts.append('\r\n')
+        parts.append('--%s--\r\n\r\n' % boundary)
+        self._parts = parts
+        self._length = sum(len(part) if isinstance(part, str) else part[1] for part in parts)
+        self._index = 0
+        self._offset = 0
+        # files that can't seek are read from where they are
+        self.rewind()
+
+    def __len__(self):
+        return self._length
+
+    def rewind(self):
+        """
+        Start reading the body from the beginning again.
+
+        @return: False if a file can't be rewound, which means the body can't
+                be sent again.
+        """
+        try:
+            for part in self._parts:
+                if not isinstance(part, str):
+                    part[0].seek(0)
+        except (AttributeError, IOError):
+            return False
+        self._index = 0
+        self._offset = 0
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        size = min(size, self.CHUNK_SIZE)
+        while self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, str):
+                data = part[self._offset:self._offset + size]
+            else:
+                fd, file_size = part
+                data = fd.read(min(size, file_size - self._offset))
+            if data:
+                self._offset += len(data)
+                return data
+            self._index += 1
+            self._offset = 0
+        return ''
+
+
+def file_size(fd):
+    """
+    Determine the size of a file, or a file-like object supporting seek.
+    """
+    try:
+        return os.fstat(fd.fileno())[stat.ST_SIZE]
+    except (AttributeError, IOError, OSError):
+        fd.seek(0, 2)
+        size = fd.tell()
+        fd.seek(0)
+        return size
+
+
 class MultipartPostHandler(urllib2.BaseHandler):
     handler_order = urllib2.HTTPHandler.handler_order - 10 # needs to run first
 
     def http_request(self, request):
         data = request.get_data()
-        if data is not None and type(data) != str:
+        if data is not None and not isinstance(data, (str, MultipartBody)):
             v_files = []
             v_vars = []
             try:
                  for(key, value) in data.items():
-                     if type(value) == file:
+                     if hasattr(value, "read"):
                          v_files.append((key, value))
                      else:
                          v_vars.append((key, value))
@@ -82,30 +176,9 @@ class MultipartPostHandler(urllib2.BaseHandler):
             request.add_data(data)
         return request
 
-    def multipart_encode(vars, files, boundary = None, buffer = None):
-        if boundary is None:
-            boundary = mimetools.choose_boundary()
-        if buffer is None:
-            buffer = ''
-        for(key, value) in vars:
-            if isinstance(value, basestring):
-                value = [value]
-            for sub_value in value:
-                buffer += '--%s\r\n' % boundary
-                buffer += 'Content-Disposition: form-data; name="%s"' % key
-                buffer += '\r\n\r\n' + sub_value + '\r\n'
-        for(key, fd) in files:
-            file_size = os.fstat(fd.fileno())[stat.ST_SIZE]
-            filename = fd.name.split('/')[-1]
-            contenttype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-            buffer += '--%s\r\n' % boundary
-            buffer += 'Content-Disposition: form-data; name="%s"; filename="%s"\r\n' % (key, filename)
-            buffer += 'Content-Type: %s\r\n' % contenttype
-            # buffer += 'Content-Length: %s\r\n' % file_size
-            fd.seek(0)
-            buffer += '\r\n' + fd.read() + '\r\n'
-        buffer += '--%s--\r\n\r\n' % boundary
-        return boundary, buffer
+    def multipart_encode(vars, files, boundary = None):
+        body = MultipartBody(vars, files, boundary)
+        return body.boundary, body
     multipart_encode = Callable(multipart_encode)
 
     https_request = http_request
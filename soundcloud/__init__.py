@@ -21,16 +21,47 @@
 import urllib
 import urllib2
 import re
+import collections
+import httplib
+import os
+import Queue
+import socket
+import sys
+import threading
+import time
+import types
+import weakref
 
 import logging
-import simplejson
 import cgi
 from soundcloud.MultipartPostHandler import MultipartPostHandler
+from soundcloud.jsonstream import CollectionStream
+from soundcloud.cache import CacheEntry
+from soundcloud import jsonbackend
+from soundcloud.metrics import (
+    MetricsHook,
+    RequestEvent,
+    )
+from soundcloud.retry import (
+    RetryPolicy,
+    )
+from soundcloud.throttle import (
+    ThrottledFile,
+    TokenBucket,
+    )
+from soundcloud.connection import (
+    ConnectionPool,
+    PooledHTTPHandler,
+    )
+from contextlib import contextmanager
 from inspect import isclass
+from operator import itemgetter
+from multiprocessing.pool import ThreadPool
 import urlparse
 from soundcloud.util import (
     escape,
     MultiDict,
+    truncate,
     )
 
 logging.basicConfig()
@@ -46,6 +77,12 @@ DEFAULT_CONNECT_URL = "https://soundcloud.com/connect"
 DEFAULT_TOKEN_URL = "https://api.soundcloud.com/oauth2/token"
 DEFAULT_API_HOST = "api.soundcloud.com"
 
+# the method of a single resource, like "tracks/123"
+RESOURCE_METHOD = re.compile(r"^([a-z_]+)/(\d+)$")
+
+# the resources a path refers to, like "tracks/123" in "/tracks/123/permissions"
+RESOURCE_IDS = re.compile(r"([a-z_]+)/(\d+)")
+
 
 __all__ = ['SoundCloudAPI', 'USE_PROXY', 'PROXY']
 
@@ -78,13 +115,62 @@ class UnknownContentType(Exception):
     def __str__(self):
         return str(self)
 
-class PartitionCollectionGenerator():
-  def __init__(self, scope, method, Gen, NextPartition):
-    self.NextPartition = NextPartition
-    self.Generator = Gen
+class DownloadIncomplete(Exception):
+    pass
+
+def parse_content_range(value):
+    """
+    Parse a Content-Range header like "bytes 100-199/1000".
+
+    @return: the first byte, and the total size or None if unknown
+    @rtype: tuple<int, int|None>
+    """
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", value or "")
+    if match is None:
+        raise DownloadIncomplete("Invalid Content-Range: %r" % value)
+    start, total = match.groups()
+    if total == "*":
+        return int(start), None
+    return int(start), int(total)
+
+class PartitionCollectionGenerator(object):
+  """
+  A collection of resources, as returned for list-results of the API. It's
+  iterated lazily, and fetches the following pages of the collection as
+  needed - either by offset, or by following the next_partition_href when
+  linked partitioning is used.
+  """
+  def __init__(self, scope, method, items, cls, path_stack, continue_list_fetching, document=None):
+    """
+    @param items: the raw items of this page
+    @type items: list|generator
+    @param document: for linked partitioning, the decoded page the items are
+            the collection of. It contains the next_partition_href.
+    @type document: None|dict
+    """
+    self._document = document
+    self._cursor = None
     self.Scope = scope
     self.Method = method
-    
+    self._items = items
+    self._cls = cls
+    self._path_stack = path_stack
+    self._continue_list_fetching = continue_list_fetching
+    self.Generator = self._walk()
+
+  @property
+  def NextPartition(self):
+    """
+    The L{PartitionCursor} of the next page for linked partitioning, or
+    None. When the page is streamed, it's available once the items
+    have been consumed.
+    """
+    if self._cursor is None and self._document is not None:
+      href = self._document.get('next_partition_href')
+      if href:
+        self._cursor = PartitionCursor.parse(href, self.Scope._get_connector())
+    return self._cursor
+
   def __iter__(self):
     return self.Generator
   def next(self):
@@ -94,25 +180,252 @@ class PartitionCollectionGenerator():
       for line in self.content:
           if line == someParam:
             yield line
-            
-  def GetNextPartition(self):
-    if self.NextPartition != None:
-        method = re.search('(^[a-z]+)', self.Method).group(0)
-        params = re.search('\?.+', self.NextPartition).group(0)
-        params = params.replace('u0026', '&')
 
-        return self.Scope._call(method, params)
+  def _walk(self, wrap=True):
+    """
+    Yields the resources of this page and all the following ones.
+
+    The pages are walked in a flat loop, so the stack-depth and the
+    per-item overhead stay the same no matter how many pages there are.
+
+    @param wrap: if False, the raw decoded items are yielded instead of
+            resources
+    """
+    page = self
+    while page is not None:
+      count = 0
+      if wrap:
+        cls, scope, path_stack = page._cls, page.Scope, page._path_stack
+        for item in page._items:
+          yield cls(item, scope, path_stack)
+          count += 1
+      else:
+        for item in page._items:
+          yield item
+          count += 1
+      page = page._next_page(count)
+
+  def raw(self):
+    """
+    Iterate over the decoded items of the collection, without creating
+    resources for them.
+
+    Like the other accessors, this starts over at this page, independent
+    of how far the collection itself has been iterated.
+
+    @return: a generator of dicts
+    """
+    return self._walk(wrap=False)
+
+  def ids(self):
+    """
+    Iterate over the ids of the resources in the collection, without
+    creating resources for them:
+
+    >>> known = set(scope.me().favorites().ids())
+
+    @return: a generator of ids
+    """
+    return (item['id'] for item in self._walk(wrap=False))
+
+  def fields(self, *names):
+    """
+    Iterate over some fields of the resources in the collection, without
+    creating resources for them:
+
+    >>> for id, title in scope.tracks().fields("id", "title"):
+    ...     print id, title
+
+    Missing fields are returned as None.
+
+    @param names: the names of the fields
+    @return: a generator of tuples of the values
+    """
+    return (tuple(item.get(name) for name in names) for item in self._walk(wrap=False))
+
+  def lazy(self):
+    """
+    Fetch the whole collection, but keep only the decoded items. A resource
+    is created from an item when it's accessed.
+
+    @rtype: LazyResources
+    """
+    return LazyResources(list(self._walk(wrap=False)), self._cls, self.Scope)
+
+  def _next_page(self, count):
+    """
+    Fetch the page following this one.
+
+    @param count: the number of items this page contained
+    @return: the next page, or None if this was the last one
+    @rtype: PartitionCollectionGenerator|None
+    """
+    if self._document is not None:
+      page = self.GetNextPartition()
+    elif count == ApiConnector.LIST_LIMIT:
+      page = self._continue_list_fetching()
+    else:
+      return None
+    if isinstance(page, PartitionCollectionGenerator):
+      return page
+    return None
+
+  def page(self):
+    """
+    Return the resources of this page only, without fetching any further pages.
+
+    @rtype: list<RESTBase>
+    """
+    cls, scope, path_stack = self._cls, self.Scope, self._path_stack
+    return [cls(item, scope, path_stack) for item in self._items]
+
+  def prefetch(self, depth=2):
+    """
+    Iterate over the collection while the following pages are fetched in
+    the background. A usage example would look like this:
+
+    >>> for user in scope.users().prefetch(4):
+    ...     print user.username
+
+    With offset-pagination, the next C{depth} pages are requested
+    concurrently while the current page is being consumed. At most C{depth}
+    pages are buffered ahead of the consumer. With linked partitioning the
+    location of a page is only known once its predecessor arrived, so only
+    the very next page is fetched ahead.
+
+    Use this on a fresh collection, it always starts with the first page.
+    Note that the number of concurrent requests is also bounded by
+    the connection pool's C{max_per_host}.
+
+    @type depth: int
+    @param depth: the number of pages to fetch ahead
+    @return: a generator yielding the resources of the collection
+    """
+    depth = max(1, depth)
+    linked = self._document is not None
+    pool = ThreadPool(1 if linked else depth)
+    try:
+      pending = collections.deque()
+      pages_ahead = 0
+      page = self
+      while page is not None:
+        # we need to know the size of the page up front
+        if not isinstance(page._items, list):
+          page._items = list(page._items)
+        count = len(page._items)
+        # keep the read-ahead window filled
+        if linked:
+          if page.NextPartition is not None:
+            pending.append(pool.apply_async(page.GetNextPartition))
+        elif count == ApiConnector.LIST_LIMIT:
+          while len(pending) < depth:
+            pages_ahead += 1
+            pending.append(pool.apply_async(self._continue_list_fetching, (pages_ahead,)))
+        else:
+          # the last page - whatever is still in flight lies beyond the end
+          pending.clear()
+        cls, scope, path_stack = page._cls, page.Scope, page._path_stack
+        for item in page._items:
+          yield cls(item, scope, path_stack)
+        page = None
+        if pending:
+          page = pending.popleft().get()
+          if not isinstance(page, PartitionCollectionGenerator):
+            page = None
+    finally:
+      pool.close()
+
+  def GetNextPartition(self):
+    cursor = self.NextPartition
+    if cursor is not None:
+        # the cursor's method is absolute, so it's called on the root scope
+        root = Scope(self.Scope._get_connector())
+        return root._call(cursor.method, params=cursor.params)
     else:
         return None
 
+
+class LazyResources(object):
+    """
+    A read-only sequence of resources, that are created from their decoded
+    data only when they are accessed. See
+    L{PartitionCollectionGenerator.lazy}.
+
+    Each access creates a new resource object.
+    """
+
+    def __init__(self, items, cls, scope):
+        self._items = items
+        self._cls = cls
+        self._scope = scope
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyResources(self._items[index], self._cls, self._scope)
+        return self._cls(self._items[index], self._scope)
+
+    def __iter__(self):
+        cls, scope = self._cls, self._scope
+        for item in self._items:
+            yield cls(item, scope)
+
+    def ids(self):
+        return [item['id'] for item in self._items]
+
+    def fields(self, *names):
+        return [tuple(item.get(name) for name in names) for item in self._items]
+
+    def raw(self):
+        return self._items
+
+
+class PartitionCursor(object):
+    """
+    The location of the next page of a collection with linked partitioning,
+    parsed from the next_partition_href of a page.
+    """
+
+    def __init__(self, method, params):
+        """
+        @param method: the API-method to call
+        @param params: the query-parameters to pass, including the cursor
+        @type params: dict<str, str>
+        """
+        self.method = method
+        self.params = params
+
+    @classmethod
+    def parse(cls, href, connector):
+        """
+        @param href: the next_partition_href of a page
+        @type connector: ApiConnector
+        @rtype: PartitionCursor
+        """
+        if isinstance(href, unicode):
+            href = href.encode("utf-8")
+        _, _, _, _, query, _ = urlparse.urlparse(href)
+        params = dict((key, value) for key, value in urlparse.parse_qsl(query, keep_blank_values=True)
+                      if key != 'oauth_token')
+        return cls(connector.normalize_method(href), params)
+
+    def __repr__(self):
+        return "<PartitionCursor %s %r>" % (self.method, self.params)
+
 class OAuth2Authenticator(object):
 
-    def __init__(self, client_id, client_secret, redirect_uri, access_token=None, authorization_code=None):
+    def __init__(self, client_id, client_secret, redirect_uri, access_token=None, authorization_code=None, pool=None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.authorization_code = authorization_code
         self.access_token = access_token
+        # the ApiConnector hands us its pool if we don't have one
+        self.pool = pool
+        # and its JSON-backend
+        self.json_backend = None
 
     def construct_connect_url(self):
         return "%s?client_id=%s&redirect_uri=%s&response_type=code&scope=non-expiring" % (DEFAULT_CONNECT_URL, self.client_id, self.redirect_uri)
@@ -127,10 +440,13 @@ class OAuth2Authenticator(object):
             }
         data = urllib.urlencode(params)
         req = urllib2.Request(url, data)
-        resp = urllib2.urlopen(req)
+        handlers = []
+        if self.pool is not None:
+            handlers.append(PooledHTTPHandler(self.pool))
+        resp = urllib2.build_opener(*handlers).open(req)
         try:
             content = resp.read()
-            res = simplejson.loads(content)
+            res = (self.json_backend or jsonbackend.get()).loads(content)
             token = res['access_token']
             self.access_token = token
             return token
@@ -161,7 +477,15 @@ class ApiConnector(object):
     """
     LIST_LIMIT_PARAMETER = 'limit'
 
-    def __init__(self, authenticator, host=DEFAULT_API_HOST, base="", collapse_scope=True):
+    """
+    The maximum number of characters of a response body that is logged.
+    """
+    LOG_BODY_LIMIT = 1024
+
+    def __init__(self, authenticator, host=DEFAULT_API_HOST, base="", collapse_scope=True, pool=None, cache=None,
+                 stream_collections=False, compact=False, scheduler=None, retry=None, scheme="https",
+                 single_flight=None, metrics=None, log_bodies=False, identity_map=False, json_backend=None,
+                 resource_cache=None):
         """
         Constructor for the API-Singleton. Use it once with parameters, and then the
         subsequent calls internal to the API will work.
@@ -173,6 +497,43 @@ class ApiConnector(object):
         @param user: if given, the username for basic HTTP authentication
         @type password: str
         @param password: if the user is given, you have to give a password as well
+        @type pool: soundcloud.connection.ConnectionPool
+        @param pool: the pool of keep-alive connections to use. If not given, a new one
+                is created.
+        @type cache: soundcloud.cache.ResponseCache
+        @param cache: if given, GET-responses are cached and revalidated through it
+        @type stream_collections: bool
+        @param stream_collections: if True, collections are decoded incrementally and their
+                items handed out as they arrive. The connection is then in use until the page
+                has been consumed. Responses that are cached aren't streamed.
+        @type compact: bool
+        @param compact: if True, resources are created in their compact representation,
+                see L{RESTBase.compact}
+        @type scheduler: soundcloud.throttle.RequestScheduler
+        @param scheduler: if given, requests are rate-limited through it, and requests
+                that are throttled by the server are queued again
+        @type retry: soundcloud.retry.RetryPolicy
+        @param retry: if given, requests that failed transiently are retried according to it
+        @type scheme: str
+        @param scheme: "https", or "http" e.g. for a local test-server
+        @type single_flight: soundcloud.singleflight.SingleFlight
+        @param single_flight: if given, identical GETs running at the same time share one
+                request. Not used for streamed collections.
+        @type metrics: soundcloud.metrics.MetricsHook
+        @param metrics: if given, every call is reported to it as a L{soundcloud.metrics.RequestEvent}
+        @type log_bodies: bool
+        @param log_bodies: if True, response bodies are logged at debug-level, truncated to
+                LOG_BODY_LIMIT characters
+        @type identity_map: bool
+        @param identity_map: if True, nested resources with the same kind and id that are
+                read in the same scope are the same object, as long as it is referenced
+                somewhere. It keeps the data it was first created with.
+        @type json_backend: str | soundcloud.jsonbackend.JsonBackend
+        @param json_backend: the JSON-decoder to use, or its name, e.g. "json". If not given,
+                the fastest one that is installed, see L{soundcloud.jsonbackend}
+        @type resource_cache: soundcloud.cache.DiskResourceCache
+        @param resource_cache: if given, resources are stored in it, and GETs of single
+                resources are answered from it without a request
 
         """
         self.host = host
@@ -183,6 +544,65 @@ class ApiConnector(object):
         self.authenticator = authenticator
         self._base = base
         self.collapse_scope = collapse_scope
+        if pool is None:
+            pool = ConnectionPool()
+        self.pool = pool
+        self.cache = cache
+        self.stream_collections = stream_collections
+        self.compact = compact
+        self.scheduler = scheduler
+        self.retry = retry
+        self.scheme = scheme
+        self.single_flight = single_flight
+        if metrics is None:
+            metrics = MetricsHook()
+        self.metrics = metrics
+        self.log_bodies = log_bodies
+        self.identity_map = weakref.WeakValueDictionary() if identity_map else None
+        # the openers of API-calls, per thread, see api_opener
+        self._openers = threading.local()
+        if not isinstance(json_backend, jsonbackend.JsonBackend):
+            json_backend = jsonbackend.get(json_backend)
+        self.json_backend = json_backend
+        self.resource_cache = resource_cache
+        # let token-requests share our connections
+        if getattr(authenticator, "pool", None) is None:
+            authenticator.pool = pool
+        if getattr(authenticator, "json_backend", None) is None:
+            authenticator.json_backend = json_backend
+
+    def build_opener(self, *handlers):
+        """
+        Create an urllib2-opener that performs its requests over the
+        keep-alive connections of our pool.
+
+        @param handlers: additional handlers, see urllib2.build_opener
+        @rtype: urllib2.OpenerDirector
+        """
+        return urllib2.build_opener(PooledHTTPHandler(self.pool), *handlers)
+
+    def api_opener(self, multipart=False):
+        """
+        Return the opener for API-calls. Building an opener is a good part
+        of the time a call takes, so each thread keeps its own and reuses
+        it - the handlers keep no state of a call, that's in its
+        L{ApiRequest}.
+
+        @param multipart: if True, the opener encodes the parameters as
+                multipart/form-data
+        @rtype: urllib2.OpenerDirector
+        """
+        key = (multipart, USE_PROXY, PROXY)
+        openers = self._openers.__dict__
+        opener = openers.get(key)
+        if opener is None:
+            handlers = [SCRedirectHandler()]
+            if USE_PROXY:
+                handlers.append(urllib2.ProxyHandler({'http' : PROXY}))
+            if multipart:
+                handlers.append(MultipartPostHandler)
+            opener = openers[key] = self.build_opener(*handlers)
+        return opener
 
     def normalize_method(self, method):
         """ 
@@ -205,26 +625,52 @@ class ApiConnector(object):
 class SCRedirectHandler(urllib2.HTTPRedirectHandler):
     """
     A urllib2-Handler to deal with the redirects the RESTful API of SC uses.
+
+    It keeps no state of its own, so that an opener can be reused: the
+    location and the number of redirects are stored in the original
+    L{ApiRequest}.
     """
-    alternate_method = None
 
     def http_error_303(self, req, fp, code, msg, hdrs):
         """
         In case of return-code 303 (See-other), we have to store the location we got
         because that will determine the actual type of resource returned.
         """
-        self.alternate_method = hdrs['location']
+        origin = req.origin
+        origin.location = hdrs['location']
+        origin.redirects += 1
         # for oauth, we need to re-create the whole header-shizzle. This
         # does it - it recreates a full url and signs the request
-        new_url = self.alternate_method
+        new_url = origin.location
 #         if USE_PROXY:
 #             import pdb; pdb.set_trace()
 #             old_url = req.get_full_url()
 #             protocol, host, _, _, _, _ = urlparse.urlparse(old_url)
 #             new_url = urlparse.urlunparse((protocol, host, self.alternate_method, None, None, None))
+        timeout = req.timeout
         req = req.recreate_request(new_url)
+        # set by the opener for the original request only
+        req.timeout = timeout
+        req.origin = origin
         return urllib2.HTTPRedirectHandler.http_error_303(self, req, fp, code, msg, hdrs)
 
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        """
+        urllib2 follows a redirect with a plain urllib2.Request. We use an
+        L{ApiRequest} instead, so that further redirects of the chain are
+        recorded in the same origin.
+        """
+        new = urllib2.HTTPRedirectHandler.redirect_request(self, req, fp, code, msg, headers, newurl)
+        if new is None or not isinstance(req, ApiRequest):
+            return new
+        redirected = ApiRequest(new.get_full_url(), req.scope)
+        redirected.headers = new.headers
+        redirected.origin_req_host = new.origin_req_host
+        redirected.unverifiable = new.unverifiable
+        redirected.origin = req.origin
+        redirected.timeout = req.timeout
+        return redirected
+
     def http_error_201(self, req, fp, code, msg, hdrs):
         """
         We fake a 201 being a 303 so that our redirection-scheme takes place
@@ -237,6 +683,36 @@ class SCRedirectHandler(urllib2.HTTPRedirectHandler):
             raise NoResultFromRequest()
         return self.http_error_303(req, fp, 303, msg, hdrs)
 
+class ApiRequest(urllib2.Request):
+    """
+    The request of an API-call. It can use another HTTP-method than GET and
+    POST, like "PUT", and is re-created by the L{SCRedirectHandler} when
+    following a redirect.
+    """
+
+    def __init__(self, url, scope, alternate_http_method=None, has_parameters=False):
+        urllib2.Request.__init__(self, url)
+        self.scope = scope
+        self.alternate_http_method = alternate_http_method
+        self.has_parameters = has_parameters
+        # the request that was sent first, which records the redirects
+        # that were followed: their number and the final location
+        self.origin = self
+        self.redirects = 0
+        self.location = None
+
+    def get_method(self):
+        if self.alternate_http_method is not None:
+            return self.alternate_http_method
+        return urllib2.Request.get_method(self)
+
+    def has_data(self):
+        return self.has_parameters
+
+    def recreate_request(self, location):
+        return self.scope._create_request(location, self.scope._get_connector(), None, None)
+
+
 class Scope(object):
     """
     The basic means to query and create resources. The Scope uses the L{ApiConnector} to
@@ -283,6 +759,8 @@ class Scope(object):
             scope = parent._scope + scope
         self._scope = scope
         self._connector = connector
+        # the part of our URLs between base and method, see _path_prefix
+        self._prefix = None
 
     def _get_connector(self):
         return self._connector
@@ -344,7 +822,7 @@ class Scope(object):
         """
         This method returnes the urllib2.Request to perform the actual HTTP-request.
 
-        We return a subclass that overload the get_method-method to return a custom method like "PUT".
+        We return an L{ApiRequest}, which can use a custom method like "PUT".
         Additionally, the request is enhanced with the current authenticators authorization scheme
         headers.
 
@@ -359,20 +837,7 @@ class Scope(object):
         @return: the fully equipped request
         @rtype: urllib2.Request
         """
-        class MyRequest(urllib2.Request):
-            def get_method(self):
-                if alternate_http_method is not None:
-                    return alternate_http_method
-                return urllib2.Request.get_method(self)
-
-            def has_data(self):
-                return parameters is not None
-
-            @classmethod
-            def recreate_request(cls, location):
-                return self._create_request(location, connector, None, None)
-        
-        req = MyRequest(url)
+        req = ApiRequest(url, self, alternate_http_method, parameters is not None)
 
         req.add_header("Accept", "application/json")
         if parameters is None and req.get_method() in ['PUT', 'POST']:
@@ -403,6 +868,24 @@ class Scope(object):
         return "?" + "&".join(h)
 
 
+    def _path_prefix(self):
+        """
+        @return: the path of the resources we belong to, like "users/1/" - or
+                only the innermost one, if the connector collapses scopes. It's
+                computed once, the ids of resources don't change.
+        @rtype: str
+        """
+        prefix = self._prefix
+        if prefix is None:
+            prefix = ''
+            if self._scope:
+                scopes = self._scope
+                if self._connector.collapse_scope:
+                    scopes = scopes[-1:]
+                prefix = "/".join([sc._scope() for sc in scopes]) + "/"
+            self._prefix = prefix
+        return prefix
+
     def _call(self, method, *args, **kwargs):
         """
         The workhorse. It's complicated, convoluted and beyond understanding of a mortal being.
@@ -417,17 +900,25 @@ class Scope(object):
             queryparams['offset'] = offset
             __offset__ = offset + ApiConnector.LIST_LIMIT
 
-        if "params" in kwargs:
-            queryparams.update(kwargs.pop("params"))
+        params = kwargs.pop("params", None)
+        if params:
+            queryparams.update(params)
 
-        # create a closure to invoke this method again with a greater offset
+        # create a closure to invoke this method again with a greater offset.
+        # pages_ahead allows to fetch pages further down the list, which is
+        # used for prefetching.
         _cl_method = method
         _cl_args = tuple(args)
         _cl_kwargs = {}
         _cl_kwargs.update(kwargs)
-        _cl_kwargs["__offset__"] = __offset__
-        def continue_list_fetching():
-            return self._call(method, *_cl_args, **_cl_kwargs)
+        # further pages are filtered the same way, but have their own offset
+        if params:
+            _cl_kwargs["params"] = dict((key, value) for key, value in params.iteritems()
+                                        if key != ApiConnector.LIST_OFFSET_PARAMETER)
+        def continue_list_fetching(pages_ahead=1):
+            cl_kwargs = dict(_cl_kwargs)
+            cl_kwargs["__offset__"] = __offset__ + (pages_ahead - 1) * ApiConnector.LIST_LIMIT
+            return self._call(method, *_cl_args, **cl_kwargs)
 
         connector = self._get_connector()
 
@@ -445,6 +936,7 @@ class Scope(object):
             alternate_http_method = kwargs.pop("_alternate_http_method")
         urlparams = kwargs if kwargs else None
         use_multipart = False
+        fileargs = {}
         if urlparams is not None:
             fileargs = dict((key, value) for key, value in urlparams.iteritems() if filelike(value))
             use_multipart = bool(fileargs)
@@ -462,21 +954,9 @@ class Scope(object):
         if args:
             method = "%s%s" % (method, "/".join(str(a) for a in args))
 
-        scope = ''
-        if self._scope:
-            scopes = self._scope
-            if connector.collapse_scope:
-                scopes = scopes[-1:]
-            scope = "/".join([sc._scope() for sc in scopes]) + "/"
-        url = "https://%(host)s/%(base)s%(scope)s%(method)s%(queryparams)s" % dict(host=connector.host, method=method, base=connector._base, scope=scope, queryparams=self._create_query_string(queryparams))
-
-        # we need to install SCRedirectHandler
-        # to gather possible See-Other redirects
-        # so that we can exchange our method
-        redirect_handler = SCRedirectHandler()
-        handlers = [redirect_handler]
-        if USE_PROXY:
-            handlers.append(urllib2.ProxyHandler({'http' : PROXY}))
+        path = "/%s%s%s" % (connector._base, self._path_prefix(), method)
+        url = "%s://%s%s%s" % (connector.scheme, connector.host, path, self._create_query_string(queryparams))
+
         req = self._create_request(url, connector, urlparams, queryparams, alternate_http_method, use_multipart)
 
         http_method = req.get_method()
@@ -486,59 +966,265 @@ class Scope(object):
             logger.debug("Fetching url: %s, method: %s", url, http_method)
 
             
-        if use_multipart:
-            handlers.extend([MultipartPostHandler])            
-        else:
+        if not use_multipart:
             if urlparams is not None:
                 urlparams = urllib.urlencode(urlparams.items(), True)
-        opener = urllib2.build_opener(*handlers)
+        # GETs are answered from the cache if the server confirms our copy
+        # is still valid, everything else invalidates what it touches.
+        cache = connector.cache
+        cache_key = cached = None
+        if cache is not None:
+            if http_method == "GET":
+                cache_key = cache.key(path, dict((k, v) for k, v in queryparams.iteritems() if k != 'oauth_token'),
+                                      queryparams['oauth_token'])
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    for header, value in cached.conditional_headers().iteritems():
+                        req.add_header(header, value)
+            else:
+                cache.invalidate(path)
+
+        # single resources are taken from the resource-cache if it has them,
+        # writes drop those they touch
+        resource_cache = connector.resource_cache
+        namespace = None
+        if resource_cache is not None:
+            namespace = resource_cache.namespace(queryparams['oauth_token'])
+            if http_method == "GET":
+                m = RESOURCE_METHOD.match(method)
+                if m is not None and len(queryparams) == 1 and not self._scope and m.group(1) in RESTBase.REGISTRY:
+                    data = resource_cache.get(namespace, RESTBase.REGISTRY[m.group(1)].KIND, int(m.group(2)))
+                    if data is not None:
+                        logger.debug("Using the cached resource for %s", url)
+                        return self._map(data, method, continue_list_fetching)
+            else:
+                for name, id in RESOURCE_IDS.findall(path):
+                    if name in RESTBase.REGISTRY:
+                        resource_cache.invalidate(namespace, RESTBase.REGISTRY[name].KIND, int(id))
+
+        # the RequestEvent of this call, if there are metrics to report to
+        event = None
+
+        def fetch():
+            """
+            Perform the request.
+
+            @return: a callable mapping the response to the result of the call
+            """
+            # a failed request can be sent again, which an upload only can if
+            # its files can be read again from the start.
+            def rewind():
+                data = req.get_data()
+                if hasattr(data, "rewind"):
+                    return data.rewind()
+                return True
+
+            scheduler = connector.scheduler
+            retry = connector.retry
+            # its SCRedirectHandler records See-Other redirects in req, so
+            # that we can exchange our method
+            opener = connector.api_opener(use_multipart)
+            data = urlparams
+            attempt = throttled = 0
+            while True:
+                if retry is not None:
+                    retry.before_request(connector.host)
+                if scheduler is not None:
+                    scheduler.acquire(path)
+                handle = None
+                try:
+                    try:
+                        handle = opener.open(req, data)
+                    finally:
+                        # the handlers have encoded the body by now
+                        if event is not None:
+                            event.request(req.get_data())
+                    info = handle.info()
+                    ct = info.get('Content-Type', '')
+                    stream = (connector.stream_collections and http_method == "GET" and cache_key is None
+                              and "application/json" in ct)
+                    if event is not None:
+                        event.response(handle, req.redirects)
+                    if not stream:
+                        started = time.time()
+                        content = handle.read()
+                        if event is not None:
+                            event.download = time.time() - started
+                            event.bytes_in = len(content)
+                except NoResultFromRequest:
+                    if retry is not None:
+                        retry.record(connector.host)
+                    return lambda: None
+                except urllib2.HTTPError, e:
+                    if event is not None:
+                        event.response(e, req.redirects)
+                    if retry is not None:
+                        retry.record(connector.host, e)
+                    if http_method == "GET" and e.code == 404:
+                        return lambda: None
+                    if e.code == 304 and cached is not None:
+                        e.close()
+                        logger.debug("Not modified, using cached content for %s", url)
+                        return lambda: self._map(cached.content, cached.method, continue_list_fetching)
+                    e.close()
+                    if (scheduler is not None and rewind()
+                        and scheduler.throttled(path, e.code, e.info().get('Retry-After'), throttled)):
+                        throttled += 1
+                    elif retry is not None and retry.should_retry(http_method, e, attempt, rewind):
+                        attempt += 1
+                    else:
+                        raise
+                    data = req.get_data()
+                    continue
+                except RetryPolicy.TRANSIENT_ERRORS, e:
+                    if handle is not None:
+                        handle.close()
+                    if retry is not None:
+                        retry.record(connector.host, e)
+                        if retry.should_retry(http_method, e, attempt, rewind):
+                            attempt += 1
+                            data = req.get_data()
+                            continue
+                    raise
+                except Exception:
+                    # anything else must not leave a half-open circuit
+                    # waiting for the outcome of this request - if there
+                    # is a response, the host is fine
+                    if handle is not None:
+                        handle.close()
+                    if retry is not None:
+                        if handle is not None:
+                            retry.record(connector.host)
+                        else:
+                            retry.abandon(connector.host)
+                    raise
+                if retry is not None:
+                    retry.record(connector.host)
+                break
+
+            result_method = method
+            if req.location is not None:
+                result_method = connector.normalize_method(req.location)
+                logger.debug("Method changed through redirect to: <%s>", result_method)
+
+            if stream:
+                return lambda: self._map_stream(handle, result_method, continue_list_fetching)
+
+            logger.debug("Content-type:%s", ct)
+            if connector.log_bodies:
+                logger.debug("Response body:\n%s", truncate(content, connector.LOG_BODY_LIMIT))
+
+            try:
+                if "application/json" in ct:
+                    content = content.strip()
+                    if not content:
+                        content = "{}"
+                    started = time.time()
+                    try:
+                        res = connector.json_backend.loads(content)
+                    except:
+                        logger.error("Couldn't decode returned json")
+                        logger.error(truncate(content, connector.LOG_BODY_LIMIT))
+                        raise
+                    if event is not None:
+                        event.decode = time.time() - started
+                    if cache_key is not None and (info.get('ETag') or info.get('Last-Modified')):
+                        cache.set(cache_key, CacheEntry(path, res, result_method,
+                                                        etag=info.get('ETag'),
+                                                        last_modified=info.get('Last-Modified')))
+                    # the response of a write is only a resource if it was
+                    # redirected to one
+                    if resource_cache is not None and (http_method == "GET" or req.location is not None):
+                        self._store_resources(resource_cache, namespace, res, result_method)
+                    return lambda: self._map(res, result_method, continue_list_fetching)
+                elif len(content) <= 1:
+                    # this might be the famous SeeOtherSpecialCase which means that
+                    # all that matters is just the method
+                    pass
+                raise UnknownContentType("%s, returned:\n%s" % (ct, content))
+            finally:
+                handle.close()
+
+        def send():
+            # identical GETs in flight at the same time share one request, but
+            # each caller maps the response on its own.
+            single_flight = connector.single_flight
+            if single_flight is not None and http_method == "GET" and not connector.stream_collections:
+                return single_flight.do(url, fetch)
+            return fetch()
+
+        metrics = connector.metrics
+        if not metrics.enabled:
+            return send()()
+        event = RequestEvent(http_method, path)
         try:
-            handle = opener.open(req, urlparams)
-        except NoResultFromRequest:
-            return None
-        except urllib2.HTTPError, e:
-            if http_method == "GET" and e.code == 404:
-                return None
+            mapper = send()
+            started = time.time()
+            res = mapper()
+            event.map = time.time() - started
+            return res
+        except:
+            event.error = sys.exc_info()[1]
             raise
+        finally:
+            event.finish()
+            metrics.request(event)
 
-        info = handle.info()
-        ct = info['Content-Type']
-        content = handle.read()
-        logger.debug("Content-type:%s", ct)
-        logger.debug("Request Content:\n%s", content)
-        if redirect_handler.alternate_method is not None:
-            method = connector.normalize_method(redirect_handler.alternate_method)
-            logger.debug("Method changed through redirect to: <%s>", method)
+    def _resource_class(self, cls):
+        """
+        @return: the class to create resources of cls with - the compact one,
+                if our connector asks for it
+        """
+        if self._connector.compact:
+            return cls.compact()
+        return cls
 
+    def _store_resources(self, resource_cache, namespace, res, method):
+        """
+        Store the resources of a decoded response in the resource-cache.
+        """
+        for part in reversed(method.split("/")):
+            if part in RESTBase.REGISTRY:
+                kind = RESTBase.REGISTRY[part].KIND
+                break
+        else:
+            return
+        if isinstance(res, dict):
+            items = res.get('collection', [res])
+        else:
+            items = res
+        items = [item for item in items if isinstance(item, dict) and "id" in item]
+        if items:
+            resource_cache.set_many(namespace, kind, items)
+
+    def _map_stream(self, handle, method, continue_list_fetching):
+        """
+        Like L{_map}, but for a response that has not been read yet. The
+        response is decoded incrementally, and the items of a collection are
+        mapped as they arrive. The handle is closed once they are exhausted.
+        """
+        stream = CollectionStream(handle, self._connector.json_backend.decoder)
         try:
-            if "application/json" in ct:
-                content = content.strip()
-                #If linked partitioning is on, extract the URL to the next collection:
-                partition_url = None
-                if method.find('linked_partitioning=1') != -1:  
-                  pattern = re.compile('(next_partition_href":")(.*?)(")')
-                  if pattern.search(content):
-                    partition_url = pattern.search(content).group(2)
-
-                if not content:
-                    content = "{}"
-                try:
-                    res = simplejson.loads(content)                    
-                except:
-                    logger.error("Couldn't decode returned json")
-                    logger.error(content)
-                    raise
-                res = self._map(res, method, continue_list_fetching, partition_url)
-                return res
-            elif len(content) <= 1:
-                # this might be the famous SeeOtherSpecialCase which means that
-                # all that matters is just the method
-                pass
-            raise UnknownContentType("%s, returned:\n%s" % (ct, content))
-        finally:
+            is_collection = stream.start()
+        except:
             handle.close()
+            logger.error("Couldn't decode returned json")
+            raise
+        if not is_collection:
+            handle.close()
+            return self._map(stream.document, method, continue_list_fetching)
 
-    def _map(self, res, method, continue_list_fetching, next_partition = None):
+        def items():
+            try:
+                for item in stream.items():
+                    yield item
+            finally:
+                handle.close()
+        # for linked partitioning, the next_partition_href follows the
+        # collection and is added to the document as the items are consumed
+        return self._map(items(), method, continue_list_fetching, stream.document)
+
+    def _map(self, res, method, continue_list_fetching, document=None):
         """
         This method will take the JSON-result of a HTTP-call and return our domain-objects.
 
@@ -549,35 +1235,18 @@ class Scope(object):
         for part in pathparts:
             stack.append(part)
             if part in RESTBase.REGISTRY:
-                cls = RESTBase.REGISTRY[part]
+                cls = self._resource_class(RESTBase.REGISTRY[part])
                 # multiple objects, without linked partitioning
-                if isinstance(res, list):
-                    def result_gen():
-                        count = 0
-                        for item in res:
-                            yield cls(item, self, stack)
-                            count += 1
-                        if count == ApiConnector.LIST_LIMIT:
-                            for item in continue_list_fetching():
-                                yield item
-                    logger.debug(res)
-                    return PartitionCollectionGenerator(self, method, result_gen(), next_partition)
+                # the items of a collection never take their id from the
+                # path, so they get no path stack
+                if isinstance(res, (list, types.GeneratorType)):
+                    return PartitionCollectionGenerator(self, method, res, cls, None, continue_list_fetching, document)
                 # multiple objects, with linked partitioning
-                elif isinstance(res, dict) and res.has_key('next_partition_href'):
-                  def result_gen():
-                      count = 0
-                      for item in res['collection']:
-                          yield cls(item, self, stack)
-                          count += 1
-                      if count == ApiConnector.LIST_LIMIT:
-                          for item in continue_list_fetching():
-                              yield item
-                  logger.debug(res)
-                  return PartitionCollectionGenerator(self, method, result_gen(), next_partition) 
+                elif isinstance(res, dict) and (res.has_key('next_partition_href') or res.has_key('collection')):
+                    return PartitionCollectionGenerator(self, method, res['collection'], cls, None, continue_list_fetching, res)
                 else:
                     return cls(res, self, stack)
-        logger.debug("don't know how to handle result")
-        logger.debug(res)
+        logger.debug("don't know how to handle result of %s", method)
         return res
 
     def __getattr__(self, _name):
@@ -594,72 +1263,20 @@ class Scope(object):
 
          - invoking remove(resource) on it will DELETE the resource from it's container. Also only usable on collections.
 
-         TODO: describe the latter 
-        """
-        scope = self
+         - invoking sync(resources) on it will append and remove only what's needed to make the collection contain
+           exactly those resources.
 
-        class api_call(object):
-            def __call__(selfish, *args, **kwargs):
-                return self._call(_name, *args, **kwargs)
-
-            def new(self, **kwargs):
-                """
-                Will invoke the new method on the named resource _name, with 
-                self as scope.
-                """
-                cls = RESTBase.REGISTRY[_name]
-                return cls.new(scope, **kwargs)
+         TODO: describe the latter 
 
-            def append(selfish, resource):
-                """
-                If the current scope is 
-                """
-                try:
-                  self._call(_name, str(resource.id), _alternate_http_method="PUT")
-                except AttributeError:
-                  self._call(_name, str(resource), _alternate_http_method="PUT")
-
-            def remove(selfish, resource):
-              try:
-                self._call(_name, str(resource.id), _alternate_http_method="DELETE")
-              except AttributeError:
-                self._call(_name, str(resource), _alternate_http_method="DELETE")
-                
+        The result is stored as attribute of the scope, so that it's only
+        created once per name.
+        """
         if _name in RESTBase.ALL_DOMAIN_CLASSES:
-            cls = RESTBase.ALL_DOMAIN_CLASSES[_name]
-
-            class ScopeBinder(object):
-                def new(self, *args, **data):
-
-                    d = MultiDict()
-                    name = cls._singleton()
-
-                    def unfold_value(key, value):
-                        if isinstance(value, (basestring, file)):
-                            d.add(key, value)
-                        elif isinstance(value, dict):
-                            for sub_key, sub_value in value.iteritems():
-                                unfold_value("%s[%s]" % (key, sub_key), sub_value)
-                        else:
-                            # assume iteration else
-                            for sub_value in value:
-                                unfold_value(key + "[]", sub_value)
-                                
-                        
-                    for key, value in data.iteritems():
-                        unfold_value("%s[%s]" % (name, key), value)
-
-                    return scope._call(cls.KIND, **d)
-                
-                def create(self, **data):
-                    return cls.create(scope, **data)
-
-                def get(self, id):
-                    return cls.get(scope, id)
-
-                
-            return ScopeBinder()
-        return api_call()
+            res = ScopeBinder(self, RESTBase.ALL_DOMAIN_CLASSES[_name])
+        else:
+            res = ApiCall(self, _name)
+        self.__dict__[_name] = res
+        return res
 
     def __repr__(self):
         return str(self)
@@ -672,6 +1289,201 @@ class Scope(object):
         return base + "/" + str(scopes[-1])
 
 
+class ApiCall(object):
+    """
+    An API-method of a L{Scope}, see L{Scope.__getattr__}.
+    """
+
+    __slots__ = ("_scope", "_name")
+
+    def __init__(self, scope, name):
+        self._scope = scope
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._scope._call(self._name, *args, **kwargs)
+
+    def new(self, **kwargs):
+        """
+        Will invoke the new method on the named resource _name, with 
+        self as scope.
+        """
+        cls = RESTBase.REGISTRY[self._name]
+        return cls.new(self._scope, **kwargs)
+
+    def append(self, resource):
+        """
+        If the current scope is 
+        """
+        try:
+          self._scope._call(self._name, str(resource.id), _alternate_http_method="PUT")
+        except AttributeError:
+          self._scope._call(self._name, str(resource), _alternate_http_method="PUT")
+
+    def remove(self, resource):
+      try:
+        self._scope._call(self._name, str(resource.id), _alternate_http_method="DELETE")
+      except AttributeError:
+        self._scope._call(self._name, str(resource), _alternate_http_method="DELETE")
+
+    def sync(self, desired, workers=4):
+        """
+        Make the collection contain exactly the given resources, with as few
+        requests as possible:
+
+        >>> result = me.favorites.sync(track_ids)
+        >>> print result.added, result.removed, result.unchanged
+
+        The ids of the current members are fetched, without creating
+        resources for them. Then only the missing ones are appended, and
+        only those that aren't wanted anymore are removed, concurrently.
+
+        @param desired: the resources or ids the collection should contain
+        @type desired: iterable<RESTBase|int|str>
+        @type workers: int
+        @param workers: the number of appends and removes to run at the same time
+        @return: the counts of the changes, and the errors of those that failed
+        @rtype: SyncResult
+        """
+        desired_ids = []
+        seen = set()
+        for resource in desired:
+            item_id = str(getattr(resource, "id", resource))
+            if item_id not in seen:
+                seen.add(item_id)
+                desired_ids.append(item_id)
+
+        current = self()
+        if current is None:
+            current_ids = set()
+        elif isinstance(current, PartitionCollectionGenerator):
+            current_ids = set(str(current_id) for current_id in current.ids())
+        else:
+            current_ids = set([str(current.id)])
+
+        changes = [(desired_id, "PUT") for desired_id in desired_ids if desired_id not in current_ids]
+        changes.extend((current_id, "DELETE") for current_id in sorted(current_ids) if current_id not in seen)
+        result = SyncResult(unchanged=len(current_ids & seen))
+        if not changes:
+            return result
+
+        def apply(change):
+            item_id, http_method = change
+            try:
+                self._scope._call(self._name, item_id, _alternate_http_method=http_method)
+            except Exception, e:
+                return e
+            return None
+
+        pool = ThreadPool(max(1, min(workers, len(changes))))
+        try:
+            errors = pool.map(apply, changes)
+        finally:
+            pool.close()
+
+        for (item_id, http_method), error in zip(changes, errors):
+            if error is not None:
+                result.errors[item_id] = error
+            elif http_method == "PUT":
+                result.added += 1
+            else:
+                result.removed += 1
+        return result
+
+
+class ScopeBinder(object):
+    """
+    A domain-class bound to a L{Scope}, e.g. C{scope.Track}, see
+    L{Scope.__getattr__}.
+    """
+
+    __slots__ = ("_scope", "_cls")
+
+    def __init__(self, scope, cls):
+        self._scope = scope
+        self._cls = cls
+
+    def new(self, *args, **data):
+        cls = self._cls
+        d = MultiDict()
+        name = cls._singleton()
+
+        def unfold_value(key, value):
+            if isinstance(value, basestring) or hasattr(value, "read"):
+                d.add(key, value)
+            elif isinstance(value, dict):
+                for sub_key, sub_value in value.iteritems():
+                    unfold_value("%s[%s]" % (key, sub_key), sub_value)
+            else:
+                # assume iteration else
+                for sub_value in value:
+                    unfold_value(key + "[]", sub_value)
+
+        for key, value in data.iteritems():
+            unfold_value("%s[%s]" % (name, key), value)
+
+        return self._scope._call(cls.KIND, **d)
+
+    def create(self, **data):
+        return self._cls.create(self._scope, **data)
+
+    def get(self, id):
+        return self._cls.get(self._scope, id)
+
+    def get_many(self, ids, workers=4):
+        return self._cls.get_many(self._scope, ids, workers)
+
+    def new_many(self, items, workers=4, bandwidth=None):
+        return self._cls.new_many(self._scope, items, workers, bandwidth)
+
+
+class BulkResult(object):
+    """
+    The outcome of creating one of the resources of L{RESTBase.new_many}.
+    """
+
+    __slots__ = ("index", "data", "resource", "error")
+
+    def __init__(self, index, data, resource=None, error=None):
+        # the position of the data in the input, the data itself, and the
+        # resource created from it - or the error that prevented that
+        self.index = index
+        self.data = data
+        self.resource = resource
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "<BulkResult %i %s>" % (self.index, "ok" if self.ok else repr(self.error))
+
+
+class SyncResult(object):
+    """
+    The outcome of L{ApiCall.sync}.
+    """
+
+    __slots__ = ("added", "removed", "unchanged", "errors")
+
+    def __init__(self, added=0, removed=0, unchanged=0):
+        # the number of members appended, removed and left alone, and the
+        # errors of the appends and removes that failed, by id
+        self.added = added
+        self.removed = removed
+        self.unchanged = unchanged
+        self.errors = {}
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __repr__(self):
+        return "<SyncResult +%i -%i =%i, %i failed>" % (self.added, self.removed, self.unchanged,
+                                                        len(self.errors))
+
+
 # maybe someday I'll make that work.
 # class RESTBaseMeta(type):
 #     def __new__(self, name, bases, d):
@@ -687,6 +1499,9 @@ class RESTBase(object):
 
     
     """
+    __slots__ = ('_RESTBase__data', '_RESTBase__scope', '_RESTBase__nested', '_RESTBase__children',
+                 '_RESTBase__batch', '__weakref__')
+
     REGISTRY = {}
     
     ALL_DOMAIN_CLASSES = {}
@@ -695,12 +1510,29 @@ class RESTBase(object):
 
     KIND = None
 
+    """
+    The known scalar fields of the resource. The compact representation
+    stores them in slots, see L{compact}.
+    """
+    FIELDS = ()
+
+    """
+    The generated compact classes, by the class they are generated from.
+    """
+    COMPACT_CLASSES = {}
+
     def __init__(self, data, scope, path_stack=None):
         self.__data = data
         self.__scope = scope
+        # the nested resources created so far, by name
+        self.__nested = None
+        # the scope of our sub-resources, once it's needed
+        self.__children = None
+        # the properties set during batch(), by name
+        self.__batch = None
         # try and see if we can/must create an id out of our path
-        logger.debug("path_stack: %r", path_stack)
         if path_stack:
+            logger.debug("path_stack: %r", path_stack)
             try:
                 id = int(path_stack[0])
                 self.__data['id'] = id
@@ -711,15 +1543,27 @@ class RESTBase(object):
         if name in self.__data:
             obj = self.__data[name]
             if name in RESTBase.REGISTRY:
+                # nested resources are only created once, and so is a
+                # list of them - it's the same list on every access
+                nested = self.__nested
+                if nested is None:
+                    nested = self.__nested = {}
+                elif name in nested:
+                    return nested[name]
+                cls = self.__scope._resource_class(RESTBase.REGISTRY[name])
                 if isinstance(obj, dict):
-                    obj = RESTBase.REGISTRY[name](obj, self.__scope)
+                    obj = self._nested_resource(cls, obj)
                 elif isinstance(obj, list):
-                    obj = [RESTBase.REGISTRY[name](o, self.__scope) for o in obj]
+                    obj = [self._nested_resource(cls, o) for o in obj]
                 else:
                     logger.warning("Found %s in our registry, but don't know what to do with"\
                                    "the object.")
+                    return obj
+                nested[name] = obj
             return obj
-        scope = Scope(self.__scope._get_connector(), scope=self, parent=self.__scope)
+        scope = self.__children
+        if scope is None:
+            scope = self.__children = Scope(self.__scope._get_connector(), scope=self, parent=self.__scope)
         return getattr(scope, name)
 
     def __setattr__(self, name, value):
@@ -758,8 +1602,10 @@ class RESTBase(object):
 
         # update "private" data, such as __data
         if "_RESTBase__" in name:
-            self.__dict__[name] = value
+            object.__setattr__(self, name, value)
         else:
+            if self.__nested:
+                self.__nested.pop(name, None)
             if isinstance(value, list) and len(value):
                 # the parametername is something like
                 # permissions[user_id][]
@@ -772,6 +1618,9 @@ class RESTBase(object):
             elif isinstance(value, RESTBase):
                 # we got a single instance, so make that an argument
                 self.__scope._call(self.KIND, self.id, name, **value._as_arguments())
+            elif self.__batch is not None:
+                # sent when the batch ends
+                self.__batch[name] = value
             else:
                 # we have a simple property
                 parameter_name = "%s[%s]" % (self._singleton(), name)
@@ -779,12 +1628,183 @@ class RESTBase(object):
                           parameter_name : self._convert_value(value)}
                 self.__scope._call(self.KIND, self.id, **kwargs)
 
+    def update(self, **fields):
+        """
+        Change several simple properties of the resource with a single PUT:
+
+        >>> track.update(title="new title", genre="Ambient", tag_list="field-recording")
+
+        Properties that already have the given value are left out, and if
+        none are left, no request is made at all. On success the new values
+        are part of the resource's data.
+
+        @return: the properties that were sent, by name
+        @rtype: dict
+        """
+        current = dict(self._data_items())
+        changes = {}
+        for name, value in fields.iteritems():
+            if name not in current or current[name] != value:
+                changes[name] = value
+        if not changes:
+            return changes
+        singleton = self._singleton()
+        kwargs = {"_alternate_http_method" : "PUT"}
+        for name, value in changes.iteritems():
+            kwargs["%s[%s]" % (singleton, name)] = self._convert_value(value)
+        self.__scope._call(self.KIND, self.id, **kwargs)
+        if self.__nested:
+            for name in changes:
+                self.__nested.pop(name, None)
+        self._update_data(changes)
+        return changes
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect the simple properties that are set within the with-block,
+        and send them with L{update} when it ends:
+
+        >>> with track.batch():
+        ...     track.title = "new title"
+        ...     track.description = "new description"
+
+        Until then, the properties keep their old values. If the block
+        raises, nothing is sent. Setting resources or lists of them is not
+        batched, they are still sent right away. Nested batches are sent
+        with the outermost one.
+        """
+        if self.__batch is not None:
+            yield self
+            return
+        self.__batch = {}
+        try:
+            yield self
+            changes = self.__batch
+        finally:
+            self.__batch = None
+        self.update(**changes)
+
+    def _update_data(self, changes):
+        """
+        Merge changed properties into our data.
+
+        The data may be shared with the response-cache or other callers
+        that got the same response, so it's copied, not changed in place.
+        """
+        data = dict(self.__data)
+        data.update(changes)
+        self.__data = data
+
+    def _nested_resource(self, cls, data):
+        """
+        Create a resource of cls that's embedded in our data - or, if our
+        connector has an identity-map, take the one that's already there.
+        """
+        identity_map = self.__scope._get_connector().identity_map
+        if identity_map is None or "id" not in data:
+            return cls(data, self.__scope)
+        key = (cls, data["id"], self.__scope)
+        obj = identity_map.get(key)
+        if obj is None:
+            obj = identity_map.setdefault(key, cls(data, self.__scope))
+        return obj
+
+    def _data_items(self):
+        """
+        @return: the (name, value)-pairs of the resource's data
+        @rtype: list<tuple<str, object>>
+        """
+        return self.__data.items()
+
+    @classmethod
+    def compact(cls):
+        """
+        Return the compact representation of this class.
+
+        It's a generated subclass that keeps the values of the L{FIELDS} of
+        the resource in a single tuple, and reads them through a property per
+        field, without going through __getattr__ and without a dict per
+        resource. Fields the resource has no data for read as None. All
+        other data is kept as before. Enable it for all resources of a
+        connector with C{ApiConnector(compact=True)}.
+
+        @rtype: type
+        """
+        try:
+            return RESTBase.COMPACT_CLASSES[cls]
+        except KeyError:
+            pass
+        # nested resources are still created by __getattr__
+        fields = tuple(name for name in cls.FIELDS if name not in RESTBase.REGISTRY)
+        field_set = frozenset(fields)
+        missing = [None] * len(fields)
+        get_fields = itemgetter(*fields)
+
+        def __init__(self, data, scope, path_stack=None):
+            try:
+                # the API usually sends all fields
+                values = get_fields(data)
+                # then there are other keys only if there are more keys
+                complete = True
+            except KeyError:
+                values = map(data.get, fields, missing)
+                complete = False
+            rest = {}
+            if not complete or len(data) != len(fields):
+                for key in data:
+                    if key not in field_set:
+                        rest[key] = data[key]
+            if path_stack and "id" in field_set:
+                try:
+                    values = list(values)
+                    values[fields.index("id")] = int(path_stack[0])
+                except ValueError:
+                    pass
+            object.__setattr__(self, "_values", tuple(values))
+            object.__setattr__(self, "_RESTBase__data", rest)
+            object.__setattr__(self, "_RESTBase__scope", scope)
+            object.__setattr__(self, "_RESTBase__nested", None)
+            object.__setattr__(self, "_RESTBase__children", None)
+            object.__setattr__(self, "_RESTBase__batch", None)
+
+        def _data_items(self):
+            items = [(name, value) for name, value in zip(fields, self._values) if value is not None]
+            items.extend(RESTBase._data_items(self))
+            return items
+
+        def _update_data(self, changes):
+            values = list(self._values)
+            rest = {}
+            for name, value in changes.iteritems():
+                if name in field_set:
+                    values[fields.index(name)] = value
+                else:
+                    rest[name] = value
+            object.__setattr__(self, "_values", tuple(values))
+            if rest:
+                RESTBase._update_data(self, rest)
+
+        attributes = {
+            "__slots__" : ("_values",),
+            "__init__" : __init__,
+            "_data_items" : _data_items,
+            "_update_data" : _update_data,
+            "__module__" : cls.__module__,
+            "__doc__" : "The compact representation of L{%s}." % cls.__name__,
+            }
+        for index, name in enumerate(fields):
+            attributes[name] = property(lambda self, index=index: self._values[index])
+        compact = type("Compact%s" % cls.__name__, (cls,), attributes)
+        RESTBase.COMPACT_CLASSES[cls] = compact
+        return compact
+
     def _as_arguments(self):        
         """
         Converts a resource to a argument-string the way Rails expects it.
         """
         res = {}
-        for key, value in self.__data.items():
+        for key, value in self._data_items():
             value = self._convert_value(value)
             res["%s[%s]" % (self._singleton(), key)] = value
         return res
@@ -792,7 +1812,7 @@ class RESTBase(object):
     def _convert_value(self, value):
         if isinstance(value, unicode):
             value = value.encode("utf-8")
-        elif isinstance(value, file):
+        elif hasattr(value, "read"):
             pass
         else:
             value = str(value)
@@ -852,7 +1872,131 @@ class RESTBase(object):
 
         """
         return getattr(scope, cls.KIND)(id)
-        
+
+    """
+    The maximum number of ids that are requested through one ids-filter.
+    The API returns at most that many resources per request.
+    """
+    IDS_BATCH_SIZE = ApiConnector.LIST_LIMIT
+
+    @classmethod
+    def get_many(cls, scope, ids, workers=4):
+        """
+        Fetch several resources by their ids.
+
+        The ids are requested in batches through the ids-filter of the
+        resource, and the batches are fetched concurrently.
+
+        >>> sca = soundcloud.Scope(connector)
+        >>> tracks = sca.Track.get_many([123, 456, 789])
+
+        @param ids: the ids to fetch
+        @type ids: iterable<int|str>
+        @type workers: int
+        @param workers: the number of batches to fetch at the same time
+        @return: the resources in the order of the ids. Resources that don't
+                exist are returned as None, the same way L{get} does.
+        @rtype: list<RESTBase|None>
+        """
+        ids = [str(id) for id in ids]
+        unique_ids = []
+        seen = set()
+        for id in ids:
+            if id not in seen:
+                seen.add(id)
+                unique_ids.append(id)
+        batch_size = cls.IDS_BATCH_SIZE
+        batches = [unique_ids[i:i + batch_size] for i in xrange(0, len(unique_ids), batch_size)]
+        if not batches:
+            return []
+
+        def fetch(batch):
+            res = getattr(scope, cls.KIND)(params={
+                "ids" : ",".join(batch),
+                ApiConnector.LIST_LIMIT_PARAMETER : str(len(batch)),
+                })
+            if res is None:
+                return []
+            if isinstance(res, PartitionCollectionGenerator):
+                return res.page()
+            return [res]
+
+        pool = ThreadPool(max(1, min(workers, len(batches))))
+        try:
+            pages = pool.map(fetch, batches)
+        finally:
+            pool.close()
+
+        found = {}
+        for page in pages:
+            for resource in page:
+                found[str(resource.id)] = resource
+        return [found.get(id) for id in ids]
+
+    @classmethod
+    def new_many(cls, scope, items, workers=4, bandwidth=None):
+        """
+        Create several resources concurrently, like calling L{new} for each.
+
+        >>> sca = soundcloud.Scope(connector)
+        >>> items = (dict(title=name, asset_data=open(name)) for name in names)
+        >>> for result in sca.Track.new_many(items, workers=8, bandwidth=1024 * 1024):
+        ...     if not result.ok:
+        ...         print "%s failed: %s" % (result.data["title"], result.error)
+
+        The items are taken from the iterable only when a worker is free to
+        create them, so it may be a generator over any number of items. As
+        several creates run at the same time, files must not be shared
+        between the items. Note that the number of concurrent creates is
+        also bounded by the connection pool's C{max_per_host}.
+
+        @param items: the data of each resource
+        @type items: iterable<dict>
+        @type workers: int
+        @param workers: the number of resources to create at the same time
+        @type bandwidth: int
+        @param bandwidth: if given, the bytes per second all uploaded files
+                together are limited to
+        @return: the results in the order they finish; the error of a failed
+                create is part of its result and doesn't end the iteration
+        @rtype: generator<BulkResult>
+        """
+        binder = getattr(scope, cls.__name__)
+        bucket = TokenBucket(bandwidth) if bandwidth else None
+        finished = Queue.Queue()
+
+        def create(index, data):
+            kwargs = data
+            if bucket is not None:
+                kwargs = dict((key, ThrottledFile(value, bucket) if hasattr(value, "read") else value)
+                              for key, value in data.iteritems())
+            try:
+                resource = binder.new(**kwargs)
+            except Exception, e:
+                finished.put(BulkResult(index, data, error=e))
+            else:
+                finished.put(BulkResult(index, data, resource))
+
+        pool = ThreadPool(workers)
+        pending = 0
+        try:
+            for index, data in enumerate(items):
+                pool.apply_async(create, (index, data))
+                pending += 1
+                # hand out what has finished, and wait for a free worker
+                # before taking the next item
+                while pending >= workers or (pending and not finished.empty()):
+                    yield finished.get()
+                    pending -= 1
+            while pending:
+                yield finished.get()
+                pending -= 1
+        finally:
+            # creates that are running are finished, even if the caller
+            # stopped iterating
+            pool.close()
+            pool.join()
+
 
     def _scope(self):
         """
@@ -879,7 +2023,7 @@ class RESTBase(object):
         res = []
         res.append("\n\n******\n%s:" % self.__class__.__name__)
         res.append("")
-        for key, v in self.__data.iteritems():
+        for key, v in self._data_items():
             key = str(key)
             if isinstance(v, unicode):
                 v = v.encode('utf-8')
@@ -909,15 +2053,32 @@ class User(RESTBase):
     """
     A user domain object/resource. 
     """
+    __slots__ = ()
     KIND = 'users'
     ALIASES = ['me', 'permissions', 'contacts', 'user']
+    FIELDS = ('id', 'kind', 'permalink', 'username', 'uri', 'permalink_url', 'avatar_url',
+              'country', 'full_name', 'first_name', 'last_name', 'city', 'description',
+              'discogs_name', 'myspace_name', 'website', 'website_title', 'online',
+              'track_count', 'playlist_count', 'followers_count', 'followings_count',
+              'public_favorites_count', 'plan', 'private_tracks_count',
+              'private_playlists_count', 'primary_email_confirmed', 'last_modified')
 
 class Track(RESTBase):
     """
     A track domain object/resource. 
     """
+    __slots__ = ()
     KIND = 'tracks'
     ALIASES = ['favorites']
+    FIELDS = ('id', 'kind', 'created_at', 'user_id', 'duration', 'commentable', 'state',
+              'original_content_size', 'last_modified', 'sharing', 'tag_list', 'permalink',
+              'streamable', 'embeddable_by', 'downloadable', 'purchase_url', 'label_id',
+              'purchase_title', 'genre', 'title', 'description', 'label_name', 'release',
+              'track_type', 'key_signature', 'isrc', 'video_url', 'bpm', 'release_year',
+              'release_month', 'release_day', 'original_format', 'license', 'uri',
+              'permalink_url', 'artwork_url', 'waveform_url', 'stream_url', 'download_url',
+              'playback_count', 'download_count', 'favoritings_count', 'comment_count',
+              'attachments_uri', 'secret_token', 'secret_uri', 'shared_to_count')
 
     """
     Soundcloud's permissions for downloading are confusing. Here's what's required for downloading a track:
@@ -957,27 +2118,143 @@ class Track(RESTBase):
 
     def get_temporary_download_url(self):
         url = self.get_secret_url()
-        resp = urllib2.urlopen(url)
-        return resp.url
+        resp = self._get_connector().build_opener().open(url)
+        try:
+            return resp.url
+        finally:
+            resp.close()
+
+    """
+    The number of bytes read and written at once by L{download}.
+    """
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+    def download(self, dest, chunk_size=None, progress=None, resume=True, retries=3):
+        """
+        Download the track's file to dest, without holding more than one
+        chunk of it in memory.
+
+        If dest is a path and a partial download exists there, it's resumed
+        using a Range-request. Transfers interrupted by network errors are
+        resumed the same way, up to C{retries} times.
+
+        >>> sca = soundcloud.Scope(connector)
+        >>> track = sca.Track.get(track_id)
+        >>> track.download("/tmp/track.mp3", progress=lambda done, total: ...)
+
+        @param dest: a path, or a file opened for writing
+        @type dest: str|file
+        @type chunk_size: int
+        @param chunk_size: the number of bytes to read at once
+        @param progress: if given, called with the bytes received so far, and
+                the total size or None if the server didn't tell
+        @type resume: bool
+        @param resume: whether to continue a partial download at the path dest
+        @type retries: int
+        @param retries: how often to resume after the connection broke
+        @return: the size of the downloaded file
+        @rtype: int
+        @raise DownloadIncomplete: if the file is shorter than announced
+        """
+        if chunk_size is None:
+            chunk_size = self.DOWNLOAD_CHUNK_SIZE
+        if isinstance(dest, basestring):
+            offset = 0
+            if resume and os.path.exists(dest):
+                offset = os.path.getsize(dest)
+            fd = open(dest, "ab" if offset else "wb")
+        else:
+            fd = dest
+            offset = fd.tell() if resume else 0
+        try:
+            opener = self._get_connector().build_opener()
+            url = self.get_secret_url()
+            total = None
+            while True:
+                req = urllib2.Request(url)
+                if offset:
+                    req.add_header("Range", "bytes=%i-" % offset)
+                try:
+                    resp = opener.open(req)
+                except urllib2.HTTPError, e:
+                    if e.code == 416 and offset:
+                        # nothing left to download
+                        e.close()
+                        return offset
+                    raise
+                try:
+                    info = resp.info()
+                    if resp.code == 206:
+                        start, total = parse_content_range(info.get("Content-Range"))
+                        if start != offset:
+                            raise DownloadIncomplete("Server resumed at byte %i instead of %i" % (start, offset))
+                    else:
+                        # no partial content, start over
+                        if offset:
+                            fd.seek(0)
+                            fd.truncate()
+                            offset = 0
+                        if info.get("Content-Length") is not None:
+                            total = int(info["Content-Length"])
+                    while True:
+                        chunk = resp.read(chunk_size)
+                        if not chunk:
+                            break
+                        fd.write(chunk)
+                        offset += len(chunk)
+                        if progress is not None:
+                            progress(offset, total)
+                    if total is not None and offset < total:
+                        # httplib reports a closed connection as end of data
+                        raise httplib.IncompleteRead("", total - offset)
+                except (socket.error, httplib.HTTPException), e:
+                    if retries <= 0:
+                        raise
+                    retries -= 1
+                    logger.debug("Download interrupted at byte %i, resuming: %r", offset, e)
+                    fd.flush()
+                    continue
+                finally:
+                    resp.close()
+                break
+            if total is not None and offset != total:
+                raise DownloadIncomplete("Received %i of %i bytes" % (offset, total))
+            return offset
+        finally:
+            if fd is not dest:
+                fd.close()
 
 
 class Comment(RESTBase):
     """
     A comment domain object/resource. 
     """
+    __slots__ = ()
     KIND = 'comments'
+    FIELDS = ('id', 'kind', 'created_at', 'user_id', 'track_id', 'timestamp', 'body', 'uri')
 
 class Playlist(RESTBase):
     """
     A playlist/set domain object/resource
     """
+    __slots__ = ()
     KIND = 'playlists'
+    FIELDS = ('id', 'kind', 'created_at', 'user_id', 'duration', 'sharing', 'tag_list',
+              'permalink', 'track_count', 'streamable', 'downloadable', 'embeddable_by',
+              'purchase_url', 'label_id', 'type', 'playlist_type', 'ean', 'description',
+              'genre', 'release', 'purchase_title', 'label_name', 'title', 'release_year',
+              'release_month', 'release_day', 'license', 'uri', 'permalink_url',
+              'artwork_url', 'last_modified', 'secret_token', 'secret_uri')
 
 class Group(RESTBase):
     """
     A group domain object/resource
     """
+    __slots__ = ()
     KIND = 'groups'
+    FIELDS = ('id', 'kind', 'uri', 'created_at', 'permalink', 'permalink_url', 'artwork_url',
+              'name', 'short_description', 'description', 'moderated_content',
+              'members_count', 'contributors_count', 'track_count')
 
 
 
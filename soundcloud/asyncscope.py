@@ -0,0 +1,204 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+A non-blocking counterpart to L{soundcloud.Scope}.
+
+Every call returns immediately with a pending result (a
+multiprocessing.pool.AsyncResult), while the request itself is performed by
+a pool of worker threads. URL construction, the mapping to domain objects
+and the resource registry are those of the wrapped Scope.
+"""
+
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+
+from soundcloud import (
+    PartitionCollectionGenerator,
+    RESTBase,
+    Scope,
+    )
+
+
+class AsyncScope(object):
+    """
+    Wraps a L{soundcloud.Scope} so that its API-methods return pending
+    results instead of blocking the caller:
+
+    >>> ascope = AsyncScope(connector, workers=20)
+    >>> pending = [ascope.Track.get(id) for id in track_ids]
+    >>> tracks = [p.get() for p in pending]
+
+    Instead of waiting for a result, a callback can be given, which is invoked
+    from a worker thread once the result is available:
+
+    >>> ascope.me(callback=handle_me)
+
+    Resources are created, appended and removed the same way as with a Scope:
+
+    >>> ascope.Track.new(title="bar", asset_data=data).get()
+    >>> ascope.scoped(me).favorites.append(track).get()
+
+    Calling a list-method yields the collection once its first page arrived.
+    Iterating that collection fetches further pages in the calling thread,
+    so use L{AsyncCall.collect} to have the whole collection gathered in
+    the background.
+
+    All AsyncScopes derived from this one share its worker pool.
+
+    Note that the requests in flight to the API are also bounded by the
+    C{max_per_host} of the connector's connection pool, which is 4 by
+    default - further workers wait for a connection. To have all workers
+    send requests at the same time, give the connector a pool that large:
+
+    >>> connector = ApiConnector(authenticator, pool=ConnectionPool(max_per_host=20))
+    >>> ascope = AsyncScope(connector, workers=20)
+    """
+
+    def __init__(self, connector, workers=10, scope=None, pool=None):
+        """
+        @param connector: The connector to use.
+        @type connector: soundcloud.ApiConnector
+        @type workers: int
+        @param workers: the number of worker threads, if no pool is given. See
+                above for the connections they share.
+        @type scope: soundcloud.Scope
+        @param scope: the scope to wrap. Defaults to the root scope.
+        @type pool: multiprocessing.pool.ThreadPool
+        @param pool: the worker pool to share
+        """
+        if scope is None:
+            scope = Scope(connector)
+        if pool is None:
+            pool = ThreadPool(workers)
+        self._connector = connector
+        self._scope = scope
+        self._pool = pool
+
+    def scoped(self, resource):
+        """
+        Return an AsyncScope for the sub-resources of the given resource,
+        e.g. C{ascope.scoped(user).tracks()}.
+
+        @type resource: soundcloud.RESTBase
+        @rtype: AsyncScope
+        """
+        scope = Scope(self._connector, scope=resource, parent=self._scope)
+        return AsyncScope(self._connector, scope=scope, pool=self._pool)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run an arbitrary callable on the worker pool.
+
+        @param callback: if given, invoked with the result once it's available
+        @rtype: multiprocessing.pool.AsyncResult
+        """
+        callback = kwargs.pop("callback", None)
+        return self._pool.apply_async(func, args, kwargs, callback)
+
+    def close(self):
+        """
+        Wait for all pending calls to finish, and stop the worker threads.
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __getattr__(self, name):
+        target = getattr(self._scope, name)
+        if name in RESTBase.ALL_DOMAIN_CLASSES:
+            return AsyncBinder(self, target)
+        return AsyncCall(self, target)
+
+
+class AsyncCall(object):
+    """
+    The non-blocking version of an API-method of a Scope.
+    """
+
+    def __init__(self, ascope, call):
+        self._ascope = ascope
+        self._call = call
+
+    def __call__(self, *args, **kwargs):
+        return self._ascope.submit(self._call, *args, **kwargs)
+
+    def collect(self, *args, **kwargs):
+        """
+        Fetch a whole collection in the background, and return it as list.
+        If the call doesn't return a collection, the list contains what it
+        returned, if anything.
+
+        @param limit: if given, the maximum number of resources to fetch
+        @param prefetch: the number of pages to fetch ahead, see
+                L{soundcloud.PartitionCollectionGenerator.prefetch}
+        @param callback: if given, invoked with the list once it's complete
+        @rtype: multiprocessing.pool.AsyncResult
+        """
+        callback = kwargs.pop("callback", None)
+        limit = kwargs.pop("limit", None)
+        prefetch = kwargs.pop("prefetch", 1)
+        call = self._call
+
+        def collect():
+            collection = call(*args, **kwargs)
+            if collection is None:
+                return []
+            if isinstance(collection, PartitionCollectionGenerator):
+                return list(islice(collection.prefetch(prefetch), limit))
+            if isinstance(collection, list):
+                return collection[:limit]
+            return [collection]
+
+        return self._ascope.submit(collect, callback=callback)
+
+    def new(self, **kwargs):
+        callback = kwargs.pop("callback", None)
+        return self._ascope.submit(self._call.new, callback=callback, **kwargs)
+
+    def append(self, resource, callback=None):
+        return self._ascope.submit(self._call.append, resource, callback=callback)
+
+    def remove(self, resource, callback=None):
+        return self._ascope.submit(self._call.remove, resource, callback=callback)
+
+
+class AsyncBinder(object):
+    """
+    The non-blocking version of a domain-class bound to a Scope, as in
+    C{scope.Track}.
+    """
+
+    def __init__(self, ascope, binder):
+        self._ascope = ascope
+        self._binder = binder
+
+    def new(self, **data):
+        callback = data.pop("callback", None)
+        return self._ascope.submit(self._binder.new, callback=callback, **data)
+
+    def get(self, id, callback=None):
+        return self._ascope.submit(self._binder.get, id, callback=callback)
+
+    def create(self, **data):
+        """
+        Creating a parameter-object doesn't involve a request, so this
+        returns the resource right away.
+        """
+        return self._binder.create(**data)
@@ -0,0 +1,392 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Caching of API-responses with conditional revalidation, and of resources
+on disk.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from soundcloud import jsonbackend
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(object):
+    """
+    A cached response: the decoded content, together with the validators
+    the server sent for it.
+    """
+
+    def __init__(self, path, content, method, etag=None, last_modified=None):
+        """
+        @param path: the path of the resource, used for invalidation
+        @param content: the decoded JSON-content
+        @param method: the API-method the content belongs to, after redirects
+        @param etag: the ETag-header of the response
+        @param last_modified: the Last-Modified-header of the response
+        """
+        self.path = path
+        self.content = content
+        self.method = method
+        self.etag = etag
+        self.last_modified = last_modified
+        self.created = time.time()
+
+    def conditional_headers(self):
+        """
+        The headers to revalidate this entry with.
+
+        @rtype: dict<str, str>
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """
+    An in-memory LRU-cache for the responses of GET-requests.
+
+    Entries are revalidated with If-None-Match/If-Modified-Since before
+    they are reused, so that a 304 from the server spares both the download
+    and the decoding of the content. Entries expire C{ttl} seconds after
+    they have been stored, and at most C{max_entries} are kept.
+
+    The cache is consulted by L{soundcloud.Scope._call} through C{key},
+    C{get}, C{set} and C{invalidate}; any object providing these can be
+    passed to the L{soundcloud.ApiConnector} instead.
+
+    Note that the cached content is shared between the resources created
+    from it.
+    """
+
+    def __init__(self, max_entries=1000, ttl=300):
+        """
+        @type max_entries: int
+        @param max_entries: the maximum number of cached responses
+        @type ttl: float
+        @param ttl: the seconds after which a response is discarded
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, path, queryparams, access_token):
+        """
+        Compute the cache-key of a request.
+
+        The access token is not part of the query that makes the key -
+        instead, the key is namespaced by a digest of the token, so that
+        responses are never shared between different users.
+
+        @param path: the path of the request
+        @param queryparams: the query-parameters, without the access token
+        @type queryparams: dict
+        @param access_token: the access token the request is made with
+        @rtype: str
+        """
+        user = hashlib.sha1(str(access_token)).hexdigest()
+        return "%s:%s?%r" % (user, path, sorted(queryparams.items()))
+
+    def get(self, key):
+        """
+        @return: the entry for key, or None if there is no valid one
+        @rtype: CacheEntry|None
+        """
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            if entry.created + self.ttl < time.time():
+                return None
+            # re-insert, so that the most recently used is last
+            self._entries[key] = entry
+            return entry
+        finally:
+            self._lock.release()
+
+    def set(self, key, entry):
+        """
+        @type entry: CacheEntry
+        """
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def invalidate(self, path):
+        """
+        Drop all entries affected by a write to path: the resource itself,
+        everything below it and the collection it's part of.
+        """
+        path = path.rstrip("/")
+        parent = path.rsplit("/", 1)[0]
+        below = path + "/"
+        self._lock.acquire()
+        try:
+            for key, entry in self._entries.items():
+                entry_path = entry.path.rstrip("/")
+                if entry_path in (path, parent) or entry_path.startswith(below):
+                    del self._entries[key]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskResourceCache(object):
+    """
+    A cache of resources in an sqlite-database, keyed by their KIND and id,
+    that outlives the process - so that a restarted worker doesn't fetch
+    the same users and tracks again:
+
+    >>> cache = DiskResourceCache("/var/cache/myapp/soundcloud.db", ttl=3600)
+    >>> connector = ApiConnector(authenticator, resource_cache=cache)
+
+    L{soundcloud.Scope._call} stores the resources of every response in it,
+    single ones as well as the items of collections, and answers GETs of a
+    single resource, like C{scope.Track.get(123)}, from it without asking
+    the server. Writes to a resource drop it. Unlike the L{ResponseCache},
+    entries are not revalidated, they are used until they expire C{ttl}
+    seconds after they have been stored. Beyond C{max_entries}, the oldest
+    entries are evicted.
+
+    Several threads and processes on a host can use the same database
+    file: each thread has a connection of its own, and sqlite's locking
+    serializes the writes.
+
+    Entries are namespaced by a digest of the access token they were
+    fetched with, as what the API returns can depend on the user.
+
+    If the database can't be used, e.g. because another connection held
+    its lock for longer than C{timeout}, the cache is bypassed and the
+    resources are fetched from the API. A resource that couldn't be
+    invalidated isn't taken from the cache by this process anymore, until
+    it has been stored again.
+    """
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS resources (
+               namespace TEXT NOT NULL,
+               kind TEXT NOT NULL,
+               id INTEGER NOT NULL,
+               data TEXT NOT NULL,
+               stored REAL NOT NULL,
+               PRIMARY KEY (namespace, kind, id))""",
+        "CREATE INDEX IF NOT EXISTS resources_stored ON resources (stored)",
+        )
+
+    """
+    Eviction runs after this many writes of a process.
+    """
+    EVICT_EVERY = 100
+
+    def __init__(self, path, ttl=3600, max_entries=100000, timeout=30.0, json_backend=None):
+        """
+        @param path: the database file, which is created if it doesn't exist
+        @type ttl: float
+        @param ttl: the seconds after which a resource is discarded
+        @type max_entries: int
+        @param max_entries: the maximum number of cached resources
+        @type timeout: float
+        @param timeout: the seconds to wait for a lock held by another
+                connection before giving up
+        @type json_backend: str | soundcloud.jsonbackend.JsonBackend
+        @param json_backend: the backend the resources are encoded and
+                decoded with, or its name. If not given, the fastest one.
+        """
+        if not isinstance(json_backend, jsonbackend.JsonBackend):
+            json_backend = jsonbackend.get(json_backend)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.json_backend = json_backend
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        # the resources that couldn't be invalidated
+        self._stale = set()
+        self._connection()
+
+    def _connection(self):
+        """
+        @return: the connection of the current thread - a new one after a
+                fork, as connections must not be shared between processes
+        @rtype: sqlite3.Connection
+        """
+        local = self._local
+        connection = getattr(local, "connection", None)
+        if connection is None or local.pid != os.getpid():
+            # we manage the transactions ourselves
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            try:
+                # readers don't block the writer, and vice versa
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.DatabaseError:
+                pass
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+        return connection
+
+    def namespace(self, access_token):
+        """
+        @return: the namespace of the resources fetched with access_token
+        @rtype: str
+        """
+        return hashlib.sha1(str(access_token)).hexdigest()
+
+    def get(self, namespace, kind, id):
+        """
+        @return: the data of a resource, or None if there is no valid one
+        @rtype: dict|None
+        """
+        if (namespace, kind, id) in self._stale:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT data, stored FROM resources WHERE namespace = ? AND kind = ? AND id = ?",
+                (namespace, kind, id)).fetchone()
+        except sqlite3.Error, e:
+            logger.warning("Couldn't read from the resource cache %s: %s", self.path, e)
+            return None
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        return self.json_backend.loads(row[0])
+
+    def set_many(self, namespace, kind, items):
+        """
+        Store resources of a kind.
+
+        @param items: the data of the resources, each with an id
+        @type items: list<dict>
+        """
+        stored = time.time()
+        rows = [(namespace, kind, item["id"], self._encode(item), stored) for item in items]
+        self._lock.acquire()
+        try:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        finally:
+            self._lock.release()
+        try:
+            self._write(lambda connection: connection.executemany(
+                "INSERT OR REPLACE INTO resources (namespace, kind, id, data, stored) VALUES (?, ?, ?, ?, ?)",
+                rows))
+            if evict:
+                self.evict()
+        except sqlite3.Error, e:
+            logger.warning("Couldn't write to the resource cache %s: %s", self.path, e)
+            return
+        if self._stale:
+            self._lock.acquire()
+            try:
+                self._stale.difference_update((namespace, kind, item["id"]) for item in items)
+            finally:
+                self._lock.release()
+
+    def _encode(self, item):
+        """
+        @return: the JSON-document of item, as unicode - sqlite refuses
+                byte strings that aren't ASCII
+        @rtype: unicode
+        """
+        data = self.json_backend.dumps(item)
+        if isinstance(data, str):
+            data = data.decode("utf-8")
+        return data
+
+    def set(self, namespace, kind, data):
+        self.set_many(namespace, kind, [data])
+
+    def invalidate(self, namespace, kind, id):
+        try:
+            self._write(lambda connection: connection.execute(
+                "DELETE FROM resources WHERE namespace = ? AND kind = ? AND id = ?", (namespace, kind, id)))
+        except sqlite3.Error, e:
+            logger.warning("Couldn't invalidate %s %s in the resource cache %s: %s", kind, id, self.path, e)
+            self._lock.acquire()
+            try:
+                self._stale.add((namespace, kind, id))
+            finally:
+                self._lock.release()
+
+    def evict(self):
+        """
+        Drop the expired resources, and the oldest ones beyond max_entries.
+        """
+        def evict(connection):
+            connection.execute("DELETE FROM resources WHERE stored < ?", (time.time() - self.ttl,))
+            count = connection.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+            if count > self.max_entries:
+                connection.execute("DELETE FROM resources WHERE rowid IN "
+                                   "(SELECT rowid FROM resources ORDER BY stored LIMIT ?)",
+                                   (count - self.max_entries,))
+        self._write(evict)
+
+    def clear(self):
+        self._write(lambda connection: connection.execute("DELETE FROM resources"))
+
+    def _write(self, func):
+        """
+        Invoke func with our connection in a transaction.
+        """
+        connection = self._connection()
+        # take the write-lock right away, so that concurrent writers wait
+        # for each other instead of failing to upgrade their locks
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            func(connection)
+            # a COMMIT that fails leaves the transaction open
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM resources").fetchone()[0]
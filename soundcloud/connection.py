@@ -0,0 +1,348 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Persistent (keep-alive) HTTP-connections for the SoundCloud API.
+
+urllib2 closes the connection after every single request, so each API-call
+pays for a full TCP- and TLS-handshake. The L{ConnectionPool} keeps
+connections open between requests, and the L{PooledHTTPHandler} makes
+urllib2 use them.
+"""
+
+import errno
+import httplib
+import logging
+import select
+import socket
+import threading
+import time
+import urllib
+import urllib2
+from cStringIO import StringIO
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no connection to a host became free within the
+    C{acquire_timeout} of the L{ConnectionPool}.
+    """
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of persistent HTTP- and HTTPS-connections, keyed by
+    scheme and host.
+
+    At most C{max_per_host} connections per host are in use at the same time;
+    further requests for that host wait until one is released. Connections
+    that sat idle for longer than C{idle_timeout} seconds are closed, and idle
+    connections are checked for being closed by the server before they are
+    handed out again.
+
+    A connection that is never released - e.g. because the response it
+    belongs to is neither read to the end nor closed - keeps its slot, so
+    waiting for a free one is bounded by C{acquire_timeout}.
+    """
+
+    CONNECTION_CLASSES = {
+        'http' : httplib.HTTPConnection,
+        'https' : httplib.HTTPSConnection,
+        }
+
+    def __init__(self, max_per_host=4, idle_timeout=60.0, timeout=None, acquire_timeout=60.0):
+        """
+        @type max_per_host: int
+        @param max_per_host: the maximum number of connections in use per host
+        @type idle_timeout: float
+        @param idle_timeout: seconds after which an unused connection is closed
+        @type timeout: None|float
+        @param timeout: the socket-timeout for new connections. If None, the
+                timeout of the request is used.
+        @type acquire_timeout: float
+        @param acquire_timeout: the seconds to wait for a connection to a host
+                that has C{max_per_host} connections in use
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        # (scheme, host) -> list of (connection, released_at)
+        self._idle = {}
+        # (scheme, host) -> number of connections currently handed out
+        self._active = {}
+
+    def acquire(self, scheme, host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """
+        Return a connection to the given host, and whether it has been
+        used before.
+
+        @rtype: tuple<httplib.HTTPConnection, bool>
+        @raise PoolTimeoutError: if no connection became free within
+                C{acquire_timeout}
+        """
+        key = (scheme, host)
+        deadline = time.time() + self.acquire_timeout
+        self._cond.acquire()
+        try:
+            while True:
+                self._evict_idle()
+                idle = self._idle.get(key)
+                while idle:
+                    conn, _ = idle.pop()
+                    if self._is_healthy(conn):
+                        self._active[key] = self._active.get(key, 0) + 1
+                        return conn, True
+                    logger.debug("Discarding stale connection to %s", host)
+                    conn.close()
+                if self._active.get(key, 0) < self.max_per_host:
+                    self._active[key] = self._active.get(key, 0) + 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeoutError("No connection to %s became free within %.1fs" %
+                                           (host, self.acquire_timeout))
+                self._cond.wait(remaining)
+        finally:
+            self._cond.release()
+
+        if self.timeout is not None:
+            timeout = self.timeout
+        logger.debug("Opening new %s-connection to %s", scheme, host)
+        return self.CONNECTION_CLASSES[scheme](host, timeout=timeout), False
+
+    def release(self, conn, scheme, host, reuse=True):
+        """
+        Hand a connection back to the pool. If C{reuse} is false, or the
+        connection has been closed, it's discarded.
+        """
+        key = (scheme, host)
+        self._cond.acquire()
+        try:
+            self._active[key] -= 1
+            if reuse and conn.sock is not None:
+                self._idle.setdefault(key, []).append((conn, time.time()))
+            else:
+                conn.close()
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        self._cond.acquire()
+        try:
+            for idle in self._idle.itervalues():
+                for conn, _ in idle:
+                    conn.close()
+            self._idle.clear()
+        finally:
+            self._cond.release()
+
+    def _evict_idle(self):
+        """
+        Close connections that haven't been used for C{idle_timeout} seconds.
+        Must be called with the lock held.
+        """
+        deadline = time.time() - self.idle_timeout
+        for key, idle in self._idle.items():
+            keep = []
+            for conn, released_at in idle:
+                if released_at < deadline:
+                    conn.close()
+                else:
+                    keep.append((conn, released_at))
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    def _is_healthy(self, conn):
+        """
+        An idle connection must not be readable - if it is, the server
+        either closed it or sent something we didn't ask for.
+        """
+        sock = conn.sock
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
+
+class PooledResponse(object):
+    """
+    Wraps an httplib.HTTPResponse and gives its connection back to the pool
+    once the response has been read completely.
+
+    A response that is closed before being read to the end leaves the
+    connection in an undefined state, so the connection is discarded then.
+    """
+
+    def __init__(self, pool, conn, scheme, host, response):
+        self._pool = pool
+        self._conn = conn
+        self._scheme = scheme
+        self._host = host
+        self._response = response
+
+    def read(self, amt=None):
+        if self._response is None:
+            return ''
+        data = self._response.read(amt)
+        if self._response.isclosed():
+            self._release(True)
+        return data
+
+    # socket._fileobject expects a socket
+    recv = read
+
+    def close(self):
+        if self._response is None:
+            return
+        response = self._response
+        complete = response.isclosed() or (response.length == 0 and not response.chunked)
+        response.close()
+        self._release(complete)
+
+    def _release(self, reuse):
+        response, self._response = self._response, None
+        self._pool.release(self._conn, self._scheme, self._host, reuse and not response.will_close)
+
+
+class PooledHTTPHandler(urllib2.HTTPHandler, urllib2.HTTPSHandler):
+    """
+    A urllib2-handler that performs HTTP- and HTTPS-requests over the
+    persistent connections of a L{ConnectionPool}.
+
+    Successful responses are streamed and return their connection to the pool
+    once they are read. All other responses - errors, redirects and the like -
+    are small, and are read right away so their connection is free again
+    no matter what the caller does with them.
+
+    The responses carry the time it took to connect, which is None for a
+    kept-alive connection, and the time from sending the request to
+    receiving the response-headers, as C{connect_time} and C{ttfb}.
+    """
+
+    STREAMED_STATUSES = (200, 206)
+
+    """
+    The methods a request may be sent again for, when its kept-alive
+    connection turned out to be closed, see L{_unsent}.
+    """
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+    def __init__(self, pool, debuglevel=0):
+        urllib2.AbstractHTTPHandler.__init__(self, debuglevel)
+        self.pool = pool
+
+    def http_open(self, req):
+        return self._open('http', req)
+
+    def https_open(self, req):
+        return self._open('https', req)
+
+    def _replayable(self, data):
+        if hasattr(data, 'rewind'):
+            return data.rewind()
+        return data is None or isinstance(data, basestring)
+
+    def _unsent(self, err, sending):
+        """
+        Whether a request failed on a kept-alive connection in a way that
+        shows the server never got it: the connection broke while we were
+        sending, or it was closed without any response. Anything else, a
+        timeout in particular, may have happened after the server acted
+        on the request.
+        """
+        if isinstance(err, socket.timeout):
+            return False
+        if sending:
+            return isinstance(err, socket.error) and err.errno in (errno.EPIPE, errno.ECONNRESET)
+        # httplib reports an empty status line with a message of its own
+        return isinstance(err, httplib.BadStatusLine) and \
+               (err.line.strip("'") == '' or err.line.startswith('No status line received'))
+
+    def _open(self, scheme, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers = dict(
+            (name.title(), val) for name, val in headers.items())
+
+        method = req.get_method()
+        while True:
+            try:
+                conn, reused = self.pool.acquire(scheme, host, req.timeout)
+            except PoolTimeoutError, err:
+                raise urllib2.URLError(err)
+            conn.set_debuglevel(self._debuglevel)
+            connect_time = None
+            sending = True
+            try:
+                if conn.sock is None:
+                    started = time.time()
+                    conn.connect()
+                    connect_time = time.time() - started
+                sent = time.time()
+                conn.request(method, req.get_selector(), req.data, headers)
+                sending = False
+                response = conn.getresponse(buffering=True)
+                ttfb = time.time() - sent
+            except (socket.error, httplib.HTTPException), err:
+                self.pool.release(conn, scheme, host, reuse=False)
+                # the server may have closed a kept-alive connection just
+                # before we used it - then we simply try a fresh one. All
+                # other failures are left to the RetryPolicy.
+                if reused and method in self.IDEMPOTENT_METHODS and self._unsent(err, sending) \
+                       and self._replayable(req.data):
+                    logger.debug("Reused connection to %s failed, retrying: %r", host, err)
+                    continue
+                raise urllib2.URLError(err)
+            break
+
+        pooled = PooledResponse(self.pool, conn, scheme, host, response)
+        if response.status in self.STREAMED_STATUSES:
+            fp = socket._fileobject(pooled, close=True)
+        else:
+            try:
+                fp = StringIO(pooled.read())
+            finally:
+                pooled.close()
+
+        resp = urllib.addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        # for the metrics of the call
+        resp.connect_time = connect_time
+        resp.ttfb = ttfb
+        return resp
@@ -1,6 +1,3 @@
-import string
-import types
-
 ##    json.py implements a JSON (http://json.org) reader and writer.
 ##    Copyright (C) 2005  Patrick D. Logan
 ##    Contact mailto:patrickdlogan@stardecisions.com
@@ -19,25 +16,23 @@ import types
 ##    License along with this library; if not, write to the Free Software
 ##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+"""
+A JSON reader and writer in pure Python.
+
+>>> read('{"id" : 1, "title" : "foo"}')
+{'id': 1, 'title': 'foo'}
+>>> write([1, "foo"])
+'[1,"foo"]'
+
+L{load} and L{dump} do the same with file-like objects, which are read and
+written in chunks, so the text of a large document is never held in memory
+as a whole. Strings are decoded as str, unless they contain \\u-escapes.
+Comments - // and /* */ - are skipped.
+"""
+
+import re
+import types
 
-class _StringGenerator(object):
-	def __init__(self, string):
-		self.string = string
-		self.index = -1
-	def peek(self):
-		i = self.index + 1
-		if i < len(self.string):
-			return self.string[i]
-		else:
-			return None
-	def next(self):
-		self.index += 1
-		if self.index < len(self.string):
-			return self.string[self.index]
-		else:
-			raise StopIteration
-	def all(self):
-		return self.string
 
 class WriteException(Exception):
     pass
@@ -45,261 +40,312 @@ class WriteException(Exception):
 class ReadException(Exception):
     pass
 
+
+# whitespace and comments, then one token
+_TOKEN = re.compile(r"""
+    \s*(?:(?://[^\r\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)\s*)*
+    (?:
+        "(?P<string>[^"\\]*(?:\\.[^"\\]*)*)"
+      | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+      | (?P<punct>[{}\[\]:,])
+      | (?P<literal>true|false|null)
+    )""", re.VERBOSE | re.DOTALL)
+
+# what may follow the document
+_TRAILER = re.compile(r"\s*(?:(?://[^\r\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)\s*)*", re.DOTALL)
+
+# a \u-escape, possibly followed by the low surrogate of a pair, or any other
+_ESCAPE = re.compile(r"\\(?:u([0-9a-fA-F]{4})(?:\\u([dD][c-fC-F][0-9a-fA-F]{2}))?|(.))", re.DOTALL)
+
+_ESCAPES = {'"' : '"', '\\' : '\\', '/' : '/', 'b' : '\b', 'f' : '\f', 'n' : '\n', 'r' : '\r', 't' : '\t'}
+
+_LITERALS = {"true" : True, "false" : False, "null" : None}
+
+
+def _unescape(raw):
+    """
+    Decode the escape-sequences of a string.
+    """
+    pieces = []
+    pos = 0
+    is_unicode = False
+    for m in _ESCAPE.finditer(raw):
+        pieces.append(raw[pos:m.start()])
+        code, low, ch = m.groups()
+        if code is not None:
+            code = int(code, 16)
+            if low is None:
+                pieces.append(unichr(code))
+            elif 0xd800 <= code < 0xdc00:
+                try:
+                    pieces.append(unichr(0x10000 + ((code - 0xd800) << 10) + int(low, 16) - 0xdc00))
+                except ValueError:
+                    # a narrow build keeps the pair
+                    pieces.append(unichr(code) + unichr(int(low, 16)))
+            else:
+                pieces.append(unichr(code) + unichr(int(low, 16)))
+            is_unicode = True
+        else:
+            try:
+                pieces.append(_ESCAPES[ch])
+            except KeyError:
+                raise ReadException, "Not a valid escaped JSON character: '%s' in %s" % (ch, raw)
+        pos = m.end()
+    pieces.append(raw[pos:])
+    if is_unicode and isinstance(raw, str):
+        pieces = [piece.decode("utf-8") if isinstance(piece, str) else piece for piece in pieces]
+        return u"".join(pieces)
+    return raw[:0].join(pieces)
+
+
 class JsonReader(object):
-    hex_digits = {'A': 10,'B': 11,'C': 12,'D': 13,'E': 14,'F':15}
-    escapes = {'t':'\t','n':'\n','f':'\f','r':'\r','b':'\b'}
+
+    """
+    The number of bytes L{load} reads at once.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    """
+    The number of characters that must follow a token in the buffer,
+    unless the file has been read completely.
+    """
+    LOOKAHEAD = 32
 
     def read(self, s):
-        self._generator = _StringGenerator(s)
-        result = self._read()
+        """
+        Decode a document.
+
+        @type s: str | unicode
+        @raise ReadException: if s isn't a valid document
+        """
+        self._buffer = s
+        self._pos = 0
+        self._fp = None
+        self._scan = _TOKEN.scanner(s).match
+        return self._document()
+
+    def load(self, fp, chunk_size=None):
+        """
+        Decode the document a file-like object contains, reading it in chunks.
+
+        @raise ReadException: if it isn't a valid document
+        """
+        self._buffer = ""
+        self._pos = 0
+        self._fp = fp
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._more()
+        self._scan = _TOKEN.scanner(self._buffer).match
+        return self._document()
+
+    def _document(self):
+        if self._fp is None and not self._buffer.strip():
+            raise ReadException, "Nothing to read: '%s'" % self._buffer
+        result = self._value(self._token())
+        # a comment may end in a later chunk
+        while self._more():
+            pass
+        m = _TRAILER.match(self._buffer, self._pos)
+        if m.end() != len(self._buffer):
+            raise ReadException, "Extra data after the JSON document: '%s'" % self._buffer[m.end():m.end() + 50]
         return result
 
-    def _read(self):
-        self._eatWhitespace()
-        peek = self._peek()
-        if peek is None:
-            raise ReadException, "Nothing to read: '%s'" % self._generator.all()
-        if peek == '{':
-            return self._readObject()
-        elif peek == '[':
-            return self._readArray()            
-        elif peek == '"':
-            return self._readString()
-        elif peek == '-' or peek.isdigit():
-            return self._readNumber()
-        elif peek == 't':
-            return self._readTrue()
-        elif peek == 'f':
-            return self._readFalse()
-        elif peek == 'n':
-            return self._readNull()
-        elif peek == '/':
-            self._readComment()
-            return self._read()
-        else:
-            raise ReadException, "Input is not valid JSON: '%s'" % self._generator.all()
+    def _more(self):
+        """
+        Append the next chunk of our file to the buffer, dropping what has
+        been decoded.
 
-    def _readTrue(self):
-        self._assertNext('t', "true")
-        self._assertNext('r', "true")
-        self._assertNext('u', "true")
-        self._assertNext('e', "true")
+        @return: False if there's nothing left to read
+        """
+        if self._fp is None:
+            return False
+        chunk = self._fp.read(self._chunk_size)
+        if not chunk:
+            self._fp = None
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
         return True
 
-    def _readFalse(self):
-        self._assertNext('f', "false")
-        self._assertNext('a', "false")
-        self._assertNext('l', "false")
-        self._assertNext('s', "false")
-        self._assertNext('e', "false")
-        return False
-
-    def _readNull(self):
-        self._assertNext('n', "null")
-        self._assertNext('u', "null")
-        self._assertNext('l', "null")
-        self._assertNext('l', "null")
-        return None
-
-    def _assertNext(self, ch, target):
-        if self._next() != ch:
-            raise ReadException, "Trying to read %s: '%s'" % (target, self._generator.all())
-
-    def _readNumber(self):
-        isfloat = False
-        result = self._next()
-        peek = self._peek()
-        while peek is not None and (peek.isdigit() or peek == "."):
-            isfloat = isfloat or peek == "."
-            result = result + self._next()
-            peek = self._peek()
-        try:
-            if isfloat:
-                return float(result)
-            else:
-                return int(result)
-        except ValueError:
-            raise ReadException, "Not a valid JSON number: '%s'" % result
-
-    def _readString(self):
-        result = ""
-        assert self._next() == '"'
-        try:
-            while self._peek() != '"':
-                ch = self._next()
-                if ch == "\\":
-                    ch = self._next()
-                    if ch in 'brnft':
-                        ch = self.escapes[ch]
-                    elif ch == "u":
-		        ch4096 = self._next()
-			ch256  = self._next()
-			ch16   = self._next()
-			ch1    = self._next()
-			n = 4096 * self._hexDigitToInt(ch4096)
-			n += 256 * self._hexDigitToInt(ch256)
-			n += 16  * self._hexDigitToInt(ch16)
-			n += self._hexDigitToInt(ch1)
-			ch = unichr(n)
-                    elif ch not in '"/\\':
-                        raise ReadException, "Not a valid escaped JSON character: '%s' in %s" % (ch, self._generator.all())
-                result = result + ch
-        except StopIteration:
-            raise ReadException, "Not a valid JSON string: '%s'" % self._generator.all()
-        assert self._next() == '"'
-        return result
+    def _token(self):
+        # the scanner matches each token where the last one ended
+        m = self._scan()
+        if self._fp is not None:
+            # the token may continue in the next chunk - a number may
+            # match only partly, e.g. "3" of "3.5"
+            while (m is None or len(self._buffer) - m.end() < self.LOOKAHEAD) and self._more():
+                self._scan = _TOKEN.scanner(self._buffer, self._pos).match
+                m = self._scan()
+        if m is None:
+            raise ReadException, "Input is not valid JSON: '%s'" % self._buffer[self._pos:self._pos + 50]
+        self._pos = m.end()
+        return m
 
-    def _hexDigitToInt(self, ch):
-        try:
-            result = self.hex_digits[ch.upper()]
-        except KeyError:
+    def _value(self, m):
+        kind = m.lastgroup
+        if kind == "string":
+            value = m.group("string")
+            if "\\" in value:
+                value = _unescape(value)
+            return value
+        elif kind == "number":
+            value = m.group("number")
             try:
-                result = int(ch)
-	    except ValueError:
-	         raise ReadException, "The character %s is not a hex digit." % ch
-        return result
+                if "." in value or "e" in value or "E" in value:
+                    return float(value)
+                return int(value)
+            except ValueError:
+                raise ReadException, "Not a valid JSON number: '%s'" % value
+        elif kind == "literal":
+            return _LITERALS[m.group("literal")]
+        punct = m.group("punct")
+        if punct == "{":
+            return self._object()
+        elif punct == "[":
+            return self._array()
+        raise ReadException, "Input is not valid JSON: unexpected '%s'" % punct
 
-    def _readComment(self):
-        assert self._next() == "/"
-        second = self._next()
-        if second == "/":
-            self._readDoubleSolidusComment()
-        elif second == '*':
-            self._readCStyleComment()
-        else:
-            raise ReadException, "Not a valid JSON comment: %s" % self._generator.all()
-
-    def _readCStyleComment(self):
-        try:
-            done = False
-            while not done:
-                ch = self._next()
-                done = (ch == "*" and self._peek() == "/")
-                if not done and ch == "/" and self._peek() == "*":
-                    raise ReadException, "Not a valid JSON comment: %s, '/*' cannot be embedded in the comment." % self._generator.all()
-            self._next()
-        except StopIteration:
-            raise ReadException, "Not a valid JSON comment: %s, expected */" % self._generator.all()
-
-    def _readDoubleSolidusComment(self):
-        try:
-            ch = self._next()
-            while ch != "\r" and ch != "\n":
-                ch = self._next()
-        except StopIteration:
-            pass
-
-    def _readArray(self):
+    def _array(self):
         result = []
-        assert self._next() == '['
-        done = self._peek() == ']'
-        while not done:
-            item = self._read()
-            result.append(item)
-            self._eatWhitespace()
-            done = self._peek() == ']'
-            if not done:
-                ch = self._next()
-                if ch != ",":
-                    raise ReadException, "Not a valid JSON array: '%s' due to: '%s'" % (self._generator.all(), ch)
-        assert ']' == self._next()
-        return result
+        m = self._token()
+        if m.group("punct") == "]":
+            return result
+        while True:
+            result.append(self._value(m))
+            punct = self._token().group("punct")
+            if punct == "]":
+                return result
+            if punct != ",":
+                raise ReadException, "Not a valid JSON array: expected ',' or ']' at '%s'" % \
+                      self._buffer[self._pos - 1:self._pos + 50]
+            m = self._token()
 
-    def _readObject(self):
+    def _object(self):
         result = {}
-        assert self._next() == '{'
-        done = self._peek() == '}'
-        while not done:
-            key = self._read()
-            if type(key) is not types.StringType:
-                raise ReadException, "Not a valid JSON object key (should be a string): %s" % key
-            self._eatWhitespace()
-            ch = self._next()
-            if ch != ":":
-                raise ReadException, "Not a valid JSON object: '%s' due to: '%s'" % (self._generator.all(), ch)
-            self._eatWhitespace()
-            val = self._read()
-            result[key] = val
-            self._eatWhitespace()
-            done = self._peek() == '}'
-            if not done:
-                ch = self._next()
-                if ch != ",":
-                    raise ReadException, "Not a valid JSON array: '%s' due to: '%s'" % (self._generator.all(), ch)
-	assert self._next() == "}"
-        return result
+        m = self._token()
+        if m.group("punct") == "}":
+            return result
+        while True:
+            if m.lastgroup != "string":
+                raise ReadException, "Not a valid JSON object key (should be a string): %s" % m.group(0).strip()
+            key = self._value(m)
+            if self._token().group("punct") != ":":
+                raise ReadException, "Not a valid JSON object: expected ':' at '%s'" % \
+                      self._buffer[self._pos - 1:self._pos + 50]
+            result[key] = self._value(self._token())
+            punct = self._token().group("punct")
+            if punct == "}":
+                return result
+            if punct != ",":
+                raise ReadException, "Not a valid JSON object: expected ',' or '}' at '%s'" % \
+                      self._buffer[self._pos - 1:self._pos + 50]
+            m = self._token()
+
+
+_ESCAPED = re.compile(r'[\\"\x00-\x1f]')
+
+_ESCAPED_WITH_SLASH = re.compile(r'[\\"/\x00-\x1f]')
+
+_REPLACEMENTS = dict((chr(i), "\\u%04x" % i) for i in xrange(0x20))
+_REPLACEMENTS.update({'\\' : '\\\\', '"' : '\\"', '/' : '\\/', '\b' : '\\b', '\f' : '\\f', '\n' : '\\n',
+                      '\r' : '\\r', '\t' : '\\t'})
 
-    def _eatWhitespace(self):
-        p = self._peek()
-        while p is not None and p in string.whitespace or p == '/':
-            if p == '/':
-                self._readComment()
-            else:
-                self._next()
-            p = self._peek()
 
-    def _peek(self):
-        return self._generator.peek()
+_INFINITY = (float("inf"), float("-inf"))
+
+
+def _replace(m):
+    return _REPLACEMENTS[m.group(0)]
 
-    def _next(self):
-        return self._generator.next()
 
 class JsonWriter(object):
-        
-    def _append(self, s):
-        self._results.append(s)
+
+    """
+    The size L{dump} collects output up to before writing it.
+    """
+    BUFFER_SIZE = 1024
 
     def write(self, obj, escaped_forward_slash=False):
-        self._escaped_forward_slash = escaped_forward_slash
+        """
+        Encode obj as JSON.
+
+        @rtype: str | unicode
+        @raise WriteException: if obj contains something that can't be encoded
+        """
+        self._escaped = _ESCAPED_WITH_SLASH if escaped_forward_slash else _ESCAPED
         self._results = []
+        self._fp = None
         self._write(obj)
         return "".join(self._results)
 
+    def dump(self, obj, fp, escaped_forward_slash=False):
+        """
+        Encode obj as JSON to a file-like object, while it's being encoded.
+        Unicode is written encoded as UTF-8.
+
+        @raise WriteException: if obj contains something that can't be encoded
+        """
+        self._escaped = _ESCAPED_WITH_SLASH if escaped_forward_slash else _ESCAPED
+        self._results = []
+        self._fp = fp
+        self._write(obj)
+        self._flush()
+
+    def _flush(self):
+        # the strings have been encoded already, see _write
+        self._fp.write("".join(self._results))
+        del self._results[:]
+
     def _write(self, obj):
+        append = self._results.append
         ty = type(obj)
-        if ty is types.DictType:
-            n = len(obj)
-            self._append("{")
-            for k, v in obj.items():
+        if ty is types.StringType or ty is types.UnicodeType:
+            escaped = self._escaped.sub(_replace, obj)
+            # a dump may mix unicode with UTF-8 encoded strings, which can't
+            # be joined
+            if ty is types.UnicodeType and self._fp is not None:
+                escaped = escaped.encode("utf-8")
+            append('"')
+            append(escaped)
+            append('"')
+        elif ty is types.IntType or ty is types.LongType:
+            append(str(obj))
+        elif ty is types.DictType:
+            append("{")
+            first = True
+            for k, v in obj.iteritems():
+                if first:
+                    first = False
+                else:
+                    append(",")
                 self._write(k)
-                self._append(":")
+                append(":")
                 self._write(v)
-                n = n - 1
-                if n > 0:
-                    self._append(",")
-            self._append("}")
+                if self._fp is not None and len(self._results) > self.BUFFER_SIZE:
+                    self._flush()
+            append("}")
         elif ty is types.ListType or ty is types.TupleType:
-            n = len(obj)
-            self._append("[")
+            append("[")
+            first = True
             for item in obj:
+                if first:
+                    first = False
+                else:
+                    append(",")
                 self._write(item)
-                n = n - 1
-                if n > 0:
-                    self._append(",")
-            self._append("]")
-        elif ty is types.StringType or ty is types.UnicodeType:
-            self._append('"')
-	    obj = obj.replace('\\', r'\\')
-            if self._escaped_forward_slash:
-                obj = obj.replace('/', r'\/')
-	    obj = obj.replace('"', r'\"')
-	    obj = obj.replace('\b', r'\b')
-	    obj = obj.replace('\f', r'\f')
-	    obj = obj.replace('\n', r'\n')
-	    obj = obj.replace('\r', r'\r')
-	    obj = obj.replace('\t', r'\t')
-            self._append(obj)
-            self._append('"')
-        elif ty is types.IntType or ty is types.LongType:
-            self._append(str(obj))
+                if self._fp is not None and len(self._results) > self.BUFFER_SIZE:
+                    self._flush()
+            append("]")
         elif ty is types.FloatType:
-            self._append("%f" % obj)
+            if obj != obj or obj in _INFINITY:
+                raise WriteException, "Cannot write in JSON: %s" % repr(obj)
+            append(repr(obj))
         elif obj is True:
-            self._append("true")
+            append("true")
         elif obj is False:
-            self._append("false")
+            append("false")
         elif obj is None:
-            self._append("null")
+            append("null")
         else:
             raise WriteException, "Cannot write in JSON: %s" % repr(obj)
 
@@ -308,3 +354,9 @@ def write(obj, escaped_forward_slash=False):
 
 def read(s):
     return JsonReader().read(s)
+
+def dump(obj, fp, escaped_forward_slash=False):
+    JsonWriter().dump(obj, fp, escaped_forward_slash)
+
+def load(fp, chunk_size=None):
+    return JsonReader().load(fp, chunk_size)
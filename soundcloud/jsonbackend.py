@@ -0,0 +1,177 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+The JSON-decoders responses can be decoded with.
+
+L{get} returns a backend by name, or, without one, the fastest that is
+installed:
+
+>>> get().name
+'simplejson'
+>>> connector = ApiConnector(authenticator, json_backend="json")
+
+The order of preference in L{PREFERENCE} follows the numbers of
+benchmarks/bench_json_backends.py.
+"""
+
+# otherwise "json" would be our own soundcloud/json.py
+from __future__ import absolute_import
+
+import functools
+import threading
+
+
+class JsonBackend(object):
+    """
+    A JSON-decoder, together with the encoder of the same library.
+    """
+
+    def __init__(self, name, loads, decoder=None, accelerated=False, dumps=None):
+        """
+        @param name: the name of the backend
+        @param loads: decodes a document
+        @type loads: callable(str) -> object
+        @param decoder: if the backend can decode a document incrementally, an
+                object with a raw_decode-method, see
+                L{soundcloud.jsonstream.CollectionStream}
+        @param accelerated: whether the decoder is implemented in C
+        @type accelerated: bool
+        @param dumps: encodes a document compactly
+        @type dumps: callable(object) -> str
+        """
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.decoder = decoder
+        self.accelerated = accelerated
+
+    def __repr__(self):
+        return "<JsonBackend %s%s>" % (self.name, " (C)" if self.accelerated else "")
+
+
+def _has_c_scanner(module_name):
+    """
+    @return: whether the scanner-module of simplejson or json uses its
+            C-implementation
+    """
+    try:
+        scanner = __import__(module_name, fromlist=["c_make_scanner"])
+    except ImportError:
+        return False
+    return getattr(scanner, "c_make_scanner", None) is not None
+
+
+def _ujson():
+    import ujson
+    return JsonBackend("ujson", ujson.loads, accelerated=True, dumps=ujson.dumps)
+
+
+def _simplejson():
+    import simplejson
+    return JsonBackend("simplejson", simplejson.loads, simplejson.JSONDecoder(),
+                       _has_c_scanner("simplejson.scanner"),
+                       functools.partial(simplejson.dumps, separators=(",", ":")))
+
+
+def _json():
+    import json
+    return JsonBackend("json", json.loads, json.JSONDecoder(), _has_c_scanner("json.scanner"),
+                       functools.partial(json.dumps, separators=(",", ":")))
+
+
+def _soundcloud():
+    from soundcloud import json
+    return JsonBackend("soundcloud", json.read, dumps=json.write)
+
+
+"""
+The backends, by name.
+"""
+BACKENDS = {
+    "ujson" : _ujson,
+    "simplejson" : _simplejson,
+    "json" : _json,
+    "soundcloud" : _soundcloud,
+    }
+
+"""
+The order in which the backends are preferred. A backend that is
+implemented in C comes before all that aren't. The bundled decoder is the
+last resort, it's pure Python and a lot slower than all the others.
+"""
+PREFERENCE = ("ujson", "simplejson", "json", "soundcloud")
+
+_backends = {}
+
+_lock = threading.Lock()
+
+
+def get(name=None):
+    """
+    Return a backend.
+
+    @param name: the name of the backend, or None for the fastest one
+            that is installed
+    @rtype: JsonBackend
+    @raise ValueError: if there's no backend of that name
+    @raise ImportError: if the backend isn't installed
+    """
+    if name is None:
+        return _select()
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+    if name not in BACKENDS:
+        raise ValueError("Unknown JSON-backend %r, choose one of %s" % (name, ", ".join(PREFERENCE)))
+    _lock.acquire()
+    try:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+    finally:
+        _lock.release()
+
+
+def available():
+    """
+    @return: the backends that are installed, in order of preference
+    @rtype: list<JsonBackend>
+    """
+    res = []
+    for name in PREFERENCE:
+        try:
+            res.append(get(name))
+        except ImportError:
+            pass
+    return res
+
+
+def _select():
+    try:
+        return _backends[None]
+    except KeyError:
+        pass
+    backends = available()
+    accelerated = [backend for backend in backends if backend.accelerated]
+    backend = (accelerated or backends)[0]
+    _backends[None] = backend
+    return backend
@@ -0,0 +1,204 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Incremental decoding of JSON collections.
+"""
+
+import simplejson
+
+WHITESPACE = " \t\n\r"
+
+
+class CollectionStream(object):
+    """
+    Decodes a JSON-document read from a file-like object, handing out the
+    items of its collection one at a time.
+
+    The document is either a list of items, or an object with the items as
+    a list under C{key}. In the latter case, the other members of the object
+    are collected in L{document}. Only the part of the response that hasn't
+    been decoded yet is buffered, so the items become available as soon as
+    they have arrived, and never all of them are in memory at once.
+
+    >>> stream = CollectionStream(handle)
+    >>> if stream.start():
+    ...     for item in stream.items():
+    ...         print item["id"]
+    ... else:
+    ...     print stream.document
+
+    Decoding is done by the raw_decode method of a JSON-decoder, e.g.
+    simplejson.JSONDecoder.
+    """
+
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, fp, decoder=None, key="collection", chunk_size=None):
+        """
+        @param fp: the file-like object to read from
+        @param decoder: the decoder to use, defaults to simplejson's
+        @param key: the member of an object containing the collection
+        @param chunk_size: the number of bytes to read at once
+        """
+        if decoder is None:
+            decoder = simplejson.JSONDecoder()
+        self._fp = fp
+        self._decoder = decoder
+        self._key = key
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._in_object = False
+        # the decoded document without the collection - or the whole
+        # document, if it has no collection
+        self.document = None
+
+    def start(self):
+        """
+        Decode the document up to the first item of the collection.
+
+        @return: True if the document contains a collection, False if it was
+                decoded completely without finding one
+        @rtype: bool
+        """
+        c = self._skip_whitespace()
+        if c is None:
+            # an empty response
+            self.document = {}
+            return False
+        if c == "[":
+            self._pos += 1
+            return True
+        if c != "{":
+            self.document = self._decode_value()
+            return False
+        self._pos += 1
+        self._in_object = True
+        self.document = {}
+        return self._read_members()
+
+    def items(self):
+        """
+        Yield the items of the collection. Once they are exhausted, the
+        rest of the document has been decoded as well.
+        """
+        c = self._skip_whitespace()
+        if c == "]":
+            self._pos += 1
+        else:
+            while True:
+                yield self._decode_value()
+                c = self._skip_whitespace()
+                self._pos += 1
+                if c == "]":
+                    break
+                if c != ",":
+                    raise ValueError("Expected ',' or ']' at %r" % self._buffer[self._pos - 1:self._pos + 20])
+        if self._in_object:
+            self._skip_separator()
+            self._read_members()
+
+    def _read_members(self):
+        """
+        Decode the members of an object, until either the collection starts
+        or the object ends.
+        """
+        while True:
+            c = self._skip_whitespace()
+            if c == "}":
+                self._pos += 1
+                return False
+            key = self._decode_value()
+            self._expect(":")
+            if key == self._key and self._skip_whitespace() == "[":
+                self._pos += 1
+                return True
+            self.document[key] = self._decode_value()
+            self._skip_separator()
+
+    def _skip_separator(self):
+        """
+        Skip the "," between two members of an object.
+        """
+        if self._skip_whitespace() == ",":
+            self._pos += 1
+
+    def _expect(self, expected):
+        c = self._skip_whitespace()
+        if c != expected:
+            raise ValueError("Expected %r, got %r" % (expected, c))
+        self._pos += 1
+
+    def _skip_whitespace(self):
+        """
+        Advance to the next non-whitespace character, and return it.
+
+        @return: the character, or None at the end of the document
+        """
+        while True:
+            buf, pos = self._buffer, self._pos
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return None
+
+    def _decode_value(self):
+        """
+        Decode the value at the current position, reading more data until
+        it's complete.
+        """
+        self._skip_whitespace()
+        read_more = 1
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self._fill(read_more):
+                    raise
+                # a large value, so grow the buffer faster
+                read_more *= 2
+                continue
+            # a number at the end of the buffer might continue in the next chunk
+            if end == len(self._buffer) and not self._eof:
+                self._fill(read_more)
+                continue
+            self._pos = end
+            return value
+
+    def _fill(self, chunks=1):
+        """
+        Read more data, and drop what has been decoded already.
+
+        @return: False if there is nothing left to read
+        """
+        if self._eof:
+            return False
+        data = self._fp.read(self._chunk_size * chunks)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
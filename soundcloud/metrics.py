@@ -0,0 +1,275 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Per-request metrics of API-calls.
+
+The L{soundcloud.ApiConnector} reports every call to its metrics-hook as
+a L{RequestEvent}. The default hook does nothing, and as it's disabled, the
+events aren't even created. L{MetricsAggregator} collects them into
+counters and histograms per endpoint:
+
+>>> metrics = MetricsAggregator()
+>>> connector = ApiConnector(authenticator, metrics=metrics)
+>>> ...
+>>> metrics.snapshot()[("GET", "/tracks/{id}")]["ttfb"]["p90"]
+"""
+
+import threading
+import time
+import urllib2
+
+from soundcloud.util import endpoint_template
+
+
+class RequestEvent(object):
+    """
+    An API-call: its request, its response and where the time went.
+
+    Timings are in seconds, and None if they weren't measured - e.g. there
+    is no connect-time if a kept-alive connection was used, and no download-
+    or decode-time for a streamed collection.
+    """
+
+    __slots__ = ("http_method", "path", "endpoint", "status", "bytes_out", "bytes_in", "redirects",
+                 "attempts", "error", "started", "connect", "ttfb", "download", "decode", "map", "total")
+
+    TIMINGS = ("connect", "ttfb", "download", "decode", "map", "total")
+
+    def __init__(self, http_method, path):
+        self.http_method = http_method
+        self.path = path
+        self.endpoint = endpoint_template(path)
+        self.status = None
+        self.bytes_out = 0
+        self.bytes_in = None
+        self.redirects = 0
+        # the number of times the request was sent, 0 if it was coalesced
+        # with an identical one
+        self.attempts = 0
+        self.error = None
+        self.started = time.time()
+        self.connect = None
+        self.ttfb = None
+        self.download = None
+        self.decode = None
+        self.map = None
+        self.total = None
+
+    @property
+    def coalesced(self):
+        return self.attempts == 0 and self.error is None
+
+    def request(self, data):
+        """
+        Record the body of a request that has been sent, as the handlers
+        encoded it - a str, or a streamed multipart-body.
+        """
+        self.attempts += 1
+        self.bytes_out = len(data) if data is not None else 0
+
+    def response(self, response, redirects=0):
+        """
+        Record a response, which may be an urllib2.HTTPError.
+        """
+        self.status = response.code
+        self.redirects = redirects
+        # an HTTPError wraps the response it was raised for
+        if isinstance(response, urllib2.HTTPError):
+            response = response.fp
+        # set by the PooledHTTPHandler
+        self.connect = getattr(response, "connect_time", None)
+        self.ttfb = getattr(response, "ttfb", None)
+
+    def finish(self):
+        self.total = time.time() - self.started
+
+    def __repr__(self):
+        return "<RequestEvent %s %s %s %.1fms>" % (self.http_method, self.endpoint, self.status,
+                                                   (self.total or 0) * 1000)
+
+
+class MetricsHook(object):
+    """
+    The interface of metrics-hooks, which does nothing.
+
+    To process the events of a connector, subclass it, set C{enabled} to
+    True and override L{request}. It's invoked from the thread that made
+    the call, after the call is finished - successfully or not.
+    """
+
+    enabled = False
+
+    def request(self, event):
+        """
+        @type event: RequestEvent
+        """
+        pass
+
+
+class Histogram(object):
+    """
+    A histogram with fixed, roughly logarithmic buckets.
+    """
+
+    BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, bounds=None):
+        self.bounds = bounds or self.BOUNDS
+        # the last bucket holds everything beyond the bounds
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        index = 0
+        for bound in self.bounds:
+            if value <= bound:
+                break
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        @param p: the percentile, between 0 and 100
+        @return: the upper bound of the bucket the percentile falls into,
+                or the maximum, if it's beyond the bounds
+        """
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.bounds):
+                    return min(self.bounds[index], self.max)
+                break
+        return self.max
+
+    def snapshot(self):
+        return dict(
+            count=self.count,
+            mean=self.sum / self.count if self.count else None,
+            min=self.min,
+            max=self.max,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            )
+
+
+class EndpointMetrics(object):
+    """
+    The aggregated events of an endpoint.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.redirects = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        # status -> count
+        self.statuses = {}
+        self.timings = dict((name, Histogram()) for name in RequestEvent.TIMINGS)
+
+    def add(self, event):
+        self.requests += 1
+        if event.error is not None:
+            self.errors += 1
+        if event.coalesced:
+            self.coalesced += 1
+        self.retries += max(0, event.attempts - 1)
+        self.redirects += event.redirects
+        self.bytes_out += event.bytes_out
+        self.bytes_in += event.bytes_in or 0
+        self.statuses[event.status] = self.statuses.get(event.status, 0) + 1
+        for name, histogram in self.timings.iteritems():
+            value = getattr(event, name)
+            if value is not None:
+                histogram.add(value)
+
+    def snapshot(self):
+        res = dict(
+            requests=self.requests,
+            errors=self.errors,
+            coalesced=self.coalesced,
+            retries=self.retries,
+            redirects=self.redirects,
+            bytes_out=self.bytes_out,
+            bytes_in=self.bytes_in,
+            statuses=dict(self.statuses),
+            )
+        for name, histogram in self.timings.iteritems():
+            res[name] = histogram.snapshot()
+        return res
+
+
+class MetricsAggregator(MetricsHook):
+    """
+    Collects the events of one or more connectors in memory, per
+    HTTP-method and endpoint.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def request(self, event):
+        key = (event.http_method, event.endpoint)
+        self._lock.acquire()
+        try:
+            metrics = self._endpoints.get(key)
+            if metrics is None:
+                metrics = self._endpoints[key] = EndpointMetrics()
+            metrics.add(event)
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        """
+        @return: the metrics of every endpoint, keyed by HTTP-method and endpoint
+        @rtype: dict<tuple<str, str>, dict>
+        """
+        self._lock.acquire()
+        try:
+            return dict((key, metrics.snapshot()) for key, metrics in self._endpoints.iteritems())
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._endpoints.clear()
+        finally:
+            self._lock.release()
@@ -0,0 +1,307 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Retrying of requests that failed transiently.
+
+A L{RetryPolicy} given to the L{soundcloud.ApiConnector} makes it send
+idempotent requests again after server-errors, connection-resets and
+timeouts, waiting an exponentially growing, jittered time in between. Per
+host, a L{CircuitBreaker} stops sending requests at all for a while once
+too many of them failed in a row.
+"""
+
+import httplib
+import logging
+import random
+import socket
+import threading
+import time
+import urllib2
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to a host that is considered down.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    The health of a single host.
+
+    The circuit is closed as long as requests succeed. After
+    C{failure_threshold} consecutive failures it opens, and requests fail
+    right away with a L{CircuitOpenError}. After C{reset_timeout} seconds
+    a single request is let through: if it succeeds, the circuit is closed
+    again, otherwise it stays open for another C{reset_timeout} seconds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """
+        @raise CircuitOpenError: if no request may be sent now
+        """
+        self._lock.acquire()
+        try:
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open after %i failures" % self.failures)
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError("Circuit half-open, waiting for the probing request")
+                self._probing = True
+        finally:
+            self._lock.release()
+
+    def record_success(self):
+        self._lock.acquire()
+        try:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+        finally:
+            self._lock.release()
+
+    def record_failure(self):
+        self._lock.acquire()
+        try:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Opening circuit after %i failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.time()
+            self._probing = False
+        finally:
+            self._lock.release()
+
+    def abandon(self):
+        """
+        Forget a request that ended without telling anything about the
+        host, so that the next one may probe a half-open circuit.
+        """
+        self._lock.acquire()
+        try:
+            self._probing = False
+        finally:
+            self._lock.release()
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed requests are sent again, and when:
+
+    >>> connector = ApiConnector(authenticator, retry=RetryPolicy(max_attempts=4))
+
+    A request is retried if it failed transiently - with one of the
+    C{retry_statuses}, or without a response at all - and its HTTP-method is
+    idempotent. Uploads are only retried if their files can be read again
+    from the start, otherwise the error is raised.
+
+    The wait before the n-th retry is drawn uniformly from
+    [0, min(max_backoff, backoff * 2**n)], or is exactly that upper bound if
+    C{jitter} is false.
+
+    The counters and the state of the circuit breakers are available
+    through L{snapshot}.
+    """
+
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    """
+    The errors that mean the request got no response. urllib2 wraps
+    most of them in a URLError.
+    """
+    TRANSIENT_ERRORS = (urllib2.URLError, socket.error, httplib.HTTPException)
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30.0, jitter=True, idempotent_methods=None,
+                 retry_statuses=None, failure_threshold=5, reset_timeout=30.0):
+        """
+        @type max_attempts: int
+        @param max_attempts: how often a request is sent at most, including the first time
+        @type backoff: float
+        @param backoff: the seconds to wait before the first retry
+        @type max_backoff: float
+        @param max_backoff: the maximum number of seconds to wait between two attempts
+        @type jitter: bool
+        @param jitter: whether to randomize the waits, so that clients that failed
+                together don't retry together
+        @param idempotent_methods: the HTTP-methods that may be retried
+        @param retry_statuses: the HTTP-statuses that are retried
+        @type failure_threshold: int
+        @param failure_threshold: the number of consecutive failures that open the
+                circuit of a host
+        @type reset_timeout: float
+        @param reset_timeout: the seconds a circuit stays open
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        if idempotent_methods is None:
+            idempotent_methods = self.IDEMPOTENT_METHODS
+        self.idempotent_methods = frozenset(idempotent_methods)
+        if retry_statuses is None:
+            retry_statuses = self.RETRY_STATUSES
+        self.retry_statuses = frozenset(retry_statuses)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retries = 0
+        self.given_up = 0
+        self.refused = 0
+        self.rejected = 0
+        self.total_backoff = 0.0
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        """
+        @rtype: CircuitBreaker
+        """
+        self._lock.acquire()
+        try:
+            try:
+                return self._breakers[host]
+            except KeyError:
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                return breaker
+        finally:
+            self._lock.release()
+
+    def before_request(self, host):
+        """
+        @raise CircuitOpenError: if the circuit of host is open
+        """
+        try:
+            self.breaker(host).before_request()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+
+    def record(self, host, error=None):
+        """
+        Record the outcome of a request to host: a response, or the error
+        it failed with. Any response that isn't a server-error shows the
+        host is healthy.
+        """
+        if error is not None and self.is_transient(error):
+            self.breaker(host).record_failure()
+        else:
+            self.breaker(host).record_success()
+
+    def abandon(self, host):
+        """
+        Record that a request to host ended before there was an outcome,
+        e.g. because building it failed.
+        """
+        self.breaker(host).abandon()
+
+    def is_transient(self, error):
+        if isinstance(error, urllib2.HTTPError):
+            return error.code in self.retry_statuses
+        return isinstance(error, self.TRANSIENT_ERRORS)
+
+    def should_retry(self, http_method, error, attempt, rewind=None):
+        """
+        Decide whether a failed request is sent again, and if so, wait
+        before returning.
+
+        @param http_method: the HTTP-method of the request
+        @param error: the error the request failed with
+        @type attempt: int
+        @param attempt: the number of the failed attempt, starting at 0
+        @param rewind: if given, a callable preparing the request-body to be
+                sent again, returning False if that's impossible
+        @rtype: bool
+        """
+        if not self.is_transient(error) or http_method not in self.idempotent_methods:
+            return False
+        if attempt + 1 >= self.max_attempts:
+            self._count("given_up")
+            return False
+        if rewind is not None and not rewind():
+            logger.warning("Not retrying %s, its body can't be sent again", http_method)
+            self._count("refused")
+            return False
+        delay = self.delay(attempt)
+        logger.info("Attempt %i failed with %r, retrying in %.2fs", attempt + 1, error, delay)
+        self._lock.acquire()
+        try:
+            self.retries += 1
+            self.total_backoff += delay
+        finally:
+            self._lock.release()
+        time.sleep(delay)
+        return True
+
+    def delay(self, attempt):
+        """
+        @return: the seconds to wait after the given failed attempt
+        @rtype: float
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def snapshot(self):
+        """
+        @return: the counters, and the state of the circuit per host
+        @rtype: dict
+        """
+        self._lock.acquire()
+        try:
+            return dict(
+                retries=self.retries,
+                given_up=self.given_up,
+                refused=self.refused,
+                rejected=self.rejected,
+                total_backoff=self.total_backoff,
+                circuits=dict((host, (breaker.state, breaker.failures))
+                              for host, breaker in self._breakers.iteritems()),
+                )
+        finally:
+            self._lock.release()
+
+    def _count(self, name):
+        self._lock.acquire()
+        try:
+            setattr(self, name, getattr(self, name) + 1)
+        finally:
+            self._lock.release()
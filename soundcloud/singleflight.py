@@ -0,0 +1,126 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Coalescing of identical concurrent requests.
+"""
+
+import sys
+import threading
+
+
+class _Call(object):
+    """
+    A call in flight.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Makes concurrent calls for the same key share a single execution:
+
+    >>> flight = SingleFlight()
+    >>> flight.do(url, fetch)
+
+    While fetch runs for url, further calls of C{do} with that url don't
+    invoke their function, but wait for the running one and return its
+    result - or raise its error. Once it has finished, the next call starts
+    a new execution, so results are never reused after the fact.
+
+    Given to the L{soundcloud.ApiConnector}, it coalesces identical GETs:
+    same URL, and so the same access token. The decoded response is shared,
+    but each caller maps it to resources of its own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        # the number of calls of do, how many of them executed their
+        # function, and how many waited for another one instead
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """
+        Invoke func, unless it's already running for key.
+
+        @return: the result of func, or of the call running for key
+        """
+        self._lock.acquire()
+        try:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        finally:
+            self._lock.release()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error[0], call.error[1], call.error[2]
+            return call.result
+
+        try:
+            call.result = func()
+        except:
+            call.error = sys.exc_info()
+            raise
+        finally:
+            self._lock.acquire()
+            try:
+                del self._calls[key]
+                self.executed += 1
+            finally:
+                self._lock.release()
+            call.done.set()
+        return call.result
+
+    @property
+    def in_flight(self):
+        """
+        The number of keys currently being executed.
+        """
+        return len(self._calls)
+
+    def snapshot(self):
+        """
+        @return: the counters
+        @rtype: dict
+        """
+        self._lock.acquire()
+        try:
+            return dict(
+                calls=self.calls,
+                executed=self.executed,
+                coalesced=self.coalesced,
+                in_flight=len(self._calls),
+                )
+        finally:
+            self._lock.release()
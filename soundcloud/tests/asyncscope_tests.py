@@ -0,0 +1,97 @@
+import threading
+import time
+
+import soundcloud
+from soundcloud.asyncscope import AsyncScope
+from soundcloud.connection import ConnectionPool
+from soundcloud.tests.stub_server import StubServerTestCase, collection
+
+
+TRACKS = [{"id" : id, "kind" : "track", "title" : str(id)} for id in xrange(1, 121)]
+
+
+class AsyncScopeTests(StubServerTestCase):
+    """
+    AsyncScope: calls performed by its worker pool, collections gathered in
+    the background, and the number of requests it has in flight.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/me", body={"id" : 3, "kind" : "user", "username" : "stub"})
+        self.server.route("GET", "/tracks", body=collection(TRACKS))
+        for track in TRACKS[:10]:
+            self.server.route("GET", "/tracks/%i" % track["id"], body=self.slow(track))
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+    def slow(self, body):
+        def respond(request):
+            self.lock.acquire()
+            try:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            finally:
+                self.lock.release()
+            time.sleep(0.2)
+            self.lock.acquire()
+            try:
+                self.in_flight -= 1
+            finally:
+                self.lock.release()
+            return 200, {}, body
+        return respond
+
+
+    def ascope(self, workers=8, **kwargs):
+        ascope = AsyncScope(self.server.connector(**kwargs), workers=workers)
+        self.addCleanup(ascope.close)
+        return ascope
+
+
+    def test_get(self):
+        ascope = self.ascope()
+        results = []
+        pending = ascope.Track.get(2, callback=results.append)
+        track = pending.get(5)
+        assert isinstance(track, soundcloud.Track)
+        assert track.title == "2"
+        assert results == [track]
+
+
+    def test_requests_are_bounded_by_the_connection_pool(self):
+        ascope = self.ascope()
+        for pending in [ascope.Track.get(id) for id in xrange(1, 9)]:
+            pending.get(5)
+        assert self.max_in_flight == 4
+
+
+    def test_a_larger_pool_lets_all_workers_send(self):
+        ascope = self.ascope(pool=ConnectionPool(max_per_host=8))
+        for pending in [ascope.Track.get(id) for id in xrange(1, 9)]:
+            pending.get(5)
+        # all eight usually overlap, but a slow worker may start late
+        assert self.max_in_flight > 4
+
+
+    def test_collect(self):
+        ascope = self.ascope()
+        tracks = ascope.tracks.collect().get(5)
+        assert [track.id for track in tracks] == range(1, 121)
+        offsets = sorted(request.query.get("offset", ["0"])[0] for request in self.server.requests)
+        assert offsets == ["0", "100", "50"]
+
+
+    def test_collect_with_limit(self):
+        ascope = self.ascope()
+        tracks = ascope.tracks.collect(limit=60).get(5)
+        assert [track.id for track in tracks] == range(1, 61)
+
+
+    def test_collect_a_single_resource(self):
+        ascope = self.ascope()
+        result = ascope.me.collect().get(5)
+        assert len(result) == 1
+        assert isinstance(result[0], soundcloud.User)
+        assert result[0].username == "stub"
@@ -0,0 +1,127 @@
+import threading
+import time
+import urllib2
+import urlparse
+from StringIO import StringIO
+
+import soundcloud
+from soundcloud.tests.stub_server import StubServerTestCase
+
+
+COUNT = 12
+
+
+class BulkCreateTests(StubServerTestCase):
+    """
+    Track.new_many: how many creates run at once, how the items are taken
+    from the input, per-item errors and the bandwidth limit of uploads.
+    Every create takes 50ms on the server.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+        def create(request):
+            form = urlparse.parse_qs(request.body)
+            title = form.get("track[title]", ["upload"])[0]
+            if title == "fail":
+                return 500, {}, ""
+            self.lock.acquire()
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.lock.release()
+            time.sleep(0.05)
+            self.lock.acquire()
+            self.running -= 1
+            self.lock.release()
+            id = int(title) if title.isdigit() else 0
+            return 303, {"Location" : "http://%s/tracks/%i" % (self.server.host, id)}, ""
+
+        self.server.route("POST", "/tracks", body=create)
+        for id in xrange(COUNT):
+            self.server.route("GET", "/tracks/%i" % id, body={"id" : id, "kind" : "track", "title" : str(id)})
+        self.sca = self.scope()
+
+
+    def test_new_many(self):
+        results = list(self.sca.Track.new_many((dict(title=str(i)) for i in xrange(COUNT)), workers=4))
+        assert sorted(result.index for result in results) == range(COUNT)
+        assert all(result.ok and result.resource.title == result.data["title"] for result in results)
+        assert self.max_running == 4
+
+
+    def test_input_is_consumed_lazily(self):
+        taken = []
+        def items():
+            for i in xrange(COUNT):
+                taken.append(i)
+                yield dict(title=str(i))
+        results = self.sca.Track.new_many(items(), workers=2)
+        results.next()
+        assert len(taken) <= 3
+        results.close()
+
+
+    def test_errors_are_per_item(self):
+        titles = ["1", "fail", "2"]
+        results = sorted(self.sca.Track.new_many(dict(title=title) for title in titles), key=lambda r: r.index)
+        assert [result.ok for result in results] == [True, False, True]
+        assert isinstance(results[1].error, urllib2.HTTPError)
+
+
+    def test_bandwidth(self):
+        size = 8 * 1024
+        items = [dict(title="upload", asset_data=StringIO("\0" * size)) for _ in xrange(4)]
+        start = time.time()
+        results = list(self.sca.Track.new_many(items, workers=4, bandwidth=2 * size))
+        # the first two files are within the initial burst
+        assert time.time() - start >= 0.9
+        assert all(result.ok for result in results)
+
+
+class BulkFetchTests(StubServerTestCase):
+    """
+    Track.get_many: the batches of ids it requests, and the order of the
+    resources it returns. The server knows the tracks 1 to 120, and returns
+    those of a batch in reverse order.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+
+        def tracks(request):
+            ids = [int(id) for id in request.query["ids"][0].split(",")]
+            assert int(request.query["limit"][0]) == len(ids)
+            return 200, {}, [{"id" : id, "kind" : "track", "title" : str(id)}
+                             for id in reversed(ids) if 1 <= id <= 120]
+
+        self.server.route("GET", "/tracks", body=tracks)
+        self.sca = self.scope()
+
+
+    def batches(self):
+        return [request.query["ids"][0].split(",") for request in self.server.requests]
+
+
+    def test_batches(self):
+        tracks = self.sca.Track.get_many(xrange(1, 121))
+        assert [track.id for track in tracks] == range(1, 121)
+        batches = sorted(self.batches(), key=lambda batch: int(batch[0]))
+        assert [len(batch) for batch in batches] == [soundcloud.Track.IDS_BATCH_SIZE] * 2 + [20]
+        assert sum(batches, []) == [str(id) for id in xrange(1, 121)]
+
+
+    def test_order_duplicates_and_missing_ids(self):
+        tracks = self.sca.Track.get_many([5, "3", 500, 5, 0, 3])
+        assert [track and track.id for track in tracks] == [5, 3, None, 5, None, 3]
+        assert tracks[0] is tracks[3]
+        # each id is requested once
+        assert self.batches() == [["5", "3", "500", "0"]]
+
+
+    def test_no_ids(self):
+        assert self.sca.Track.get_many([]) == []
+        assert self.server.requests == []
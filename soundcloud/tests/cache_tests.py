@@ -0,0 +1,280 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import soundcloud
+from soundcloud import jsonbackend
+from soundcloud.cache import (
+    CacheEntry,
+    DiskResourceCache,
+    ResponseCache,
+    )
+from soundcloud.tests.stub_server import (
+    StubServer,
+    StubServerTestCase,
+    )
+
+
+TRACK = {"id" : 2, "kind" : "track", "title" : "stub", "user" : {"id" : 3, "kind" : "user"}}
+
+
+def fill(path, offset):
+    cache = DiskResourceCache(path)
+    for id in xrange(offset, offset + 50):
+        cache.set("namespace", "tracks", {"id" : id})
+
+
+class ResponseCacheTests(StubServerTestCase):
+    """
+    ResponseCache: GETs revalidated with their ETag, entries of different
+    users kept apart, writes dropping what they touch, expiry and the
+    least recently used entries making room.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+
+        def resource(data):
+            # the ETag depends on the user, as the content may
+            def respond(request):
+                etag = '"%s-%s"' % (request.path, request.query["oauth_token"][0])
+                if request.headers.get("If-None-Match") == etag:
+                    return 304, {}, ""
+                return 200, {"ETag" : etag}, data
+            return respond
+
+        self.server.route("GET", "/me", body=resource({"id" : 3, "kind" : "user"}))
+        self.server.route("GET", "/tracks/2", body=resource(TRACK))
+        self.server.route("GET", "/tracks", body=resource([TRACK]))
+        self.server.route("GET", "/tracks/2/comments", body=resource([]))
+        self.server.route("PUT", "/tracks/2", body=TRACK)
+        self.cache = ResponseCache()
+
+
+    def scope(self, access_token=StubServer.ACCESS_TOKEN):
+        authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/",
+                                                       access_token)
+        return soundcloud.Scope(soundcloud.ApiConnector(authenticator, host=self.server.host, scheme="http",
+                                                        cache=self.cache))
+
+
+    def statuses(self):
+        return [(request.method, request.path, request.headers.get("If-None-Match") is not None)
+                for request in self.server.requests]
+
+
+    def test_revalidation(self):
+        sca = self.scope()
+        sca.Track.get(2)
+        track = sca.Track.get(2)
+        assert track.title == "stub" and track.user.id == 3
+        # the second request is conditional, and answered with a 304
+        assert self.statuses() == [("GET", "/tracks/2", False), ("GET", "/tracks/2", True)]
+        assert len(self.cache) == 1
+
+
+    def test_users_dont_share_entries(self):
+        self.scope().Track.get(2)
+        self.scope("other-token").Track.get(2)
+        assert self.statuses() == [("GET", "/tracks/2", False), ("GET", "/tracks/2", False)]
+        assert len(self.cache) == 2
+        assert self.cache.key("/tracks/2", {}, "a") != self.cache.key("/tracks/2", {}, "b")
+
+
+    def test_writes_invalidate(self):
+        sca = self.scope()
+        sca.me()
+        track = sca.Track.get(2)
+        list(sca.tracks())
+        list(track.comments())
+        assert len(self.cache) == 4
+        track.title = "changed"
+        del self.server.requests[:]
+        sca.me()
+        sca.Track.get(2)
+        list(sca.tracks())
+        list(track.comments())
+        # the track, the collection it's part of and what's below it are
+        # fetched again, only the user is revalidated
+        assert self.statuses() == [
+            ("GET", "/me", True),
+            ("GET", "/tracks/2", False),
+            ("GET", "/tracks", False),
+            ("GET", "/tracks/2/comments", False),
+            ]
+
+
+    def test_expiry(self):
+        cache = ResponseCache(ttl=0.1)
+        cache.set("key", CacheEntry("/tracks/2", TRACK, "tracks/2", etag='"1"'))
+        assert cache.get("key") is not None
+        time.sleep(0.2)
+        assert cache.get("key") is None
+
+
+    def test_max_entries(self):
+        cache = ResponseCache(max_entries=2)
+        for key in ("a", "b"):
+            cache.set(key, CacheEntry("/" + key, {}, key))
+        # using an entry keeps it
+        cache.get("a")
+        cache.set("c", CacheEntry("/c", {}, "c"))
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+
+
+class DiskResourceCacheTests(StubServerTestCase):
+    """
+    DiskResourceCache: resources that survive a new connector or come from
+    collections, expiry, invalidation by writes, eviction, sharing the
+    database between processes, the JSON-backends resources are stored
+    with, and the fallback to the API while the database is locked.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks/2", body=TRACK)
+        self.server.route("PUT", "/tracks/2", body=TRACK)
+        self.server.route("GET", "/tracks", body=[dict(TRACK, id=id) for id in (4, 5)])
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "resources.db")
+
+
+    def tearDown(self):
+        StubServerTestCase.tearDown(self)
+        shutil.rmtree(self.directory)
+
+
+    def scope(self, **kwargs):
+        return StubServerTestCase.scope(self, resource_cache=DiskResourceCache(self.path, **kwargs))
+
+
+    def test_warm_start(self):
+        self.scope().Track.get(2)
+        # a new connector, as after a restart
+        track = self.scope().Track.get(2)
+        assert len(self.server.requests) == 1
+        assert track.title == "stub" and track.user.id == 3
+
+
+    def test_collection_items_are_cached(self):
+        sca = self.scope()
+        list(sca.tracks())
+        assert sca.Track.get(5).id == 5
+        assert len(self.server.requests) == 1
+
+
+    def test_expiry(self):
+        sca = self.scope(ttl=0)
+        sca.Track.get(2)
+        sca.Track.get(2)
+        assert len(self.server.requests) == 2
+
+
+    def test_writes_invalidate(self):
+        sca = self.scope()
+        track = sca.Track.get(2)
+        track.title = "changed"
+        sca.Track.get(2)
+        assert [request.method for request in self.server.requests] == ["GET", "PUT", "GET"]
+
+
+    def test_eviction(self):
+        cache = DiskResourceCache(self.path, max_entries=3)
+        for id in xrange(5):
+            cache.set("namespace", "tracks", {"id" : id})
+        cache.evict()
+        assert len(cache) == 3
+        assert cache.get("namespace", "tracks", 0) is None
+        assert cache.get("namespace", "tracks", 4) == {"id" : 4}
+
+
+    def test_several_processes(self):
+        processes = [multiprocessing.Process(target=fill, args=(self.path, offset)) for offset in xrange(0, 200, 50)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        assert len(DiskResourceCache(self.path)) == 200
+
+
+    def test_json_backends(self):
+        track = dict(TRACK, title=u"caf\xe9")
+        for backend in jsonbackend.available():
+            cache = DiskResourceCache(self.path, json_backend=backend.name)
+            cache.set("namespace", "tracks", track)
+            assert cache.get("namespace", "tracks", 2) == track, backend
+
+
+    def test_non_ascii_data(self):
+        # the bundled backend decodes plain strings as UTF-8 byte strings
+        self.server.route("GET", "/tracks/2", body=dict(TRACK, title=u"caf\xe9 \U0001f600"))
+        cache = DiskResourceCache(self.path, json_backend="soundcloud")
+        for title in ("caf\xc3\xa9", u"caf\xe9"):
+            cache.set("namespace", "tracks", dict(TRACK, title=title))
+            assert cache.get("namespace", "tracks", 2)["title"] == u"caf\xe9"
+        sca = StubServerTestCase.scope(self, json_backend="soundcloud", resource_cache=cache)
+        assert sca.Track.get(2).title == u"caf\xe9 \U0001f600"
+        assert sca.Track.get(2).title == u"caf\xe9 \U0001f600"
+        assert len(self.server.requests) == 1
+
+
+    def lock(self):
+        """
+        Hold the write-lock of the database from another connection.
+        """
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute("BEGIN IMMEDIATE")
+        self.addCleanup(connection.close)
+        return connection
+
+
+    def test_locked_database(self):
+        sca = self.scope(timeout=0.1)
+        connection = self.lock()
+        # the resource can't be stored, so it's fetched again
+        assert sca.Track.get(2).title == "stub"
+        assert sca.Track.get(2).title == "stub"
+        assert len(self.server.requests) == 2
+        connection.execute("ROLLBACK")
+        sca.Track.get(2)
+        sca.Track.get(2)
+        assert len(self.server.requests) == 3
+
+
+    def test_unreadable_database(self):
+        sca = self.scope()
+        sca.Track.get(2)
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute("DROP TABLE resources")
+        connection.close()
+        assert sca.Track.get(2).title == "stub"
+        assert len(self.server.requests) == 2
+
+
+    def test_other_database_errors(self):
+        cache = DiskResourceCache(self.path)
+        sca = StubServerTestCase.scope(self, resource_cache=cache)
+        sca.Track.get(2)
+        # fails with a ProgrammingError
+        cache._connection().close()
+        track = sca.Track.get(2)
+        track.title = "changed"
+        assert [request.method for request in self.server.requests] == ["GET", "GET", "PUT"]
+
+
+    def test_failed_invalidation(self):
+        sca = self.scope(timeout=0.1)
+        track = sca.Track.get(2)
+        connection = self.lock()
+        track.title = "changed"
+        connection.execute("ROLLBACK")
+        # the stored copy is outdated, and not used anymore
+        sca.Track.get(2)
+        sca.Track.get(2)
+        assert [request.method for request in self.server.requests] == ["GET", "PUT", "GET"]
@@ -0,0 +1,237 @@
+from StringIO import StringIO
+from unittest import TestCase
+
+import simplejson
+
+import soundcloud
+from soundcloud.jsonstream import CollectionStream
+from soundcloud.tests.stub_server import StubServerTestCase, collection, truncate
+
+
+TRACKS = [{"id" : id, "kind" : "track", "title" : str(id)} for id in xrange(1, 121)]
+
+
+class PaginationTests(StubServerTestCase):
+    """
+    The pages of a collection, walked by offset or by following the
+    next_partition_href, with each page read at once or streamed.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks", body=collection(TRACKS))
+
+
+    def offsets(self):
+        return [int(request.query.get("offset", request.query.get("cursor", ["0"]))[0])
+                for request in self.server.requests]
+
+
+    def test_offset_pages(self):
+        for stream in (False, True):
+            del self.server.requests[:]
+            sca = self.scope(stream_collections=stream)
+            assert [track.id for track in sca.tracks()] == range(1, 121)
+            assert self.offsets() == [0, 50, 100]
+
+
+    def test_last_page_is_full(self):
+        self.server.route("GET", "/tracks", body=collection(TRACKS[:100]))
+        sca = self.scope(stream_collections=True)
+        assert [track.id for track in sca.tracks()] == range(1, 101)
+        # only an empty page tells there is no more
+        assert self.offsets() == [0, 50, 100]
+
+
+    def test_linked_pages(self):
+        for stream in (False, True):
+            del self.server.requests[:]
+            sca = self.scope(stream_collections=stream)
+            tracks = sca.tracks(params={"linked_partitioning" : "1"})
+            assert [track.id for track in tracks] == range(1, 121)
+            assert self.offsets() == [0, 50, 100]
+
+
+    def test_many_pages(self):
+        # enough pages to exceed the recursion limit if each page nested
+        # another generator
+        tracks = [{"id" : id, "kind" : "track"} for id in xrange(1200 * soundcloud.ApiConnector.LIST_LIMIT)]
+        self.server.route("GET", "/tracks", body=collection(tracks))
+        sca = self.scope(stream_collections=True)
+        assert sum(1 for track in sca.tracks()) == len(tracks)
+
+
+    def test_prefetch(self):
+        for stream in (False, True):
+            sca = self.scope(stream_collections=stream)
+            assert [track.id for track in sca.tracks().prefetch(3)] == range(1, 121)
+            tracks = sca.tracks(params={"linked_partitioning" : "1"})
+            assert [track.id for track in tracks.prefetch(3)] == range(1, 121)
+
+
+class CollectionStreamTests(TestCase):
+    """
+    CollectionStream: the items of a list or of an object's collection,
+    decoded one at a time, and the rest of the document.
+    """
+
+    def stream(self, value, chunk_size):
+        return CollectionStream(StringIO(simplejson.dumps(value, indent=1)), chunk_size=chunk_size)
+
+
+    def test_list(self):
+        for chunk_size in xrange(1, 40):
+            stream = self.stream(TRACKS[:5], chunk_size)
+            assert stream.start()
+            assert list(stream.items()) == TRACKS[:5], chunk_size
+
+
+    def test_object(self):
+        document = {"before" : {"a" : [1, 2]}, "collection" : TRACKS[:5], "next_partition_href" : "http://x/?a=1"}
+        for chunk_size in xrange(1, 40):
+            stream = self.stream(document, chunk_size)
+            assert stream.start()
+            assert list(stream.items()) == TRACKS[:5], chunk_size
+            assert stream.document == {"before" : {"a" : [1, 2]}, "next_partition_href" : "http://x/?a=1"}
+
+
+    def test_empty_collections(self):
+        for value in ([], {"collection" : []}):
+            stream = self.stream(value, 3)
+            assert stream.start()
+            assert list(stream.items()) == []
+
+
+    def test_other_documents(self):
+        for value in (TRACKS[0], {"collection" : "none"}, 12, "text", None):
+            stream = self.stream(value, 3)
+            assert not stream.start()
+            assert stream.document == value
+        stream = CollectionStream(StringIO(" "))
+        assert not stream.start()
+        assert stream.document == {}
+
+
+    def test_invalid_documents(self):
+        for document in ('[{"id" : 1} {"id" : 2}]', '{"collection" : [1, 2}', '[1, 2'):
+            stream = CollectionStream(StringIO(document), chunk_size=4)
+            self.assertRaises(ValueError, lambda: stream.start() and list(stream.items()))
+
+
+class StreamedResponseTests(StubServerTestCase):
+    """
+    Responses decoded incrementally: collections mapped as they arrive, and
+    other documents as usual.
+    """
+
+    def test_single_resource(self):
+        self.server.route("GET", "/me", body={"id" : 3, "kind" : "user", "username" : "stub"})
+        me = self.scope(stream_collections=True).me()
+        assert isinstance(me, soundcloud.User)
+        assert me.username == "stub"
+
+
+    def test_items_arrive_before_the_end(self):
+        self.server.route("GET", "/tracks", body=TRACKS[:10])
+        # cut the response in the middle of the sixth item
+        self.server.inject("GET", "/tracks", truncate(len(simplejson.dumps(TRACKS[:5])) + 5))
+        tracks = iter(self.scope(stream_collections=True).tracks())
+        assert [tracks.next().id for _ in xrange(5)] == range(1, 6)
+        self.assertRaises(ValueError, tracks.next)
+
+
+class PartitionCursorTests(StubServerTestCase):
+    """
+    PartitionCursor: parsed from the next_partition_href of a page once,
+    and followed to the next page.
+    """
+
+    def test_parse(self):
+        connector = self.server.connector()
+        cursor = soundcloud.PartitionCursor.parse(
+            u"http://%s/users/3/tracks?linked_partitioning=1&cursor=a%%2Fb&empty=&oauth_token=x" % self.server.host,
+            connector)
+        assert cursor.method == "users/3/tracks"
+        assert cursor.params == {"linked_partitioning" : "1", "cursor" : "a/b", "empty" : ""}
+        assert type(cursor.method) is str
+
+
+    def test_cursor(self):
+        self.server.route("GET", "/tracks", body=collection(TRACKS))
+        for stream in (False, True):
+            page = self.scope(stream_collections=stream).tracks(params={"linked_partitioning" : "1"})
+            list(page.page())
+            cursor = page.NextPartition
+            assert cursor.method == "tracks"
+            assert cursor.params == {"linked_partitioning" : "1", "cursor" : "50"}
+            assert page.NextPartition is cursor
+            next_page = page.GetNextPartition()
+            assert [track.id for track in next_page.page()] == range(51, 101)
+            last_page = next_page.GetNextPartition()
+            assert [track.id for track in last_page.page()] == range(101, 121)
+            assert last_page.NextPartition is None
+            assert last_page.GetNextPartition() is None
+
+
+    def test_escaped_href(self):
+        # JSON-encoders may escape the ampersands of the href
+        href = "http://%s/tracks?linked_partitioning=1\\u0026cursor=50" % self.server.host
+        self.server.route("GET", "/tracks", body='{"collection" : [], "next_partition_href" : "%s"}' % href,
+                          headers={"Content-Type" : "application/json"})
+        for stream in (False, True):
+            page = self.scope(stream_collections=stream).tracks(params={"linked_partitioning" : "1"})
+            list(page.page())
+            assert page.NextPartition.params == {"linked_partitioning" : "1", "cursor" : "50"}
+
+
+class AccessorTests(StubServerTestCase):
+    """
+    The raw, ids, fields and lazy accessors of a collection, walking all its
+    pages without creating a resource per item.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks", body=collection(TRACKS))
+
+
+    def collections(self):
+        for stream in (False, True):
+            sca = self.scope(stream_collections=stream)
+            yield sca.tracks()
+            yield sca.tracks(params={"linked_partitioning" : "1"})
+
+
+    def test_raw(self):
+        for tracks in self.collections():
+            assert list(tracks.raw()) == TRACKS
+
+
+    def test_ids(self):
+        for tracks in self.collections():
+            assert list(tracks.ids()) == range(1, 121)
+
+
+    def test_fields(self):
+        for tracks in self.collections():
+            fields = list(tracks.fields("id", "title", "missing"))
+            assert fields == [(id, str(id), None) for id in xrange(1, 121)]
+
+
+    def test_lazy(self):
+        for tracks in self.collections():
+            lazy = tracks.lazy()
+            assert len(lazy) == 120
+            assert isinstance(lazy[0], soundcloud.Track)
+            assert lazy[119].title == "120"
+            assert [track.id for track in lazy[50:52]] == [51, 52]
+            assert lazy.ids() == range(1, 121)
+            assert lazy.fields("title")[:2] == [("1",), ("2",)]
+            assert lazy.raw() == TRACKS
+
+
+    def test_accessors_start_at_the_first_page(self):
+        sca = self.scope()
+        tracks = sca.tracks()
+        assert [tracks.next().id for _ in xrange(60)] == range(1, 61)
+        assert list(tracks.ids()) == range(1, 121)
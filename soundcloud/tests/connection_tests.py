@@ -0,0 +1,73 @@
+import threading
+import time
+import urllib2
+
+from soundcloud.connection import (
+    ConnectionPool,
+    PoolTimeoutError,
+    )
+from soundcloud.tests.stub_server import (
+    StubServerTestCase,
+    close,
+    delay,
+    )
+
+
+ME = {"id" : 1, "kind" : "user", "username" : "stub"}
+
+
+class ConnectionPoolTests(StubServerTestCase):
+    """
+    The kept-alive connections of a ConnectionPool: when a request that
+    failed on one is sent again, and how long a request waits for a
+    connection to become free. There is no RetryPolicy, so every request
+    the server gets beyond the first one was sent by the pool.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/me", body=ME)
+        location = {"Location" : "http://%s/me" % self.server.host}
+        self.server.route("POST", "/tracks", status=303, headers=location)
+        self.pool = ConnectionPool(timeout=0.2)
+        self.sca = self.scope(pool=self.pool)
+        # the connection the requests of the tests reuse
+        self.sca.me()
+        del self.server.requests[:]
+
+
+    def requests(self, method):
+        return [request for request in self.server.requests if request.method == method]
+
+
+    def test_closed_connection_is_replayed(self):
+        self.server.inject("GET", "/me", close())
+        assert self.sca.me().username == "stub"
+        assert len(self.requests("GET")) == 2
+
+
+    def test_post_is_not_replayed(self):
+        self.server.inject("POST", "/tracks", close())
+        self.assertRaises(urllib2.URLError, self.sca.Track.new, title="stub")
+        assert len(self.requests("POST")) == 1
+
+
+    def test_timeout_is_not_replayed(self):
+        for method, call in (("GET", self.sca.me), ("POST", lambda: self.sca.Track.new(title="stub"))):
+            self.server.inject(method, {"GET" : "/me", "POST" : "/tracks"}[method], delay(0.5))
+            self.assertRaises(urllib2.URLError, call)
+            time.sleep(0.5)
+            assert len(self.requests(method)) == 1, method
+
+
+    def test_acquire_is_bounded(self):
+        pool = ConnectionPool(max_per_host=1, acquire_timeout=0.2)
+        conn, _ = pool.acquire("http", self.server.host)
+        started = time.time()
+        self.assertRaises(PoolTimeoutError, pool.acquire, "http", self.server.host)
+        assert 0.2 <= time.time() - started < 1
+        # waiting ends when a connection is released in time
+        threading.Timer(0.1, pool.release, (conn, "http", self.server.host)).start()
+        started = time.time()
+        pool.acquire("http", self.server.host)
+        assert time.time() - started < 0.2
@@ -0,0 +1,127 @@
+import httplib
+import os
+import shutil
+import tempfile
+
+import soundcloud
+from soundcloud.tests.stub_server import StubServerTestCase, truncate
+
+
+DATA = "".join(chr(i % 251) for i in xrange(10000))
+
+
+class TrackDownloadTests(StubServerTestCase):
+    """
+    Track.download: Range-requests resuming a partial file or an interrupted
+    transfer, and the errors raised if the file can't be completed.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks/1/download", body=self.ranged(DATA))
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "track.mp3")
+        self.track = soundcloud.Track({
+            "id" : 1,
+            "kind" : "track",
+            "sharing" : "public",
+            "downloadable" : True,
+            "download_url" : "http://%s/tracks/1/download" % self.server.host,
+            }, self.scope())
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        StubServerTestCase.tearDown(self)
+
+
+    def ranged(self, data, shift=0):
+        """
+        A route body serving data, or the part of it a Range-header asks for.
+
+        @param shift: moves the start of partial content, to simulate a
+                server resuming at the wrong byte
+        """
+        def respond(request):
+            value = request.headers.get("Range")
+            if value is None:
+                return 200, {}, data
+            start = int(value[len("bytes="):].rstrip("-")) + shift
+            if start >= len(data):
+                return 416, {}, ""
+            headers = {"Content-Range" : "bytes %i-%i/%i" % (start, len(data) - 1, len(data))}
+            return 206, headers, data[start:]
+        return respond
+
+
+    def ranges(self):
+        return [request.headers.get("Range") for request in self.server.requests]
+
+
+    def content(self):
+        fd = open(self.path, "rb")
+        try:
+            return fd.read()
+        finally:
+            fd.close()
+
+
+    def test_download(self):
+        progress = []
+        size = self.track.download(self.path, chunk_size=4096,
+                                   progress=lambda done, total: progress.append((done, total)))
+        assert size == len(DATA)
+        assert self.content() == DATA
+        assert progress == [(4096, 10000), (8192, 10000), (10000, 10000)]
+        assert self.ranges() == [None]
+
+
+    def test_partial_file_is_resumed(self):
+        fd = open(self.path, "wb")
+        fd.write(DATA[:3000])
+        fd.close()
+        assert self.track.download(self.path) == len(DATA)
+        assert self.content() == DATA
+        assert self.ranges() == ["bytes=3000-"]
+
+
+    def test_complete_file_is_left_alone(self):
+        fd = open(self.path, "wb")
+        fd.write(DATA)
+        fd.close()
+        assert self.track.download(self.path) == len(DATA)
+        assert self.content() == DATA
+
+
+    def test_server_without_ranges_starts_over(self):
+        self.server.route("GET", "/tracks/1/download", body=DATA)
+        fd = open(self.path, "wb")
+        fd.write("garbage")
+        fd.close()
+        assert self.track.download(self.path) == len(DATA)
+        assert self.content() == DATA
+
+
+    def test_truncated_transfer_is_resumed(self):
+        self.server.inject("GET", "/tracks/1/download", truncate(4000))
+        assert self.track.download(self.path, chunk_size=1024) == len(DATA)
+        assert self.content() == DATA
+        assert self.ranges() == [None, "bytes=4000-"]
+
+
+    def test_truncated_transfer_without_retries(self):
+        self.server.inject("GET", "/tracks/1/download", truncate(4000))
+        self.assertRaises(httplib.IncompleteRead, self.track.download, self.path, retries=0)
+        # what arrived is kept, for a later call to resume
+        assert self.content() == DATA[:4000]
+        assert self.track.download(self.path) == len(DATA)
+        assert self.content() == DATA
+
+
+    def test_resumed_at_the_wrong_byte(self):
+        self.server.route("GET", "/tracks/1/download", body=self.ranged(DATA, shift=100))
+        fd = open(self.path, "wb")
+        fd.write(DATA[:3000])
+        fd.close()
+        self.assertRaises(soundcloud.DownloadIncomplete, self.track.download, self.path)
+        assert self.content() == DATA[:3000]
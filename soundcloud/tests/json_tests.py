@@ -0,0 +1,54 @@
+from StringIO import StringIO
+from unittest import TestCase
+
+from soundcloud import json
+
+
+DOCUMENT = ' /* a comment */ {"id" : 12, "duration" : -1.5e3, "title" : "a \\"title\\"\\n", "user" : ' \
+           '{"username" : "caf\\u00e9 \\ud83d\\ude00"}, "tags" : ["a", "b/c"], "streamable" : true, ' \
+           '"genre" : null, "empty" : [{}, []]} // the end'
+
+VALUE = {"id" : 12, "duration" : -1500.0, "title" : 'a "title"\n', "user" : {"username" : u"caf\xe9 \U0001f600"},
+         "tags" : ["a", "b/c"], "streamable" : True, "genre" : None, "empty" : [{}, []]}
+
+
+class JsonTests(TestCase):
+    """
+    The bundled JSON reader and writer.
+    """
+
+    def test_read(self):
+        assert json.read(DOCUMENT) == VALUE
+        assert type(json.read('"plain"')) is str
+
+
+    def test_load_in_chunks(self):
+        # every token is cut in two by some chunk size
+        for chunk_size in xrange(1, 20):
+            assert json.load(StringIO(DOCUMENT), chunk_size) == VALUE, chunk_size
+
+
+    def test_write(self):
+        assert json.read(json.write(VALUE)) == VALUE
+        assert json.write(["a/b", "\x01"], escaped_forward_slash=True) == '["a\\/b","\\u0001"]'
+        f = StringIO()
+        json.dump(VALUE, f)
+        assert json.read(f.getvalue().decode("utf-8")) == VALUE
+
+
+    def test_dump_mixed_strings(self):
+        # unicode next to UTF-8 encoded strings, in one buffer and across flushes
+        value = {"unicode" : u"caf\xe9 \U0001f600", "utf-8" : "caf\xc3\xa9",
+                 "many" : [u"\xe9", "\xc3\xa9"] * 1000}
+        f = StringIO()
+        json.dump(value, f)
+        assert json.read(f.getvalue().decode("utf-8")) == {
+            "unicode" : u"caf\xe9 \U0001f600", "utf-8" : u"caf\xe9", "many" : [u"\xe9"] * 2000}
+
+
+    def test_invalid_documents(self):
+        for document in ('', ' ', '[1,', '[1 2]', '{"a" 1}', '{1 : 2}', '"\\x"', 'tru', '1 2', '/* open'):
+            self.assertRaises(json.ReadException, json.read, document)
+            self.assertRaises(json.ReadException, json.load, StringIO(document), 1)
+        self.assertRaises(json.WriteException, json.write, object())
+        self.assertRaises(json.WriteException, json.write, float("nan"))
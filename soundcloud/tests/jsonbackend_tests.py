@@ -0,0 +1,41 @@
+from soundcloud import jsonbackend
+from soundcloud.tests.stub_server import StubServerTestCase
+
+
+TRACK = {"id" : 2, "kind" : "track", "title" : u"stub \u2603", "user" : {"id" : 3, "kind" : "user"}}
+
+
+class JsonBackendTests(StubServerTestCase):
+    """
+    The JSON-backends: each installed one decodes resources and streamed
+    collections alike, the fastest is selected by default, and unknown
+    names are refused.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks/2", body=TRACK)
+        self.server.route("GET", "/tracks", body={"collection" : [TRACK, TRACK]})
+
+
+    def test_backends(self):
+        backends = jsonbackend.available()
+        # the bundled one is always there
+        assert backends[-1].name == "soundcloud"
+        for backend in backends:
+            sca = self.scope(json_backend=backend.name, stream_collections=True)
+            track = sca.Track.get(2)
+            assert track.title == TRACK["title"], backend
+            assert track.user.id == 3, backend
+            assert [item.id for item in sca.tracks()] == [2, 2], backend
+
+
+    def test_selection(self):
+        selected = jsonbackend.get()
+        assert selected is jsonbackend.get()
+        assert selected.accelerated or not [backend for backend in jsonbackend.available() if backend.accelerated]
+        assert self.server.connector().json_backend is selected
+
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, jsonbackend.get, "yaml")
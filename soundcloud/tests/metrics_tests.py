@@ -0,0 +1,74 @@
+import urllib2
+from StringIO import StringIO
+
+from soundcloud.metrics import (
+    Histogram,
+    MetricsAggregator,
+    )
+from soundcloud.tests.stub_server import (
+    StubServerTestCase,
+    status,
+    )
+
+
+TRACK = {"id" : 2, "kind" : "track", "title" : "stub"}
+
+
+class MetricsTests(StubServerTestCase):
+    """
+    What a MetricsAggregator makes of the request events: counts, statuses,
+    bytes, timings, redirects and errors per endpoint, and its histograms.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks/2", body=TRACK)
+        self.server.route("POST", "/tracks", status=303, headers={"Location" : "http://%s/tracks/2" % self.server.host})
+        self.metrics = MetricsAggregator()
+        self.sca = self.scope(metrics=self.metrics)
+
+
+    def test_get(self):
+        self.sca.Track.get(2)
+        self.sca.Track.get(2)
+        metrics = self.metrics.snapshot()[("GET", "/tracks/{id}")]
+        assert metrics["requests"] == 2
+        assert metrics["statuses"] == {200 : 2}
+        assert metrics["bytes_in"] > 0
+        # the second request reuses the connection
+        assert metrics["connect"]["count"] == 1
+        for timing in ("ttfb", "download", "decode", "map", "total"):
+            assert metrics[timing]["count"] == 2, timing
+
+
+    def test_redirect(self):
+        self.sca.Track.new(title="stub")
+        metrics = self.metrics.snapshot()[("POST", "/tracks/")]
+        assert metrics["redirects"] == 1
+        assert metrics["statuses"] == {200 : 1}
+        assert metrics["bytes_out"] > 0
+
+
+    def test_upload(self):
+        self.sca.Track.new(title="stub", asset_data=StringIO("x" * 100000))
+        metrics = self.metrics.snapshot()[("POST", "/tracks/")]
+        assert 100000 < metrics["bytes_out"] < 101000
+
+
+    def test_error(self):
+        self.server.inject("GET", "/tracks/2", status(500))
+        self.assertRaises(urllib2.HTTPError, self.sca.Track.get, 2)
+        metrics = self.metrics.snapshot()[("GET", "/tracks/{id}")]
+        assert metrics["errors"] == 1
+        assert metrics["statuses"] == {500 : 1}
+
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for value in (0.0001, 0.002, 0.003, 0.2, 100):
+            histogram.add(value)
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 5
+        assert snapshot["min"] == 0.0001 and snapshot["max"] == 100
+        assert snapshot["p50"] == 0.005
+        assert snapshot["p99"] == 100
@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import urllib2
+from StringIO import StringIO
+from unittest import TestCase
+
+from soundcloud.MultipartPostHandler import MultipartBody
+from soundcloud.retry import RetryPolicy
+from soundcloud.tests.stub_server import StubServerTestCase, status
+
+
+DATA = "".join(chr(i % 251) for i in xrange(200000))
+
+
+class UnseekableFile(object):
+    """
+    A file that can tell its size, but can't be read again.
+    """
+
+    def __init__(self, path):
+        self._fd = open(path, "rb")
+        self.name = path
+
+    def fileno(self):
+        return self._fd.fileno()
+
+    def read(self, size=-1):
+        return self._fd.read(size)
+
+    def seek(self, offset, whence=0):
+        raise IOError("not seekable")
+
+
+class MultipartBodyTests(TestCase):
+    """
+    MultipartBody: its length, known before the files are read, reading it
+    in chunks, and reading it again after a rewind.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "asset.wav")
+        fd = open(self.path, "wb")
+        fd.write(DATA)
+        fd.close()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def read(self, body):
+        chunks = []
+        while True:
+            chunk = body.read(100000)
+            if not chunk:
+                return chunks
+            assert len(chunk) <= MultipartBody.CHUNK_SIZE
+            chunks.append(chunk)
+
+
+    def test_length(self):
+        fd = open(self.path, "rb")
+        try:
+            body = MultipartBody([("track[title]", u"caf\xe9")], [("track[asset_data]", fd)], "BOUNDARY")
+            content = "".join(self.read(body))
+        finally:
+            fd.close()
+        assert len(body) == len(content)
+        assert content.startswith('--BOUNDARY\r\nContent-Disposition: form-data; name="track[title]"\r\n\r\ncaf\xc3\xa9\r\n')
+        assert 'filename="asset.wav"\r\nContent-Type: audio/x-wav\r\n\r\n' + DATA + '\r\n' in content
+        assert content.endswith("--BOUNDARY--\r\n\r\n")
+
+
+    def test_file_like_objects(self):
+        body = MultipartBody([], [("track[asset_data]", StringIO(DATA))], "BOUNDARY")
+        content = "".join(self.read(body))
+        assert len(body) == len(content)
+        assert DATA in content
+
+
+    def test_rewind(self):
+        fd = open(self.path, "rb")
+        try:
+            body = MultipartBody([("track[title]", "title")], [("track[asset_data]", fd)])
+            content = "".join(self.read(body))
+            assert body.read() == ""
+            assert body.rewind()
+            assert "".join(self.read(body)) == content
+        finally:
+            fd.close()
+
+
+    def test_unseekable_files_cant_be_rewound(self):
+        fd = UnseekableFile(self.path)
+        body = MultipartBody([], [("track[asset_data]", fd)])
+        assert len(body) == len("".join(self.read(body)))
+        assert not body.rewind()
+
+
+class UploadTests(StubServerTestCase):
+    """
+    Uploads through the API: the Content-Length the server receives, and
+    the body sent once more when the upload is retried.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("POST", "/tracks", status=201, body={"id" : 2, "kind" : "track", "title" : "stub"})
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "asset.wav")
+        fd = open(self.path, "wb")
+        fd.write(DATA)
+        fd.close()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        StubServerTestCase.tearDown(self)
+
+
+    def upload(self, fd, **kwargs):
+        retry = RetryPolicy(idempotent_methods=("POST",), backoff=0.01, jitter=False)
+        sca = self.scope(retry=retry, **kwargs)
+        return sca.Track.new(title="stub", asset_data=fd)
+
+
+    def test_upload(self):
+        fd = open(self.path, "rb")
+        try:
+            track = self.upload(fd)
+        finally:
+            fd.close()
+        assert track.id == 2
+        request, = self.server.requests
+        assert request.headers["Content-Type"].startswith("multipart/form-data; boundary=")
+        assert int(request.headers["Content-Length"]) == len(request.body)
+        assert DATA in request.body
+
+
+    def test_retried_upload_is_sent_again(self):
+        self.server.inject("POST", "/tracks", status(503))
+        fd = open(self.path, "rb")
+        try:
+            assert self.upload(fd).id == 2
+        finally:
+            fd.close()
+        first, second = self.server.requests
+        assert first.body == second.body
+        assert int(second.headers["Content-Length"]) == len(second.body)
+        assert DATA in second.body
+
+
+    def test_unseekable_upload_is_not_retried(self):
+        self.server.inject("POST", "/tracks", status(503))
+        fd = UnseekableFile(self.path)
+        self.assertRaises(urllib2.HTTPError, self.upload, fd)
+        assert len(self.server.requests) == 1
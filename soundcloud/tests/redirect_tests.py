@@ -0,0 +1,42 @@
+import soundcloud
+from soundcloud.tests.stub_server import StubServerTestCase
+
+
+TRACK = {"id" : 2, "kind" : "track", "title" : "stub"}
+
+ME = {"id" : 3, "kind" : "user", "username" : "stub"}
+
+
+class RedirectTests(StubServerTestCase):
+    """
+    SCRedirectHandler: chains of redirects, with the resource mapped
+    according to the location the last See-Other pointed to.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks/2", body=TRACK)
+        self.server.route("GET", "/users/3", body=ME)
+
+
+    def location(self, path):
+        return {"Location" : "http://%s%s" % (self.server.host, path)}
+
+
+    def test_see_other_chain(self):
+        self.server.route("POST", "/tracks", status=303, headers=self.location("/pending/2"))
+        self.server.route("GET", "/pending/2", status=303, headers=self.location("/tracks/2"))
+        track = self.scope().Track.new(title="stub")
+        assert isinstance(track, soundcloud.Track)
+        assert track.title == "stub"
+        assert [(request.method, request.path) for request in self.server.requests] == [
+            ("POST", "/tracks"), ("GET", "/pending/2"), ("GET", "/tracks/2")]
+
+
+    def test_found_then_see_other(self):
+        self.server.route("GET", "/me", status=302, headers=self.location("/moved/me"))
+        self.server.route("GET", "/moved/me", status=303, headers=self.location("/users/3"))
+        me = self.scope().me()
+        assert isinstance(me, soundcloud.User)
+        assert me.username == "stub"
+        assert [request.path for request in self.server.requests] == ["/me", "/moved/me", "/users/3"]
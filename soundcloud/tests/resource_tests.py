@@ -0,0 +1,136 @@
+import urlparse
+
+import soundcloud
+from soundcloud.tests.stub_server import StubServerTestCase
+
+
+USER = {"id" : 3, "kind" : "user", "username" : "stub"}
+
+TRACKS = [
+    {"id" : 1, "kind" : "track", "title" : "one", "user" : USER},
+    {"id" : 2, "kind" : "track", "title" : "two", "user" : USER},
+    ]
+
+
+class NestedResourceTests(StubServerTestCase):
+    """
+    The resources embedded in the data of another one, like the user of a
+    track: created once per resource, or once per connector with an
+    identity-map that doesn't keep them alive.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks", body=TRACKS)
+
+
+    def tracks(self, **kwargs):
+        return list(self.scope(**kwargs).tracks())
+
+
+    def test_nested_resources_are_memoized(self):
+        for tracks in (self.tracks(), self.tracks(compact=True)):
+            track = tracks[0]
+            assert track.user is track.user
+            assert track.user.username == "stub"
+            # but every track has a user of its own
+            assert tracks[1].user is not track.user
+
+
+    def test_compact_keeps_other_keys(self):
+        # as many keys as there are fields, but one of them is missing
+        fields = [name for name in soundcloud.Track.FIELDS if name not in soundcloud.RESTBase.REGISTRY]
+        data = dict.fromkeys(fields)
+        del data["isrc"]
+        data.update(TRACKS[0])
+        assert len(data) == len(fields)
+        track = soundcloud.Track.compact()(data, self.scope())
+        assert track.user.username == "stub"
+        assert track.isrc is None
+
+
+    def test_identity_map(self):
+        for tracks in (self.tracks(identity_map=True), self.tracks(identity_map=True, compact=True)):
+            assert tracks[0].user is tracks[1].user
+            assert tracks[0].user.id == 3
+
+
+    def test_identity_map_holds_no_references(self):
+        connector = self.server.connector(identity_map=True)
+        tracks = list(soundcloud.Scope(connector).tracks())
+        tracks[0].user
+        assert len(connector.identity_map) == 1
+        del tracks
+        assert len(connector.identity_map) == 0
+
+
+class UpdateTests(StubServerTestCase):
+    """
+    update and batch: the PUTs they send for changed properties, and the
+    data of the resource afterwards.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks", body=TRACKS)
+        self.server.route("PUT", "/tracks/1", body=TRACKS[0])
+
+
+    def tracks(self, **kwargs):
+        return list(self.scope(**kwargs).tracks())
+
+
+    def puts(self):
+        return [urlparse.parse_qs(request.body) for request in self.server.requests if request.method == "PUT"]
+
+
+    def test_update(self):
+        for tracks in (self.tracks(), self.tracks(compact=True)):
+            del self.server.requests[:]
+            track = tracks[0]
+            changes = track.update(title="new", description="described", genre="Ambient")
+            assert changes == dict(title="new", description="described", genre="Ambient")
+            assert self.puts() == [{
+                "track[title]" : ["new"],
+                "track[description]" : ["described"],
+                "track[genre]" : ["Ambient"],
+                }]
+            assert (track.title, track.description, track.genre) == ("new", "described", "Ambient")
+            # the unchanged values are left out, and without changes nothing is sent
+            assert track.update(title="new", genre="Drone") == dict(genre="Drone")
+            assert track.update(title="new", genre="Drone") == {}
+            assert len(self.puts()) == 2
+
+
+    def test_update_copies_the_data(self):
+        data = dict(TRACKS[0])
+        track = soundcloud.Track(data, self.scope())
+        track.update(title="new")
+        assert track.title == "new"
+        assert data["title"] == "one"
+
+
+    def test_batch(self):
+        track = self.tracks()[0]
+        with track.batch():
+            track.title = "new"
+            track.title = "newer"
+            track.description = "described"
+            assert track.title == "one"
+            assert self.puts() == []
+        assert self.puts() == [{"track[title]" : ["newer"], "track[description]" : ["described"]}]
+        assert track.title == "newer"
+
+
+    def test_batch_is_dropped_on_errors(self):
+        track = self.tracks()[0]
+        try:
+            with track.batch():
+                track.title = "new"
+                raise ValueError
+        except ValueError:
+            pass
+        assert self.puts() == []
+        assert track.title == "one"
+        track.title = "new"
+        assert len(self.puts()) == 1
@@ -0,0 +1,177 @@
+import os
+import time
+import urllib2
+from cStringIO import StringIO
+
+import soundcloud
+from soundcloud.connection import ConnectionPool
+from soundcloud.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    )
+from soundcloud.tests.stub_server import (
+    StubServerTestCase,
+    delay,
+    reset,
+    status,
+    )
+
+
+ME = {"id" : 1, "kind" : "user", "username" : "stub"}
+
+TRACK = {"id" : 2, "kind" : "track", "title" : "stub"}
+
+
+class FailingOpener(object):
+    """
+    An opener failing every request with an unexpected error.
+    """
+
+    def open(self, req, data=None, timeout=None):
+        raise ValueError("unexpected")
+
+
+class RetryTests(StubServerTestCase):
+    """
+    RetryPolicy: which failures are retried and how often, replaying
+    uploads, the circuit breaker of a host, and the backoff.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/me", body=ME)
+        self.server.route("PUT", "/tracks/2", body=TRACK)
+        self.server.route("POST", "/tracks", status=201, body=TRACK)
+
+
+    def scope(self, pool=None, **kwargs):
+        kwargs.setdefault("backoff", 0)
+        policy = RetryPolicy(**kwargs)
+        return StubServerTestCase.scope(self, pool=pool, retry=policy), policy
+
+
+    def test_server_errors_are_retried(self):
+        sca, policy = self.scope()
+        self.server.inject("GET", "/me", status(503), status(502))
+        assert sca.me().username == "stub"
+        assert len(self.server.requests) == 3
+        assert policy.retries == 2
+
+
+    def test_retries_are_limited(self):
+        sca, policy = self.scope(max_attempts=2)
+        self.server.inject("GET", "/me", status(500), status(500), status(500))
+        try:
+            sca.me()
+        except urllib2.HTTPError, e:
+            assert e.code == 500
+        else:
+            assert False, "expected an HTTPError"
+        assert len(self.server.requests) == 2
+        assert policy.given_up == 1
+
+
+    def test_client_errors_are_not_retried(self):
+        sca, policy = self.scope()
+        self.server.inject("GET", "/me", status(403))
+        self.assertRaises(urllib2.HTTPError, sca.me)
+        assert len(self.server.requests) == 1
+        assert policy.retries == 0
+
+
+    def test_post_is_not_retried(self):
+        sca, policy = self.scope()
+        self.server.inject("POST", "/tracks", status(503))
+        self.assertRaises(urllib2.HTTPError, sca.Track.new, title="stub")
+        assert len(self.server.requests) == 1
+
+
+    def test_connection_reset_is_retried(self):
+        sca, policy = self.scope()
+        self.server.inject("GET", "/me", reset())
+        assert sca.me().username == "stub"
+        assert policy.retries == 1
+
+
+    def test_timeout_is_retried(self):
+        sca, policy = self.scope(pool=ConnectionPool(timeout=0.2))
+        self.server.inject("GET", "/me", delay(0.5))
+        assert sca.me().username == "stub"
+        assert policy.retries == 1
+
+
+    def test_upload_is_replayed(self):
+        sca, policy = self.scope()
+        track = sca.Track.create(id=2)
+        self.server.inject("PUT", "/tracks/2", status(503))
+        track.asset_data = StringIO("x" * 100000)
+        first, second = self.server.requests
+        assert len(first.body) == len(second.body) > 100000
+        assert first.body.count("x" * 100000) == second.body.count("x" * 100000) == 1
+
+
+    def test_unseekable_upload_is_not_retried(self):
+        sca, policy = self.scope()
+        track = sca.Track.create(id=2)
+        self.server.inject("PUT", "/tracks/2", status(503))
+        read_end, write_end = os.pipe()
+        os.write(write_end, "x" * 1000)
+        os.close(write_end)
+        pipe = os.fdopen(read_end)
+        try:
+            try:
+                track.asset_data = pipe
+            except urllib2.HTTPError, e:
+                assert e.code == 503
+            else:
+                assert False, "expected an HTTPError"
+        finally:
+            pipe.close()
+        assert len(self.server.requests) == 1
+        assert policy.refused == 1
+
+
+    def test_circuit_opens_and_recovers(self):
+        sca, policy = self.scope(max_attempts=1, failure_threshold=2, reset_timeout=0.2)
+        self.server.inject("GET", "/me", status(500), status(500))
+        self.assertRaises(urllib2.HTTPError, sca.me)
+        self.assertRaises(urllib2.HTTPError, sca.me)
+        self.assertRaises(CircuitOpenError, sca.me)
+        assert len(self.server.requests) == 2
+        circuits = policy.snapshot()["circuits"]
+        assert circuits[self.server.host][0] == CircuitBreaker.OPEN
+        time.sleep(0.3)
+        assert sca.me().username == "stub"
+        assert policy.breaker(self.server.host).state == CircuitBreaker.CLOSED
+
+
+    def test_unexpected_errors_end_the_probe(self):
+        sca, policy = self.scope(max_attempts=1, failure_threshold=1, reset_timeout=0.1)
+        self.server.inject("GET", "/me", status(500))
+        self.assertRaises(urllib2.HTTPError, sca.me)
+        time.sleep(0.2)
+        # the probing request fails with an error the policy doesn't know
+        connector = sca._get_connector()
+        connector.api_opener = lambda multipart=False: FailingOpener()
+        self.assertRaises(ValueError, sca.me)
+        del connector.api_opener
+        assert sca.me().username == "stub"
+        assert policy.breaker(self.server.host).state == CircuitBreaker.CLOSED
+
+
+    def test_response_without_content_type(self):
+        sca, policy = self.scope(max_attempts=1, failure_threshold=1, reset_timeout=0.1)
+        self.server.inject("GET", "/me", status(500), status(200, body="stub"))
+        self.assertRaises(urllib2.HTTPError, sca.me)
+        time.sleep(0.2)
+        # the host answered, so the probe succeeded
+        self.assertRaises(soundcloud.UnknownContentType, sca.me)
+        assert policy.breaker(self.server.host).state == CircuitBreaker.CLOSED
+
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff=0.5, max_backoff=3, jitter=False)
+        assert [policy.delay(attempt) for attempt in xrange(5)] == [0.5, 1, 2, 3, 3]
+        policy.jitter = True
+        assert all(0 <= policy.delay(2) <= 2 for _ in xrange(100))
@@ -0,0 +1,68 @@
+import threading
+import time
+import urllib2
+
+from soundcloud.singleflight import SingleFlight
+from soundcloud.tests.stub_server import StubServerTestCase
+
+
+class SingleFlightTests(StubServerTestCase):
+    """
+    SingleFlight: concurrent identical GETs share one request and its
+    errors, while GETs one after the other don't. The track takes 300ms
+    on the server.
+    """
+
+    CALLERS = 8
+
+    def setUp(self):
+        def slow_track(request):
+            time.sleep(0.3)
+            return 200, {}, {"id" : 2, "kind" : "track", "title" : "stub"}
+
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/tracks/2", body=slow_track)
+        self.flight = SingleFlight()
+        self.sca = self.scope(single_flight=self.flight)
+
+
+    def call_concurrently(self, func):
+        results = [None] * self.CALLERS
+        def call(index):
+            try:
+                results[index] = func()
+            except Exception, e:
+                results[index] = e
+        threads = [threading.Thread(target=call, args=(index,)) for index in xrange(self.CALLERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+    def test_identical_gets_are_coalesced(self):
+        tracks = self.call_concurrently(lambda: self.sca.Track.get(2))
+        assert len(self.server.requests) == 1
+        assert all(track.title == "stub" for track in tracks)
+        # every caller gets resources of its own
+        assert len(set(id(track) for track in tracks)) == self.CALLERS
+        assert self.flight.coalesced == self.CALLERS - 1
+        assert self.flight.in_flight == 0
+
+
+    def test_errors_are_shared(self):
+        def slow_error(request):
+            time.sleep(0.3)
+            return 500, {}, ""
+        self.server.route("GET", "/tracks/2", body=slow_error)
+        errors = self.call_concurrently(lambda: self.sca.Track.get(2))
+        assert len(self.server.requests) == 1
+        assert all(isinstance(error, urllib2.HTTPError) for error in errors)
+
+
+    def test_sequential_gets_are_not_coalesced(self):
+        self.sca.Track.get(2)
+        self.sca.Track.get(2)
+        assert len(self.server.requests) == 2
+        assert self.flight.coalesced == 0
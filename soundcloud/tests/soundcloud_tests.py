@@ -502,3 +502,47 @@ class soundcloudTests(TestCase):
         
         user = sca.User.get(me.id)
         assert user.description == change_to_description
+
+
+    def test_connection_reuse(self):
+        sca = self.root
+        pool = sca._get_connector().pool
+        sca.me()
+        sca.me()
+        idle = pool._idle[("https", self.API_HOST)]
+        assert len(idle) == 1
+
+
+    def test_prefetching(self):
+        sca = self.root
+        limit = soundcloud.ApiConnector.LIST_LIMIT
+        users = list(itertools.islice(sca.users(), limit * 3))
+        prefetched = list(itertools.islice(sca.users().prefetch(3), limit * 3))
+        assert len(prefetched) == len(users)
+        assert isinstance(prefetched[0], soundcloud.User)
+
+
+    def test_get_many(self):
+        sca = self.root
+        tracks = list(itertools.islice(sca.tracks(), 3))
+        ids = [track.id for track in tracks]
+        fetched = sca.Track.get_many(ids + [0])
+        assert [track.id for track in fetched[:-1]] == ids
+        assert fetched[-1] is None
+
+
+    def test_track_download(self):
+        import tempfile
+        sca = self.root
+        track = sca.tracks(params={
+            "filter" : "downloadable",
+            }).next()
+        dest = tempfile.mktemp()
+        progress = []
+        try:
+            size = track.download(dest, progress=lambda done, total: progress.append(done))
+            assert size == os.path.getsize(dest)
+            assert progress[-1] == size
+        finally:
+            if os.path.exists(dest):
+                os.remove(dest)
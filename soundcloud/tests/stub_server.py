@@ -0,0 +1,344 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+A local stand-in for the SoundCloud API, for tests that must not depend on
+the network or on credentials.
+
+Responses are configured per method and path, and faults can be injected
+in front of them:
+
+>>> with StubServer() as server:
+...     server.route("GET", "/me", body={"id" : 1, "kind" : "user"})
+...     server.inject("GET", "/me", status(503), reset())
+...     sca = soundcloud.Scope(server.connector(retry=RetryPolicy()))
+...     me = sca.me()
+
+Tests derive from L{StubServerTestCase}, which runs a server per test.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import socket
+import struct
+import threading
+import time
+import urlparse
+from unittest import TestCase
+
+import simplejson
+
+import soundcloud
+
+
+class StubRequest(object):
+    """
+    A request the server received.
+    """
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+
+def status(code, headers=None, body=""):
+    """
+    A fault answering with the given status instead of the route's response.
+    """
+    def fault(handler):
+        handler.respond(code, headers or {}, body)
+        return True
+    return fault
+
+
+def reset():
+    """
+    A fault closing the connection without a response, with a TCP-reset.
+    """
+    def fault(handler):
+        handler.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        handler.close_connection = 1
+        return True
+    return fault
+
+
+def close():
+    """
+    A fault closing the connection without a response, the way a server
+    closes a kept-alive connection it considers idle.
+    """
+    def fault(handler):
+        handler.close_connection = 1
+        return True
+    return fault
+
+
+def delay(seconds):
+    """
+    A fault delaying the route's response.
+    """
+    def fault(handler):
+        time.sleep(seconds)
+        return False
+    return fault
+
+
+def truncate(length):
+    """
+    A fault sending the headers of the route's response, but only the first
+    C{length} bytes of its body, and then closing the connection.
+    """
+    def fault(handler):
+        handler.truncate = length
+        return False
+    return fault
+
+
+def collection(items):
+    """
+    A route body serving items as a collection, the way the API does: pages
+    of C{LIST_LIMIT} items selected by the offset parameter, or - if the
+    request asks for linked partitioning - a document with the page as its
+    collection, and a next_partition_href carrying a cursor.
+
+    @type items: list<dict>
+    """
+    def respond(request):
+        query = dict((key, values[0]) for key, values in request.query.iteritems())
+        start = int(query.get("cursor", query.get(soundcloud.ApiConnector.LIST_OFFSET_PARAMETER, 0)))
+        limit = int(query.get(soundcloud.ApiConnector.LIST_LIMIT_PARAMETER, soundcloud.ApiConnector.LIST_LIMIT))
+        page = items[start:start + limit]
+        if "linked_partitioning" not in query:
+            return 200, {}, page
+        document = {"collection" : page}
+        if start + limit < len(items):
+            document["next_partition_href"] = "http://%s%s?linked_partitioning=1&cursor=%i&oauth_token=%s" % (
+                request.headers["Host"], request.path, start + limit, query.get("oauth_token", ""))
+        return 200, {}, document
+    return respond
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    # send a response in one go, instead of a packet per header
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    truncate = None
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.stub.connected(self.connection)
+
+    def finish(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        finally:
+            self.server.stub.disconnected(self.connection)
+
+    def do_GET(self):
+        server = self.server.stub
+        url = urlparse.urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else ""
+        path = url.path.rstrip("/") or "/"
+        request = StubRequest(self.command, path, urlparse.parse_qs(url.query), self.headers, body)
+        server.record(request)
+
+        for fault in server.pop_faults(self.command, path):
+            if fault(self):
+                return
+
+        route = server.routes.get((self.command, path))
+        if route is None:
+            self.respond(404, {}, {"error" : "404 - Not Found"})
+            return
+        code, headers, body = route
+        if callable(body):
+            code, headers, body = body(request)
+        self.respond(code, headers, body)
+
+    do_POST = do_PUT = do_DELETE = do_HEAD = do_GET
+
+    def respond(self, code, headers, body):
+        headers = dict(headers)
+        if not isinstance(body, str):
+            body = simplejson.dumps(body)
+            headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        self.send_response(code)
+        for name, value in headers.iteritems():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.truncate is not None:
+            body = body[:self.truncate]
+            self.close_connection = 1
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    allow_reuse_address = True
+
+
+class StubServer(object):
+    """
+    An HTTP-server on localhost, serving configured responses, and
+    recording the requests it gets in L{requests}.
+    """
+
+    ACCESS_TOKEN = "stub-token"
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.routes = {}
+        self.requests = []
+        self._faults = {}
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), StubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def host(self):
+        """
+        The host and port to connect to.
+        """
+        host, port = self._server.server_address
+        return "%s:%i" % (host, port)
+
+    def route(self, method, path, status=200, body=None, headers=None):
+        """
+        Configure the response to requests for path.
+
+        @param body: the body of the response. Lists and dicts are sent as
+                JSON. If it's callable, it's invoked with the L{StubRequest}
+                and returns status, headers and body of the response.
+        """
+        if body is None:
+            body = ""
+        self.routes[(method, path.rstrip("/") or "/")] = (status, headers or {}, body)
+
+    def inject(self, method, path, *faults):
+        """
+        Apply the given faults to the next requests for path, one per request.
+        """
+        self._lock.acquire()
+        try:
+            self._faults.setdefault((method, path.rstrip("/") or "/"), []).extend(faults)
+        finally:
+            self._lock.release()
+
+    def pop_faults(self, method, path):
+        self._lock.acquire()
+        try:
+            faults = self._faults.get((method, path))
+            if faults:
+                return [faults.pop(0)]
+            return []
+        finally:
+            self._lock.release()
+
+    def record(self, request):
+        self._lock.acquire()
+        try:
+            self.requests.append(request)
+        finally:
+            self._lock.release()
+
+    def connected(self, connection):
+        self._lock.acquire()
+        try:
+            self._connections.add(connection)
+        finally:
+            self._lock.release()
+
+    def disconnected(self, connection):
+        self._lock.acquire()
+        try:
+            self._connections.discard(connection)
+        finally:
+            self._lock.release()
+
+    def connector(self, pool=None, **kwargs):
+        """
+        Create an L{soundcloud.ApiConnector} talking to this server.
+        """
+        authenticator = soundcloud.OAuth2Authenticator("client_id", "client_secret", "http://localhost/",
+                                                       self.ACCESS_TOKEN)
+        return soundcloud.ApiConnector(authenticator, host=self.host, scheme="http", pool=pool, **kwargs)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs=dict(poll_interval=0.05))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        # end the kept-alive connections, so their threads finish
+        self._lock.acquire()
+        try:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        finally:
+            self._lock.release()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class StubServerTestCase(TestCase):
+    """
+    A TestCase running a L{StubServer} for each test, as C{self.server}.
+    Subclasses that override setUp configure their routes after calling it.
+    """
+
+    def setUp(self):
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def scope(self, **kwargs):
+        """
+        Create a L{soundcloud.Scope} of a connector talking to the server,
+        with the given options.
+        """
+        return soundcloud.Scope(self.server.connector(**kwargs))
@@ -0,0 +1,54 @@
+import soundcloud
+from soundcloud.tests.stub_server import StubServerTestCase
+
+
+USER = {"id" : 3, "kind" : "user", "username" : "stub"}
+
+FAVORITES = [{"id" : id, "kind" : "track", "title" : str(id)} for id in (1, 2, 3)]
+
+
+class CollectionSyncTests(StubServerTestCase):
+    """
+    ApiCall.sync: the PUTs and DELETEs it sends to bring a user's favorites
+    in line, and the counts and errors it reports.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/users/3/favorites", body=FAVORITES)
+        for id in xrange(1, 6):
+            self.server.route("PUT", "/users/3/favorites/%i" % id, body={})
+            self.server.route("DELETE", "/users/3/favorites/%i" % id, body={})
+        self.sca = self.scope()
+        self.user = soundcloud.User(dict(USER), self.sca)
+
+
+    def changes(self):
+        return sorted((request.method, request.path) for request in self.server.requests
+                      if request.method != "GET")
+
+
+    def test_sync_applies_only_the_difference(self):
+        track = soundcloud.Track({"id" : 4, "kind" : "track"}, self.sca)
+        result = self.user.favorites.sync([2, "3", track, 4, 5])
+        assert (result.added, result.removed, result.unchanged) == (2, 1, 2)
+        assert result.ok
+        assert self.changes() == [
+            ("DELETE", "/users/3/favorites/1"),
+            ("PUT", "/users/3/favorites/4"),
+            ("PUT", "/users/3/favorites/5"),
+            ]
+
+
+    def test_sync_without_changes(self):
+        result = self.user.favorites.sync([3, 1, 2])
+        assert (result.added, result.removed, result.unchanged) == (0, 0, 3)
+        assert self.changes() == []
+
+
+    def test_failed_changes_are_reported(self):
+        self.server.route("PUT", "/users/3/favorites/5", status=500)
+        result = self.user.favorites.sync([1, 2, 3, 4, 5])
+        assert (result.added, result.removed, result.unchanged) == (1, 0, 3)
+        assert not result.ok
+        assert result.errors.keys() == ["5"]
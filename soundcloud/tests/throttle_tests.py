@@ -0,0 +1,85 @@
+import email.utils
+import time
+import urllib2
+
+from soundcloud.throttle import RequestScheduler
+from soundcloud.tests.stub_server import (
+    StubServerTestCase,
+    status,
+    )
+
+
+ME = {"id" : 1, "kind" : "user", "username" : "stub"}
+
+TRACK = {"id" : 2, "kind" : "track", "title" : "stub"}
+
+
+class RequestSchedulerTests(StubServerTestCase):
+    """
+    RequestScheduler: the rate of the client, and requests the server
+    throttles with 429 or 503 - queued again after their Retry-After, with
+    the buckets of their endpoint paused that long.
+    """
+
+    def setUp(self):
+        StubServerTestCase.setUp(self)
+        self.server.route("GET", "/me", body=ME)
+        self.server.route("GET", "/tracks/2", body=TRACK)
+
+
+    def test_rate_limiting(self):
+        scheduler = RequestScheduler(rate=2, burst=1)
+        sca = self.scope(scheduler=scheduler)
+        for _ in xrange(3):
+            sca.me()
+        metrics = scheduler.metrics.snapshot()
+        assert metrics["requests"] == 3
+        assert metrics["delayed"] == 2
+        # the second and the third request wait for their token half a second
+        assert 0.9 < metrics["total_wait"] <= 1.0
+
+
+    def test_throttled_request_is_retried(self):
+        scheduler = RequestScheduler(endpoint_limits={"/tracks/{id}" : (100, 10)})
+        sca = self.scope(scheduler=scheduler)
+        self.server.inject("GET", "/tracks/2", status(429, {"Retry-After" : "1"}))
+        started = time.time()
+        assert sca.Track.get(2).title == "stub"
+        assert time.time() - started >= 1
+        assert len(self.server.requests) == 2
+        metrics = scheduler.metrics.snapshot()
+        assert metrics["throttled"] == 1
+        assert metrics["given_up"] == 0
+        assert metrics["endpoints"]["/tracks/{id}"][1] > 0.9
+
+
+    def test_other_endpoints_are_not_paused(self):
+        scheduler = RequestScheduler(endpoint_limits={"/tracks/{id}" : (100, 10)})
+        sca = self.scope(scheduler=scheduler)
+        scheduler.throttled("/tracks/2", 503, "5", 0)
+        started = time.time()
+        sca.me()
+        assert time.time() - started < 0.5
+
+
+    def test_retry_after(self):
+        scheduler = RequestScheduler(default_retry_after=2.0)
+        assert scheduler.retry_after("3") == 3
+        assert scheduler.retry_after(None) == 2
+        assert scheduler.retry_after("soon") == 2
+        date = email.utils.formatdate(time.time() + 10, usegmt=True)
+        assert 8 < scheduler.retry_after(date) <= 10
+
+
+    def test_too_long_retry_after_is_raised(self):
+        scheduler = RequestScheduler(rate=100, max_retry_after=5)
+        sca = self.scope(scheduler=scheduler)
+        self.server.inject("GET", "/me", status(503, {"Retry-After" : "60"}))
+        try:
+            sca.me()
+        except urllib2.HTTPError, e:
+            assert e.code == 503
+        else:
+            assert False, "expected an HTTPError"
+        assert len(self.server.requests) == 1
+        assert scheduler.metrics.snapshot()["given_up"] == 1
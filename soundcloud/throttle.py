@@ -0,0 +1,335 @@
+##    SouncCloudAPI implements a Python wrapper around the SoundCloud RESTful
+##    API
+##
+##    Copyright (C) 2008  Diez B. Roggisch
+##    Contact mailto:deets@soundcloud.com
+##
+##    This library is free software; you can redistribute it and/or
+##    modify it under the terms of the GNU Lesser General Public
+##    License as published by the Free Software Foundation; either
+##    version 2.1 of the License, or (at your option) any later version.
+##
+##    This library is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+##    Lesser General Public License for more details.
+##
+##    You should have received a copy of the GNU Lesser General Public
+##    License along with this library; if not, write to the Free Software
+##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Client-side rate-limiting of API-requests.
+
+A L{RequestScheduler} given to the L{soundcloud.ApiConnector} makes every
+request wait for a token of the client's bucket and of the bucket of its
+endpoint. Requests answered with 429 (Too Many Requests) or 503 (Service
+Unavailable) are queued again, after the time the server asked for in its
+Retry-After-header.
+"""
+
+import email.utils
+import logging
+import threading
+import time
+
+from soundcloud.util import endpoint_template
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket. Tokens are added at C{rate} per second, up to
+    C{capacity}; every request takes one.
+
+    Taking a token never fails - if the bucket is empty, the token is
+    borrowed from the future, and the caller is told how long to wait
+    before using it. So waiting requests are served in the order they
+    asked, and never more than C{rate} per second.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        @type rate: float
+        @param rate: the number of tokens added per second
+        @type capacity: int
+        @param capacity: the maximum number of tokens, i.e. the size of a burst.
+                Defaults to one second's worth of tokens.
+        """
+        self.rate = float(rate)
+        if capacity is None:
+            capacity = max(1, int(rate))
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.time()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens.
+
+        @param tokens: the number of tokens to take, which may be more than
+                the capacity
+        @return: the seconds to wait before the tokens may be used
+        @rtype: float
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            self._refill(now)
+            self._tokens -= tokens
+            return max(0, self._paused_until - now) + max(0, -self._tokens) / self.rate
+        finally:
+            self._lock.release()
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for the given number of seconds, and start over
+        with an empty bucket afterwards.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0)
+            self._paused_until = max(self._paused_until, now + seconds)
+        finally:
+            self._lock.release()
+
+    def _refill(self, now):
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+            self._updated = now
+
+
+class ThrottledFile(object):
+    """
+    A file whose reads take a token per byte from a L{TokenBucket}, which
+    limits the rate it's read at - e.g. when it's uploaded. Several files
+    sharing a bucket share its rate.
+
+    Everything but read is delegated to the file.
+    """
+
+    def __init__(self, fp, bucket):
+        self._fp = fp
+        self._bucket = bucket
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        if data:
+            wait = self._bucket.reserve(len(data))
+            if wait > 0:
+                time.sleep(wait)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+
+class SchedulerMetrics(object):
+    """
+    Counters of a L{RequestScheduler}, to tune its rates against the quota
+    of the API.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            # the number of requests sent, and how many had to wait
+            self.requests = 0
+            self.delayed = 0
+            # the seconds spent waiting for tokens, in total and at most
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            # the number of 429- and 503-responses, and how many of them
+            # were not retried
+            self.throttled = 0
+            self.given_up = 0
+            # endpoint -> [requests, seconds waited]
+            self.endpoints = {}
+        finally:
+            self._lock.release()
+
+    def record_wait(self, endpoint, wait):
+        self._lock.acquire()
+        try:
+            self.requests += 1
+            if wait > 0:
+                self.delayed += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            counts = self.endpoints.setdefault(endpoint, [0, 0.0])
+            counts[0] += 1
+            counts[1] += wait
+        finally:
+            self._lock.release()
+
+    def record_throttled(self, retried):
+        self._lock.acquire()
+        try:
+            self.throttled += 1
+            if not retried:
+                self.given_up += 1
+        finally:
+            self._lock.release()
+
+    @property
+    def mean_wait(self):
+        """
+        The average seconds a request waited.
+        """
+        if not self.requests:
+            return 0.0
+        return self.total_wait / self.requests
+
+    def snapshot(self):
+        """
+        @return: the current values, e.g. for logging them
+        @rtype: dict
+        """
+        self._lock.acquire()
+        try:
+            return dict(
+                requests=self.requests,
+                delayed=self.delayed,
+                total_wait=self.total_wait,
+                max_wait=self.max_wait,
+                mean_wait=self.mean_wait,
+                throttled=self.throttled,
+                given_up=self.given_up,
+                endpoints=dict((endpoint, tuple(counts)) for endpoint, counts in self.endpoints.iteritems()),
+                )
+        finally:
+            self._lock.release()
+
+
+class RequestScheduler(object):
+    """
+    Schedules the requests of a client so they stay within the rate-limits
+    of the API:
+
+    >>> scheduler = RequestScheduler(rate=10, endpoint_limits={"/tracks/{id}/comments/" : (1, 5)})
+    >>> connector = ApiConnector(authenticator, scheduler=scheduler)
+
+    Endpoints are identified by their path with the numeric ids replaced by
+    C{{id}}, see L{endpoint}. Share one scheduler between all connectors
+    using the same client-id, as the quota of the API applies to the client.
+
+    How long requests were queued is recorded in L{metrics}.
+    """
+
+    THROTTLED_STATUSES = (429, 503)
+
+    def __init__(self, rate=None, burst=None, endpoint_limits=None, max_retries=3,
+                 default_retry_after=1.0, max_retry_after=60.0):
+        """
+        @type rate: float
+        @param rate: the requests per second of the whole client. If None, only
+                the endpoint limits apply.
+        @type burst: int
+        @param burst: the number of requests the client may make at once
+        @type endpoint_limits: dict<str, tuple<float, int>>
+        @param endpoint_limits: maps endpoints to their rate and burst
+        @type max_retries: int
+        @param max_retries: how often a throttled request is queued again
+        @type default_retry_after: float
+        @param default_retry_after: the seconds to wait if a throttled response
+                has no Retry-After-header
+        @type max_retry_after: float
+        @param max_retry_after: the maximum number of seconds to wait for a
+                throttled request. If the server asks for longer, the error is raised.
+        """
+        self.client_bucket = None
+        if rate is not None:
+            self.client_bucket = TokenBucket(rate, burst)
+        self.endpoint_buckets = {}
+        for endpoint, (endpoint_rate, endpoint_burst) in (endpoint_limits or {}).iteritems():
+            self.endpoint_buckets[endpoint] = TokenBucket(endpoint_rate, endpoint_burst)
+        self.max_retries = max_retries
+        self.default_retry_after = default_retry_after
+        self.max_retry_after = max_retry_after
+        self.metrics = SchedulerMetrics()
+
+    def endpoint(self, path):
+        """
+        The endpoint a path belongs to, e.g. C{/tracks/{id}/comments/} for
+        C{/tracks/123/comments/}.
+        """
+        return endpoint_template(path)
+
+    def acquire(self, path):
+        """
+        Wait until a request to path may be sent.
+
+        @return: the seconds waited
+        @rtype: float
+        """
+        endpoint = self.endpoint(path)
+        wait = 0
+        for bucket in self._buckets(endpoint):
+            wait = max(wait, bucket.reserve())
+        if wait > 0:
+            logger.debug("Delaying request to %s for %.3fs", endpoint, wait)
+            time.sleep(wait)
+        self.metrics.record_wait(endpoint, wait)
+        return wait
+
+    def throttled(self, path, status, retry_after, attempt):
+        """
+        Deal with a response to a request to path. If it's a throttling one,
+        the buckets involved are paused for the time the server asked for.
+
+        @param status: the HTTP-status of the response
+        @param retry_after: the value of the Retry-After-header, or None
+        @param attempt: the number of times the request has been retried
+        @return: True if the request should be queued again
+        @rtype: bool
+        """
+        if status not in self.THROTTLED_STATUSES:
+            return False
+        delay = self.retry_after(retry_after)
+        retry = attempt < self.max_retries and delay <= self.max_retry_after
+        self.metrics.record_throttled(retry)
+        if not retry:
+            return False
+        endpoint = self.endpoint(path)
+        logger.info("Request to %s throttled with status %i, retrying in %.1fs", endpoint, status, delay)
+        for bucket in self._buckets(endpoint):
+            bucket.pause(delay)
+        return True
+
+    def retry_after(self, value):
+        """
+        Parse the value of a Retry-After-header, which is either a number of
+        seconds or a HTTP-date.
+
+        @return: the seconds to wait
+        @rtype: float
+        """
+        if value is None:
+            return self.default_retry_after
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return self.default_retry_after
+        return max(0.0, email.utils.mktime_tz(date) - time.time())
+
+    def _buckets(self, endpoint):
+        buckets = []
+        if self.client_bucket is not None:
+            buckets.append(self.client_bucket)
+        bucket = self.endpoint_buckets.get(endpoint)
+        if bucket is not None:
+            buckets.append(bucket)
+        return buckets
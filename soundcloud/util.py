@@ -18,6 +18,7 @@
 ##    License along with this library; if not, write to the Free Software
 ##    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import re
 import urllib
 
 def escape(s):
@@ -25,6 +26,25 @@ def escape(s):
     return urllib.quote(s, safe='')
 
 
+ID_PATTERN = re.compile(r"/\d+(?=/|$)")
+
+def endpoint_template(path):
+    """
+    The endpoint a path belongs to, with the numeric ids replaced by
+    C{{id}}, e.g. C{/tracks/{id}/comments/} for C{/tracks/123/comments/}.
+    """
+    return ID_PATTERN.sub("/{id}", path)
+
+
+def truncate(text, limit):
+    """
+    Shorten text to at most limit characters, for logging it.
+    """
+    if len(text) <= limit:
+        return text
+    return "%s... (%i more)" % (text[:limit], len(text) - limit)
+
+
 
 
 